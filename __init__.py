@@ -11,33 +11,51 @@ bl_info = {
 }
 
 import bpy
-import os
-import bpy.utils.previews
 
+from .icons import clear_icons
 from .properties import CubemapProperties
 from .operators import (
     CUBEMAP_OT_create_camera,
     CUBEMAP_OT_setup_camera,
     CUBEMAP_OT_apply_preset,
     CUBEMAP_OT_render,
+    CUBEMAP_OT_faces_from_hdri,
+    CUBEMAP_OT_render_assemble,
+    CUBEMAP_OT_batch,
+    CUBEMAP_OT_render_probes,
+    CUBEMAP_OT_render_sequence,
+    CUBEMAP_OT_render_farm,
     CUBEMAP_OT_install_pillow,
     CUBEMAP_OT_stitch,
+    CUBEMAP_OT_convert,
+    CUBEMAP_OT_prefilter,
+    CUBEMAP_OT_extract_sh,
+    CUBEMAP_OT_export_container,
+    CUBEMAP_OT_write_tiers,
     CUBEMAP_OT_open_folder,
     CUBEMAP_OT_check_pillow,
 )
 from .panels import CUBEMAP_PT_main_panel, CUBEMAP_PT_prefs
 
-# Global preview collection
-preview_collections = {}
-
 classes = (
     CubemapProperties,
     CUBEMAP_OT_create_camera,
     CUBEMAP_OT_setup_camera,
     CUBEMAP_OT_apply_preset,
     CUBEMAP_OT_render,
+    CUBEMAP_OT_faces_from_hdri,
+    CUBEMAP_OT_render_assemble,
+    CUBEMAP_OT_batch,
+    CUBEMAP_OT_render_probes,
+    CUBEMAP_OT_render_sequence,
+    CUBEMAP_OT_render_farm,
     CUBEMAP_OT_install_pillow,
     CUBEMAP_OT_stitch,
+    CUBEMAP_OT_convert,
+    CUBEMAP_OT_prefilter,
+    CUBEMAP_OT_extract_sh,
+    CUBEMAP_OT_export_container,
+    CUBEMAP_OT_write_tiers,
     CUBEMAP_OT_open_folder,
     CUBEMAP_OT_check_pillow,
     CUBEMAP_PT_main_panel,
@@ -50,44 +68,9 @@ def register():
         bpy.utils.register_class(cls)
     bpy.types.Scene.cubemap_props = bpy.props.PointerProperty(type=CubemapProperties)
 
-    # Register icons
-    pcoll = bpy.utils.previews.new()
-    icons_dir = os.path.join(os.path.dirname(__file__), "assets")
-    
-    # Load SVG icons directly
-    # Blender 4.2+ supports SVG loading for UI previews.
-    if os.path.exists(icons_dir):
-        # Helper to load icon if exists
-        def load_icon(name, filename):
-            path = os.path.join(icons_dir, filename)
-            if os.path.exists(path):
-                try:
-                    pcoll.load(name, path, 'IMAGE')
-                    print(f"✓ Loaded icon: {name} from {filename}")
-                except Exception as e:
-                    print(f"⚠ Failed to load icon {filename}: {e}")
-                    return False
-            else:
-                print(f"✗ Icon file not found: {path}")
-                return False
-            return True
-
-        # Load SVG icons for buttons (scalable, crisp)
-        load_icon("ICON_RENDER", "icon_render.svg")
-        load_icon("ICON_ASSEMBLE", "icon_assemble.svg")
-        load_icon("ICON_FOLDER", "icon_folder.svg")
-
-        # Load engine logos (SVG)
-        load_icon("ICON_UE5", "unreal_engine.svg")
-        load_icon("ICON_UNITY", "unity.svg")
-
-    preview_collections["main"] = pcoll
-
 def unregister():
-    # Unregister icons
-    for pcoll in preview_collections.values():
-        bpy.utils.previews.remove(pcoll)
-    preview_collections.clear()
+    # Free the icons if the panel ever loaded them
+    clear_icons()
 
     # Unregister classes
     for cls in reversed(classes):
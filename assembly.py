@@ -0,0 +1,307 @@
+import os
+import numpy as np
+from .const import CUBEMAP_LAYOUTS, CUBEMAP_PRESETS, FORMAT_EXTENSIONS, STRIP_CONTAINERS
+from .image_io import BandReader, image_info, open_writer, read_image, write_image
+from .layouts import gather_map, layout_cells, layout_size
+from .metrics import phase
+
+# Rows per band when streaming
+STREAM_BAND_ROWS = 64
+
+
+def face_paths(output_dir, base_name, preset_key, file_format):
+    preset = CUBEMAP_PRESETS.get(preset_key)
+    if not preset:
+        raise ValueError("Invalid engine preset")
+    ext = FORMAT_EXTENSIONS[file_format]
+    return [
+        os.path.join(output_dir, f"{base_name}_{idx+1}_{suffix}{ext}")
+        for idx, (suffix, _) in enumerate(preset['faces'])
+    ]
+
+
+def face_sources(output_dir, settings, faces=None):
+    # (faces, infos) for in-memory faces, or for the face files written by
+    # capture_cubemap when faces is None
+    if faces is not None:
+        return faces, [(f.shape[1], f.shape[0], f.shape[2], f.dtype) for f in faces]
+    paths = face_paths(output_dir, settings.base_name, settings.engine_preset, settings.file_format)
+    for filepath in paths:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File not found: {filepath}. Render cubemap first.")
+    return paths, [image_info(path) for path in paths]
+
+
+def strip_path(output_dir, base_name, file_format, container='FACE', layout='STRIP'):
+    ext = STRIP_CONTAINERS.get(container) or FORMAT_EXTENSIONS[file_format]
+    suffix = CUBEMAP_LAYOUTS[layout]['suffix']
+    return os.path.join(output_dir, f"{base_name}_cubemap_{suffix}{ext}")
+
+
+def strip_shape(infos):
+    # Output (height, width, channels, dtype) for faces placed side by side.
+    # Channels and bit depth follow the richest face so nothing is dropped.
+    height = max(info[1] for info in infos)
+    width = sum(info[0] for info in infos)
+    channels = max(info[2] for info in infos)
+    dtype = np.result_type(*(info[3] for info in infos))
+    return height, width, channels, dtype
+
+
+def opaque_value(dtype):
+    return 1.0 if np.dtype(dtype).kind == 'f' else np.iinfo(dtype).max
+
+
+def convert_depth(face, dtype):
+    # Rescale integer data when faces of different depths share a strip;
+    # float data is never clamped.
+    if face.dtype == dtype:
+        return face
+    if face.dtype.kind == 'f':
+        return face.astype(dtype)
+    if np.dtype(dtype).kind == 'f':
+        return face.astype(dtype) / np.iinfo(face.dtype).max
+    return face.astype(dtype) * (np.iinfo(dtype).max // np.iinfo(face.dtype).max)
+
+
+def place_face(out, face, x):
+    # Copy a decoded face into its column of the output. Missing alpha is
+    # filled as opaque, grayscale is broadcast to RGB.
+    fh, fw, fc = face.shape
+    oc = out.shape[2]
+    region = out[:fh, x:x + fw]
+    face = convert_depth(face, out.dtype)
+    if fc == oc:
+        region[...] = face
+        return
+    color = min(fc, 3) if fc != 2 else 1
+    if color == 1 and oc >= 3:
+        region[..., :3] = face[..., :1]
+    else:
+        region[..., :color] = face[..., :color]
+    alpha_src = fc - 1 if fc in (2, 4) else None
+    if oc in (2, 4):
+        if alpha_src is None:
+            region[..., -1] = opaque_value(out.dtype)
+        else:
+            region[..., -1] = face[..., alpha_src]
+
+
+def assemble_strip(paths, metrics=None):
+    # Decode each face straight into its slice of one preallocated strip
+    infos = [image_info(path) for path in paths]
+    height, width, channels, dtype = strip_shape(infos)
+    strip = np.zeros((height, width, channels), dtype=dtype)
+
+    x = 0
+    for path, info in zip(paths, infos):
+        with phase(metrics, 'decode'):
+            face = read_image(path)
+        with phase(metrics, 'assemble'):
+            place_face(strip, face, x)
+        x += info[0]
+    return strip
+
+
+def stack_faces(faces, infos, metrics=None):
+    # Gather source for a layout: the six faces flattened one after another
+    # plus one zero pixel for the empty cells (see layouts.py). `faces` may be
+    # arrays or paths, decoded one at a time.
+    size = infos[0][0]
+    if any(info[:2] != (size, size) for info in infos):
+        raise ValueError("Layouts other than the strip need six square faces of the same size")
+    _, _, channels, dtype = strip_shape(infos)
+    face_pixels = size * size
+    stacked = np.empty((len(faces) * face_pixels + 1, channels), dtype=dtype)
+    stacked[-1] = 0
+    for index, face in enumerate(faces):
+        if isinstance(face, str):
+            with phase(metrics, 'decode'):
+                face = read_image(face)
+        with phase(metrics, 'assemble'):
+            view = stacked[index * face_pixels:(index + 1) * face_pixels].reshape(size, size, channels)
+            place_face(view, face, 0)
+    return stacked, size
+
+
+def assemble_layout(faces, infos, layout, preset_key, metrics=None):
+    stacked, size = stack_faces(faces, infos, metrics)
+    with phase(metrics, 'assemble'):
+        return stacked[gather_map(layout, preset_key, size)]
+
+
+def stream_layout(paths, output_path, layout, preset_key, band_rows=STREAM_BAND_ROWS, metrics=None, **options):
+    # The faces stay in memory, the output is gathered and written per band
+    infos = [image_info(path) for path in paths]
+    stacked, size = stack_faces(paths, infos, metrics)
+    gather = gather_map(layout, preset_key, size)
+    height, width = gather.shape
+    with open_writer(output_path, width, height, stacked.shape[1], stacked.dtype, **options) as writer:
+        for y in range(0, height, band_rows):
+            with phase(metrics, 'assemble'):
+                band = stacked[gather[y:y + band_rows]]
+            with phase(metrics, 'encode'):
+                writer.write_rows(band)
+    return width, height
+
+
+def stream_mapped(faces, output_path, layout, preset_key, band_rows=STREAM_BAND_ROWS, metrics=None, **options):
+    # Faces too big to assemble in memory (the memory-mapped buffers of a
+    # tiled capture): every band of output rows is filled cell by cell from
+    # the face rows under it, so neither the faces nor a gather map are ever
+    # held whole. Returns (width, height).
+    infos = [(f.shape[1], f.shape[0], f.shape[2], f.dtype) for f in faces]
+    size = infos[0][0]
+    if any(info[:2] != (size, size) for info in infos):
+        raise ValueError("Streamed faces must be square and of the same size")
+    _, _, channels, dtype = strip_shape(infos)
+    cells = layout_cells(layout, preset_key)
+    width, height = layout_size(layout, size)
+    with open_writer(output_path, width, height, channels, dtype, **options) as writer:
+        for y in range(0, height, band_rows):
+            rows = min(band_rows, height - y)
+            band = np.zeros((rows, width, channels), dtype=dtype)
+            for index, col, row, turns, mirror in cells:
+                top = row * size
+                y0, y1 = max(y, top), min(y + rows, top + size)
+                if y0 >= y1:
+                    continue
+                # Same orientation as the gather maps in layouts.py
+                cell = np.rot90(faces[index], turns)
+                if mirror:
+                    cell = cell[:, ::-1]
+                with phase(metrics, 'assemble'):
+                    place_face(band[y0 - y:], cell[y0 - top:y1 - top], col * size)
+            with phase(metrics, 'encode'):
+                writer.write_rows(band)
+    return width, height
+
+
+def write_mapped_strip(output_dir, settings, faces, metrics=None):
+    # write_strip for memory-mapped faces, streamed instead of assembled
+    output_path = strip_path(output_dir, settings.base_name, settings.file_format, settings.strip_container,
+                             settings.layout)
+    try:
+        width, height = stream_mapped(faces, output_path, settings.layout, settings.engine_preset, metrics=metrics,
+                                      **strip_options(output_path, settings))
+    except Exception as e:
+        raise RuntimeError(f"Failed to stream cubemap strip: {str(e)}")
+    return output_path, width, height
+
+
+def assemble_faces(faces, layout='STRIP', preset_key=None):
+    # Same as assemble_strip for faces already in memory
+    if layout != 'STRIP':
+        infos = [(f.shape[1], f.shape[0], f.shape[2], f.dtype) for f in faces]
+        return assemble_layout(faces, infos, layout, preset_key)
+    infos = [(f.shape[1], f.shape[0], f.shape[2], f.dtype) for f in faces]
+    height, width, channels, dtype = strip_shape(infos)
+    strip = np.empty((height, width, channels), dtype=dtype)
+    if len({info[1] for info in infos}) > 1:
+        strip[...] = 0
+
+    x = 0
+    for face in faces:
+        place_face(strip, face, x)
+        x += face.shape[1]
+    return strip
+
+
+def write_strip(output_dir, settings, strip, metrics=None):
+    # Write an in-memory strip where stitch_strip would put it
+    output_path = strip_path(output_dir, settings.base_name, settings.file_format, settings.strip_container,
+                             settings.layout)
+    try:
+        with phase(metrics, 'encode'):
+            write_image(output_path, strip, **strip_options(output_path, settings))
+    except Exception as e:
+        raise RuntimeError(f"Failed to save stitched image: {e}")
+    height, width = strip.shape[:2]
+    return output_path, width, height
+
+
+def strip_options(output_path, settings):
+    # Writer options for an output of the current settings (faces too)
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext == ".exr":
+        return {'half': settings.exr_depth == '16'}
+    if ext in (".png", ".tif"):
+        return {'compress_level': settings.png_compression}
+    if ext == ".jpg":
+        return {'quality': settings.jpeg_quality, 'subsampling': settings.jpeg_subsampling}
+    return {}
+
+
+def stream_strip(paths, output_path, band_rows=STREAM_BAND_ROWS, metrics=None, **options):
+    # Same strip as assemble_strip + write_image, built one band of rows at a
+    # time: memory stays at six face bands plus one output band.
+    readers = []
+    try:
+        for path in paths:
+            readers.append(BandReader(path, spill_dir=os.path.dirname(output_path)))
+        infos = [(r.width, r.height, r.channels, r.dtype) for r in readers]
+        height, width, channels, dtype = strip_shape(infos)
+        uneven = len({info[1] for info in infos}) > 1
+
+        band = np.zeros((band_rows, width, channels), dtype=dtype)
+        with open_writer(output_path, width, height, channels, dtype, **options) as writer:
+            for y in range(0, height, band_rows):
+                rows = min(band_rows, height - y)
+                view = band[:rows]
+                if uneven:
+                    view[...] = 0
+                x = 0
+                for reader in readers:
+                    if y < reader.height:
+                        with phase(metrics, 'decode'):
+                            face_rows = reader.read_rows(y, min(y + rows, reader.height))
+                        with phase(metrics, 'assemble'):
+                            place_face(view, face_rows, x)
+                    x += reader.width
+                with phase(metrics, 'encode'):
+                    writer.write_rows(view)
+    finally:
+        for reader in readers:
+            reader.close()
+    return width, height
+
+
+def stitch_strip(output_dir, settings, metrics=None):
+    # Assemble the six faces written by capture_cubemap into the chosen
+    # layout (a horizontal strip by default). Returns (path, width, height).
+    # Decode, assemble and encode times go to `metrics` when given.
+    if not os.path.exists(output_dir):
+        raise FileNotFoundError("Output folder doesn't exist. Render cubemap first.")
+
+    output_path = strip_path(output_dir, settings.base_name, settings.file_format, settings.strip_container,
+                             settings.layout)
+    if settings.stream_assembly and output_path.endswith(".jpg"):
+        raise ValueError("Streaming assembly can't write JPEG. Pick another strip format.")
+
+    paths = face_paths(output_dir, settings.base_name, settings.engine_preset, settings.file_format)
+    for filepath in paths:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File not found: {filepath}. Render cubemap first.")
+
+    if settings.stream_assembly:
+        try:
+            if settings.layout == 'STRIP':
+                width, height = stream_strip(paths, output_path, metrics=metrics,
+                                             **strip_options(output_path, settings))
+            else:
+                width, height = stream_layout(paths, output_path, settings.layout, settings.engine_preset,
+                                              metrics=metrics, **strip_options(output_path, settings))
+        except Exception as e:
+            raise RuntimeError(f"Failed to stream cubemap strip: {str(e)}")
+        return output_path, width, height
+
+    try:
+        if settings.layout == 'STRIP':
+            strip = assemble_strip(paths, metrics)
+        else:
+            strip = assemble_layout(paths, [image_info(path) for path in paths], settings.layout,
+                                    settings.engine_preset, metrics)
+    except Exception as e:
+        raise RuntimeError(f"Failed to read cubemap faces: {str(e)}")
+
+    return write_strip(output_dir, settings, strip, metrics)
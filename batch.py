@@ -0,0 +1,402 @@
+import bpy
+import os
+import sys
+import json
+import time
+import argparse
+from contextlib import contextmanager
+from types import SimpleNamespace
+from .const import CUBEMAP_LAYOUTS, CUBEMAP_PRESETS
+from .capture import capture_cubemap, capture_faces, record_cache, remove_tile_buffers
+from .assembly import assemble_faces, face_paths, write_mapped_strip, write_strip
+from .image_io import read_image
+from .rendercache import load_manifest
+from .probes import expand_probe_set
+from .sequence import append_checkpoint, expand_sequence
+from .prefilter import write_prefiltered
+from .reproject import CONVERT_SUFFIXES, write_converted
+from .sh import write_sh
+from .containers import TEXTURE_FORMATS, write_containers
+from .pyramid import TIER_FILTERS, write_tiers
+from .metrics import RunReport, phase
+from .farm import NO_WORKER_TIMEOUT, serve
+
+# Headless entry point for render farms:
+#
+#   blender -b scene.blend --python-exit-code 1 \
+#       --python-expr "import bpy; assert bpy.ops.cubemap.batch() == {'FINISHED'}" \
+#       -- --cubemap job.json --status status.json --shard 0/4
+#
+# Job file (JSON). Top-level keys are defaults for every probe and use the
+# same names as CubemapProperties; unset keys fall back to the scene props.
+#
+#   {
+#     "output_path": "//cubemaps/",
+#     "engine_preset": "UE5",
+#     "resolution": 2048,
+#     "file_format": "PNG",
+#     "capture_mode": "FACES",
+#     "layout": "CROSS_H",
+#     "assemble": true,
+#     "convert": ["EQUIRECT", "OCTAHEDRAL"],
+#     "prefilter": true,
+#     "probes": [
+#       {"base_name": "kitchen", "location": [1.0, 2.0, 1.5]},
+#       {"base_name": "hall", "location": [4.0, 0.0, 1.5], "resolution": 1024}
+#     ]
+#   }
+#
+# A "probe_set" key adds generated probes, each in its own subfolder of
+# output_path (see probes.expand_probe_set). A "frames": [start, end, step]
+# key renders every probe on each of those frames (see sequence.py).
+#
+# With --spool the process is a farm worker instead: it takes tasks of the
+# job queued in that folder until the job is over (see farm.py).
+#
+#   blender -b spool/scene.blend --python-exit-code 1 \
+#       --python-expr "import bpy; assert bpy.ops.cubemap.batch() == {'FINISHED'}" \
+#       -- --spool spool/ --worker-id node07
+
+SETTING_KEYS = (
+    'output_path', 'base_name', 'engine_preset', 'resolution', 'file_format', 'exr_depth', 'capture_mode',
+    'stream_assembly', 'strip_container', 'layout', 'write_faces', 'convert_size', 'hdri_source', 'hdri_path',
+    'sample_filter', 'prefilter_samples', 'prefilter_levels', 'prefilter_fixup', 'write_sh', 'sh_format',
+    'write_container', 'container_format', 'texture_format', 'container_mips', 'use_render_cache',
+    'png_compression', 'jpeg_quality', 'jpeg_subsampling', 'background_write', 'write_tiers', 'tier_levels',
+    'tier_filter', 'tile_size',
+)
+
+STATUS_PREFIX = "CUBEMAP_STATUS "
+
+
+def cli_args(argv=None):
+    # Blender stops parsing its own options at "--"
+    argv = sys.argv if argv is None else argv
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    else:
+        argv = []
+
+    parser = argparse.ArgumentParser(prog="cubemap", description="Render cubemap probes in background mode")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--cubemap", dest="job_file", help="Path to the JSON job file")
+    source.add_argument("--spool", dest="spool_dir", help="Work as a farm worker on the job queued in this folder")
+    parser.add_argument("--status", dest="status_file", default="", help="Write the JSON run status to this file")
+    parser.add_argument("--shard", default="", help="INDEX/COUNT: only run probes where position %% COUNT == INDEX")
+    parser.add_argument("--no-assemble", dest="assemble", action="store_false", default=None, help="Skip strip assembly")
+    parser.add_argument("--worker-id", default="", help="Farm worker name (default: host and process id)")
+    parser.add_argument("--idle-timeout", type=float, default=NO_WORKER_TIMEOUT,
+                        help="Farm worker: exit after this many seconds without a task")
+    return parser.parse_args(argv)
+
+
+def parse_shard(value):
+    if not value:
+        return 0, 1
+    index, count = (int(v) for v in value.split("/"))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}'")
+    return index, count
+
+
+def load_job(path):
+    with open(path, "r", encoding="utf-8") as f:
+        job = json.load(f)
+    if not isinstance(job, dict):
+        raise ValueError("Job file must contain a JSON object")
+    probes = job.get('probes', [{}])
+    if not isinstance(probes, list) or not probes:
+        raise ValueError("'probes' must be a non-empty list")
+    return job
+
+
+def probe_settings(job, probe, props):
+    values = {key: getattr(props, key) for key in SETTING_KEYS}
+    values.update({k: v for k, v in job.items() if k in SETTING_KEYS})
+    values.update({k: v for k, v in probe.items() if k in SETTING_KEYS})
+    values['location'] = probe.get('location')
+    values['frame'] = probe.get('frame')
+    values['checkpoint'] = probe.get('checkpoint', "")
+    values['done_faces'] = probe.get('done_faces', [])
+    values['convert'] = probe.get('convert', job.get('convert', []))
+    values['prefilter'] = bool(probe.get('prefilter', job.get('prefilter', False)))
+
+    if values['engine_preset'] not in CUBEMAP_PRESETS:
+        raise ValueError(f"Unknown engine preset '{values['engine_preset']}'")
+    if values['layout'] not in CUBEMAP_LAYOUTS:
+        raise ValueError(f"Unknown layout '{values['layout']}'")
+    if values['texture_format'] not in TEXTURE_FORMATS:
+        raise ValueError(f"Unknown texture format '{values['texture_format']}'")
+    if values['tier_filter'] not in TIER_FILTERS:
+        raise ValueError(f"Unknown tier filter '{values['tier_filter']}'")
+    for target in values['convert']:
+        if target not in CONVERT_SUFFIXES:
+            raise ValueError(f"Unknown conversion target '{target}'")
+    if values['capture_mode'] == 'TILED':
+        whole = [key for key in ('convert', 'prefilter', 'write_container') if values[key]]
+        if whole:
+            raise ValueError(f"Tiled captures can't be followed by {', '.join(whole)}, which need the whole faces in memory")
+    return SimpleNamespace(**values)
+
+
+def probe_output_dir(settings):
+    output_dir = bpy.path.abspath(settings.output_path)
+    if not output_dir:
+        raise ValueError("Output path is not set")
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+
+def place_probe(scene, cam, settings):
+    if settings.frame is not None and settings.frame != scene.frame_current:
+        scene.frame_set(settings.frame)
+    if settings.location is not None:
+        cam.location = settings.location
+
+
+def run_probe(scene, cam, settings, assemble, report=None):
+    output_dir = probe_output_dir(settings)
+    place_probe(scene, cam, settings)
+
+    written = None
+    if settings.checkpoint:
+        def written(idx):
+            append_checkpoint(settings.checkpoint, {'base_name': settings.base_name, 'face': idx})
+
+    result = {'base_name': settings.base_name, 'output_dir': output_dir}
+    metrics = RunReport("Batch probe", settings)
+    # Assembly takes the faces straight from the render, no re-read from disk
+    timings, faces = capture_cubemap(scene, cam, settings, output_dir, report=report, collect=assemble,
+                                     metrics=metrics, done=settings.done_faces, written=written)
+    result['timings'] = timings
+    if settings.use_render_cache and settings.capture_mode != 'HDRI' and (settings.write_faces or not assemble):
+        hits = sum(1 for t in timings if t.get('cached'))
+        result['render_cache'] = {'hits': hits, 'misses': 6 - hits}
+    if settings.write_faces or not assemble:
+        result['faces'] = face_paths(output_dir, settings.base_name, settings.engine_preset, settings.file_format)
+    try:
+        result = finish_probe(output_dir, settings, faces, assemble, result, metrics)
+    finally:
+        if settings.capture_mode == 'TILED':
+            faces = None
+            remove_tile_buffers(output_dir, settings.base_name)
+    if settings.checkpoint:
+        append_checkpoint(settings.checkpoint, {'base_name': settings.base_name, 'done': True})
+    return result
+
+
+def finish_probe(output_dir, settings, faces, assemble, result, metrics):
+    # Strip, conversions, prefiltered mips, SH and cube textures from the six
+    # faces (output pixel arrays), then the run report. Fills in and returns
+    # `result`.
+    if assemble:
+        if settings.capture_mode == 'TILED':
+            # Memory-mapped faces are streamed, never assembled whole
+            strip, width, height = write_mapped_strip(output_dir, settings, faces, metrics)
+        else:
+            with phase(metrics, 'assemble'):
+                image = assemble_faces(faces, settings.layout, settings.engine_preset)
+            strip, width, height = write_strip(output_dir, settings, image, metrics)
+            del image
+        result['strip'] = strip
+        result['strip_size'] = [width, height]
+
+    for target in settings.convert:
+        # Conversion tables are cached per preset and size, so only the first
+        # probe of a resolution pays for them
+        with phase(metrics, 'convert'):
+            path, width, height = write_converted(output_dir, settings, target, faces)
+        result.setdefault('converted', {})[target] = path
+
+    if settings.prefilter:
+        with phase(metrics, 'prefilter'):
+            result['prefiltered'] = write_prefiltered(output_dir, settings, faces)
+    if settings.write_sh:
+        with phase(metrics, 'sh'):
+            result['sh'] = write_sh(output_dir, settings, faces)
+    if settings.write_container:
+        with phase(metrics, 'container'):
+            result['containers'] = write_containers(output_dir, settings, faces)
+    if settings.write_tiers:
+        with phase(metrics, 'tiers'):
+            result['tiers'] = write_tiers(output_dir, settings, faces)
+
+    for key in ('faces', 'prefiltered', 'sh', 'containers', 'tiers'):
+        metrics.add_files(result.get(key, []))
+    metrics.add_files([result['strip']] if assemble else [])
+    metrics.add_files(result.get('converted', {}).values())
+    result['report'] = metrics.write(output_dir, settings.base_name)
+    return result
+
+
+def finish_faces(settings, assemble, face_results):
+    # Farm finish task: the probe's six faces were rendered by face tasks,
+    # possibly on other machines, and are read back from output_dir
+    output_dir = probe_output_dir(settings)
+    result = {'base_name': settings.base_name, 'output_dir': output_dir}
+    metrics = RunReport("Farm probe", settings)
+    result['timings'] = [timing for face in face_results for timing in face['timings']]
+    metrics.add_timings(result['timings'])
+
+    paths = face_paths(output_dir, settings.base_name, settings.engine_preset, settings.file_format)
+    keep = settings.write_faces or not assemble
+    fingerprints = [face['fingerprint'] for face in face_results]
+    if settings.use_render_cache and keep and all(fingerprints):
+        record_cache(output_dir, settings.base_name, load_manifest(output_dir, settings.base_name), paths,
+                     fingerprints, range(len(paths)))
+        hits = sum(1 for t in result['timings'] if t.get('cached'))
+        result['render_cache'] = {'hits': hits, 'misses': 6 - hits}
+    if keep:
+        result['faces'] = paths
+
+    with phase(metrics, 'decode'):
+        faces = [read_image(path) for path in paths]
+    result = finish_probe(output_dir, settings, faces, assemble, result, metrics)
+    if not keep:
+        # Face files were only the handoff between machines
+        for path in paths:
+            os.remove(path)
+    return result
+
+
+def run_task(scene, cam, job, task, report=None):
+    # One farm task on this worker's copy of the scene. Face tasks return
+    # what their probe's finish task needs; the others a batch probe result.
+    probe = job['probes'][task['probe']]
+    settings = probe_settings(job, probe, scene.cubemap_props)
+    assemble = bool(job.get('assemble', True))
+    start = time.perf_counter()
+    if task['kind'] == 'face':
+        output_dir = probe_output_dir(settings)
+        place_probe(scene, cam, settings)
+        timings, fingerprints = capture_faces(scene, cam, settings, output_dir, [task['face']], report=report)
+        return {'timings': timings, 'fingerprint': fingerprints[task['face']] if fingerprints else None}
+
+    if task['kind'] == 'finish':
+        result = finish_faces(settings, assemble, task['faces'])
+    else:
+        result = run_probe(scene, cam, settings, assemble, report=report)
+    result['status'] = 'ok'
+    result['name'] = probe.get('name', result['base_name'])
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+
+def run_worker(scene, spool_dir, worker_id="", idle_timeout=NO_WORKER_TIMEOUT):
+    # Farm worker: run tasks from the spool until the job is over
+    start = time.perf_counter()
+    with probe_camera(scene) as cam:
+        summary = serve(spool_dir, lambda job, task: run_task(scene, cam, job, task),
+                        worker_id=worker_id or None, idle_timeout=idle_timeout)
+    return dict(summary, status='ok', probes=[], elapsed=time.perf_counter() - start)
+
+
+@contextmanager
+def probe_camera(scene):
+    # The scene camera (a temporary one when there is none); its location is
+    # put back afterwards
+    cam = scene.camera
+    temp_cam = None
+    if cam is None:
+        temp_cam = bpy.data.objects.new("CubemapBatchCamera", bpy.data.cameras.new("CubemapBatchCamera"))
+        scene.collection.objects.link(temp_cam)
+        scene.camera = cam = temp_cam
+    orig_location = cam.location.copy()
+    try:
+        yield cam
+    finally:
+        cam.location = orig_location
+        if temp_cam is not None:
+            scene.camera = None
+            cam_data = temp_cam.data
+            bpy.data.objects.remove(temp_cam)
+            bpy.data.cameras.remove(cam_data)
+
+
+def run_job(scene, job, assemble=True, shard=(0, 1), report=None):
+    # Returns a JSON-serializable status dict; never raises for per-probe
+    # failures so one bad probe doesn't sink the whole shard.
+    index, count = shard
+    probes = [p for i, p in enumerate(job.get('probes', [{}])) if i % count == index]
+    start = time.perf_counter()
+
+    results = []
+    orig_frame = scene.frame_current
+    with probe_camera(scene) as cam:
+        for probe in probes:
+            probe_start = time.perf_counter()
+            try:
+                settings = probe_settings(job, probe, scene.cubemap_props)
+                result = run_probe(scene, cam, settings, assemble, report=report)
+                result['status'] = 'ok'
+            except Exception as e:
+                result = {'base_name': probe.get('base_name', ''), 'status': 'failed', 'error': str(e)}
+            result['name'] = probe.get('name', result['base_name'])
+            result['elapsed'] = time.perf_counter() - probe_start
+            print(f"Probe '{result['name']}': {result['status']} ({result['elapsed']:.1f}s)")
+            results.append(result)
+    if scene.frame_current != orig_frame:
+        scene.frame_set(orig_frame)
+
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    return {
+        'status': 'ok' if not failed else ('failed' if failed == len(results) else 'partial'),
+        'shard': [index, count],
+        'probes': results,
+        'failed': failed,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def write_status(status, status_file=""):
+    text = json.dumps(status)
+    # Single prefixed line so farm wrappers can grep it out of Blender's log
+    print(STATUS_PREFIX + text)
+    if status_file:
+        with open(status_file, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def run_worker_cli(scene, args, status_file=""):
+    try:
+        status = run_worker(scene, bpy.path.abspath(args.spool_dir), args.worker_id, args.idle_timeout)
+    except Exception as e:
+        status = {'status': 'error', 'error': f"Farm worker failed: {e}", 'probes': []}
+    write_status(status, status_file)
+    return status
+
+
+def run_cli(scene, argv=None, job_file="", status_file=""):
+    # Parse arguments (or use the explicit job file), run the job and publish
+    # the status. Returns the status dict.
+    try:
+        shard = (0, 1)
+        assemble = None
+        if not job_file:
+            args = cli_args(argv)
+            if args.spool_dir:
+                return run_worker_cli(scene, args, status_file or args.status_file)
+            job_file = args.job_file
+            status_file = status_file or args.status_file
+            shard = parse_shard(args.shard)
+            assemble = args.assemble
+        job = expand_probe_set(scene, load_job(bpy.path.abspath(job_file)))
+        job = expand_sequence(job, scene.cubemap_props)
+    except SystemExit:
+        # argparse already printed its usage message
+        status = {'status': 'error', 'error': "Invalid command line arguments", 'probes': []}
+        write_status(status, status_file)
+        return status
+    except Exception as e:
+        status = {'status': 'error', 'error': f"Failed to load job: {e}", 'probes': []}
+        write_status(status, status_file)
+        return status
+
+    if assemble is None:
+        assemble = bool(job.get('assemble', True))
+
+    status = run_job(scene, job, assemble=assemble, shard=shard)
+    if 'skipped_frames' in job:
+        status['skipped_frames'] = job['skipped_frames']
+    write_status(status, status_file)
+    return status
@@ -0,0 +1,153 @@
+import numpy as np
+
+# NumPy block-compression encoders for 8-bit RGBA images (H, W, 4), top row
+# first. All blocks of an image are encoded at once in chunks: endpoints
+# are the extreme texels along each block's principal axis, indices the
+# nearest palette entry. BC7 uses mode 6 only (one RGBA subset, 7-bit
+# endpoints with p-bits, 4-bit indices), which is good for photographic
+# content and simple to vectorize.
+
+# Blocks per vectorized chunk; bounds the (blocks, 16, palette) temporaries
+BLOCK_CHUNK = 8192
+
+BC7_WEIGHTS = np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64], dtype=np.int32)
+
+
+def to_blocks(pixels):
+    # (blocks, 16, channels) in row-major block order; edges are replicated
+    # up to a multiple of 4 so small mips still fill whole blocks
+    h, w, c = pixels.shape
+    pad_h, pad_w = -h % 4, -w % 4
+    if pad_h or pad_w:
+        pixels = np.pad(pixels, ((0, pad_h), (0, pad_w), (0, 0)), mode='edge')
+        h, w = h + pad_h, w + pad_w
+    return pixels.reshape(h // 4, 4, w // 4, 4, c).transpose(0, 2, 1, 3, 4).reshape(-1, 16, c)
+
+
+def principal_endpoints(values):
+    # Texels with the lowest and highest projection on each block's
+    # principal axis (a few power iterations of the covariance)
+    centered = values - values.mean(axis=1, keepdims=True)
+    cov = np.einsum('bni,bnj->bij', centered, centered)
+    axis = values.max(axis=1) - values.min(axis=1)
+    for _ in range(4):
+        axis = np.einsum('bij,bj->bi', cov, axis)
+        norm = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.where(norm > 1e-12, axis / np.maximum(norm, 1e-12), 1.0)
+    proj = np.einsum('bni,bi->bn', centered, axis)
+    rows = np.arange(len(values))
+    return values[rows, proj.argmin(axis=1)], values[rows, proj.argmax(axis=1)]
+
+
+def nearest(values, palette):
+    # Index of the closest palette entry per texel: (b, 16, c), (b, n, c)
+    dist = ((values[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=-1)
+    return dist.argmin(axis=-1)
+
+
+def pack_indices(indices, bits, shift):
+    packed = np.zeros(len(indices), dtype=np.uint64)
+    for i in range(indices.shape[1]):
+        packed |= indices[:, i].astype(np.uint64) << np.uint64(shift + bits * i)
+    return packed
+
+
+def expand_565(color):
+    r = (color >> 11) & 31
+    g = (color >> 5) & 63
+    b = color & 31
+    return np.stack(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)), axis=-1).astype(np.float32)
+
+
+def color_block(rgb):
+    # BC1 colour block (4-colour mode) as uint64 per block
+    low, high = principal_endpoints(rgb)
+
+    def quantize(c):
+        c = np.rint(c * (np.array([31, 63, 31]) / 255.0)).astype(np.uint32)
+        return (c[:, 0] << 11) | (c[:, 1] << 5) | c[:, 2]
+
+    c0 = quantize(high)
+    c1 = quantize(low)
+    # 4-colour mode needs color0 > color1
+    swap = c0 < c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+    e0 = expand_565(c0)
+    e1 = expand_565(c1)
+    palette = np.stack((e0, e1, (2 * e0 + e1) / 3, (e0 + 2 * e1) / 3), axis=1)
+    indices = nearest(rgb, palette)
+    indices[c0 == c1] = 0
+    return c0.astype(np.uint64) | (c1.astype(np.uint64) << np.uint64(16)) | pack_indices(indices, 2, 32)
+
+
+def alpha_block(alpha):
+    # BC3 alpha block (8-alpha mode) as uint64 per block
+    a0 = alpha.max(axis=1)
+    a1 = alpha.min(axis=1)
+    steps = np.arange(1, 7, dtype=np.float32)
+    between = ((7 - steps) * a0[:, None] + steps * a1[:, None]) / 7
+    palette = np.concatenate((a0[:, None], a1[:, None], between), axis=1)
+    indices = np.abs(alpha[:, :, None] - palette[:, None, :]).argmin(axis=-1)
+    indices[a0 == a1] = 0
+    return (a0.astype(np.uint64) | (a1.astype(np.uint64) << np.uint64(8))
+            | pack_indices(indices, 3, 16))
+
+
+def quantize_pbit(endpoint):
+    # 7-bit value and p-bit per channel set that best reproduces the
+    # endpoint (mode 6 shares one p-bit across RGBA)
+    best = None
+    for p in (0, 1):
+        q = np.clip(np.rint((endpoint - p) / 2.0), 0, 127)
+        err = (((q * 2 + p) - endpoint) ** 2).sum(axis=1)
+        if best is None:
+            best = (q, np.full(len(q), p), err)
+        else:
+            better = err < best[2]
+            best = (np.where(better[:, None], q, best[0]), np.where(better, p, best[1]), np.minimum(err, best[2]))
+    return best[0].astype(np.int32), best[1].astype(np.int32)
+
+
+def bc7_block(rgba):
+    # BC7 mode 6 as (lo, hi) uint64 halves per block
+    low, high = principal_endpoints(rgba)
+    q0, p0 = quantize_pbit(low)
+    q1, p1 = quantize_pbit(high)
+    e0 = (q0 * 2 + p0[:, None])[:, None, :]
+    e1 = (q1 * 2 + p1[:, None])[:, None, :]
+    palette = (((64 - BC7_WEIGHTS)[None, :, None] * e0 + BC7_WEIGHTS[None, :, None] * e1 + 32) >> 6).astype(np.float32)
+    indices = nearest(rgba, palette)
+
+    # The first index is stored with 3 bits: flip the block when its MSB is set
+    flip = indices[:, 0] >= 8
+    q0, q1 = np.where(flip[:, None], q1, q0), np.where(flip[:, None], q0, q1)
+    p0, p1 = np.where(flip, p1, p0), np.where(flip, p0, p1)
+    indices = np.where(flip[:, None], 15 - indices, indices)
+
+    lo = np.full(len(rgba), 1 << 6, dtype=np.uint64)
+    for channel in range(4):
+        lo |= q0[:, channel].astype(np.uint64) << np.uint64(7 + 14 * channel)
+        lo |= q1[:, channel].astype(np.uint64) << np.uint64(14 + 14 * channel)
+    lo |= p0.astype(np.uint64) << np.uint64(63)
+    hi = p1.astype(np.uint64) | (indices[:, 0].astype(np.uint64) << np.uint64(1)) | pack_indices(indices[:, 1:], 4, 4)
+    return lo, hi
+
+
+def encode_bc(pixels, fmt):
+    # Compressed bytes of an (H, W, 4) uint8 image in 'BC1', 'BC3' or 'BC7'
+    blocks = to_blocks(pixels)
+    size = 8 if fmt == 'BC1' else 16
+    out = np.empty((len(blocks), size // 8), dtype='<u8')
+    for start in range(0, len(blocks), BLOCK_CHUNK):
+        chunk = blocks[start:start + BLOCK_CHUNK].astype(np.float32)
+        rows = slice(start, start + len(chunk))
+        if fmt == 'BC1':
+            out[rows, 0] = color_block(chunk[..., :3])
+        elif fmt == 'BC3':
+            out[rows, 0] = alpha_block(chunk[..., 3])
+            out[rows, 1] = color_block(chunk[..., :3])
+        elif fmt == 'BC7':
+            out[rows, 0], out[rows, 1] = bc7_block(chunk)
+        else:
+            raise ValueError(f"Unknown block format '{fmt}'")
+    return out.tobytes()
@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from types import SimpleNamespace
+import numpy as np
+
+# Headless benchmarks for the add-on's hot paths. The NumPy stages run with
+# plain Python, the Cycles face loop inside Blender on a small synthetic
+# scene built by this script:
+#
+#   python benchmarks/bench.py --out results.json --baseline baseline.json
+#   blender -b --factory-startup --python benchmarks/bench.py -- --render --out render.json
+#
+# Each case reports its best wall time over --repeat runs (plus the first,
+# cold run), throughput in output megapixels per second and peak RSS. With
+# --baseline a case fails when its throughput drops by more than
+# --max-slowdown or its peak memory grows by more than --max-memory-growth,
+# and the exit code is 1. Results are only comparable on the same machine.
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "cubemap_bench"
+
+RESULTS_VERSION = 1
+
+ASSEMBLY_SIZES = (512, 1024, 2048, 4096, 8192)
+ASSEMBLY_FORMATS = ('PNG', 'JPEG', 'OPEN_EXR')
+
+
+def load_package():
+    # The add-on modules without running its registration
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [REPO]
+        sys.modules[PACKAGE] = package
+    return sys.modules[PACKAGE]
+
+
+def module(name):
+    load_package()
+    return __import__(f"{PACKAGE}.{name}", fromlist=[name])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def settings_for(size, file_format, layout='STRIP', stream=False):
+    return SimpleNamespace(
+        base_name="bench", engine_preset='UE5', resolution=size, file_format=file_format, exr_depth='16',
+        strip_container='FACE', layout=layout, stream_assembly=stream, capture_mode='FACES', write_faces=True,
+        convert_size=0, sample_filter='BILINEAR', use_render_cache=False, hdri_source='FILE', hdri_path="",
+        background_write=True, png_compression=6, jpeg_quality=90, jpeg_subsampling='4:2:0',
+    )
+
+
+def synthetic_face(size, index, file_format):
+    # Smooth gradients plus a high-frequency pattern, so PNG and JPEG do
+    # real work; float faces have an HDR range
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    rgb = np.stack((x, y, 0.5 + 0.5 * np.sin(40.0 * (x + y) + index)), axis=-1)
+    if file_format == 'OPEN_EXR':
+        alpha = np.ones((size, size, 1), dtype=np.float32)
+        return np.concatenate((rgb * 4.0, alpha), axis=-1)
+    rgb = (rgb * 255.0 + 0.5).astype(np.uint8)
+    if file_format == 'JPEG':
+        return rgb
+    return np.concatenate((rgb, np.full((size, size, 1), 255, dtype=np.uint8)), axis=-1)
+
+
+def measure(run, repeat, pixels):
+    metrics = module("metrics")
+    times = []
+    metrics.reset_peak_rss()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        'seconds': best,
+        'first': times[0],
+        'repeat': repeat,
+        'mpix_per_s': pixels / best / 1e6 if best > 0 else None,
+        'peak_rss': metrics.peak_rss(),
+    }
+
+
+def run_case(cases, name, run, repeat, pixels):
+    print(f"{name:<40}", end="", flush=True)
+    try:
+        result = measure(run, repeat, pixels)
+    except ImportError as e:
+        result = {'skipped': str(e)}
+        print(f"skipped ({e})")
+    else:
+        print(f"{result['seconds']:>9.3f}s {result['mpix_per_s'] or 0:>9.1f} MP/s "
+              f"{(result['peak_rss'] or 0) / 2 ** 20:>9.0f} MB")
+    cases[name] = result
+
+
+def bench_assembly(cases, sizes, formats, repeat, work_dir):
+    assembly = module("assembly")
+    image_io = module("image_io")
+    face_dir = os.path.join(work_dir, "faces")
+    for file_format in formats:
+        for size in sizes:
+            os.makedirs(face_dir, exist_ok=True)
+            settings = settings_for(size, file_format)
+            paths = assembly.face_paths(face_dir, settings.base_name, settings.engine_preset, file_format)
+            try:
+                for index, path in enumerate(paths):
+                    face = synthetic_face(size, index, file_format)
+                    image_io.write_image(path, face, **assembly.strip_options(path, settings))
+                del face
+            except ImportError as e:
+                cases[f"stitch/{file_format}/{size}"] = {'skipped': str(e)}
+                shutil.rmtree(face_dir)
+                continue
+
+            pixels = 6 * size * size
+            run_case(cases, f"stitch/{file_format}/{size}",
+                     lambda: assembly.stitch_strip(face_dir, settings), repeat, pixels)
+            if file_format != 'JPEG':
+                stream = settings_for(size, file_format, stream=True)
+                run_case(cases, f"stitch_stream/{file_format}/{size}",
+                         lambda: assembly.stitch_strip(face_dir, stream), repeat, pixels)
+            cross = settings_for(size, file_format, layout='CROSS_H')
+            run_case(cases, f"stitch_cross/{file_format}/{size}",
+                     lambda: assembly.stitch_strip(face_dir, cross), repeat, 12 * size * size)
+            shutil.rmtree(face_dir)
+
+
+def bench_stages(cases, size, repeat):
+    # NumPy stages on in-memory float faces
+    const = module("const")
+    projection = module("projection")
+    reproject = module("reproject")
+    prefilter = module("prefilter")
+    sh = module("sh")
+    containers = module("containers")
+    pyramid = module("pyramid")
+
+    faces = [synthetic_face(size, index, 'OPEN_EXR') for index in range(6)]
+    infos = [(size, size, 4, np.float32)] * 6
+    preset_faces = const.CUBEMAP_PRESETS['UE5']['faces']
+
+    y, x = np.mgrid[0:2 * size, 0:4 * size].astype(np.float32)
+    equirect = np.stack((x / (4 * size), y / (2 * size), np.sin(x * 0.05) * 0.5 + 0.5), axis=-1)
+    for sample_filter in ('BILINEAR', 'BICUBIC'):
+        run_case(cases, f"resample/{sample_filter.lower()}/{size}",
+                 lambda: projection.equirect_to_faces(equirect, preset_faces, size, sample_filter),
+                 repeat, 6 * size * size)
+    del equirect
+
+    for target in reproject.CONVERT_SUFFIXES:
+        width, height = reproject.output_size(target, size)
+        run_case(cases, f"convert/{target.lower()}/{size}",
+                 lambda: reproject.convert_faces(faces, infos, 'UE5', target), repeat, width * height)
+
+    run_case(cases, f"sh9/{size}", lambda: sh.project_sh(faces, infos, 'UE5'), repeat, 6 * size * size)
+
+    small = min(size, 256)
+    small_faces = [face[:small, :small] for face in faces]
+    small_infos = [(small, small, 4, np.float32)] * 6
+    mip_pixels = sum(6 * s * s for s in prefilter.prefilter_sizes(small)[1:])
+    run_case(cases, f"prefilter/{small}",
+             lambda: prefilter.prefilter_faces(small_faces, small_infos, 'UE5', samples=32), repeat, mip_pixels)
+
+    linear = containers.linear_faces(faces, infos)
+    tier_pixels = sum(6 * s * s for s in pyramid.tier_sizes(size, 3))
+    for tier_filter, downsample in pyramid.TIER_FILTERS.items():
+        def chain():
+            level = linear
+            for _ in pyramid.tier_sizes(size, 3):
+                level = downsample(level)
+        run_case(cases, f"tiers/{tier_filter.lower()}/{size}", chain, repeat, tier_pixels)
+
+    for fmt in ('RGBA16F', 'BC1', 'BC7'):
+        run_case(cases, f"encode/{fmt}/{size}", lambda: containers.encode_levels([linear], fmt), repeat,
+                 6 * size * size)
+
+
+def build_scene(bpy, samples):
+    # A few shaded primitives around the origin, a sun and a plain world
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    scene.render.engine = 'CYCLES'
+    scene.cycles.device = 'CPU'
+    scene.cycles.samples = samples
+    scene.cycles.use_denoising = False
+    scene.render.resolution_percentage = 100
+
+    world = bpy.data.worlds.new("BenchWorld")
+    world.color = (0.2, 0.3, 0.5)
+    scene.world = world
+
+    material = bpy.data.materials.new("BenchMaterial")
+    material.diffuse_color = (0.8, 0.4, 0.2, 1.0)
+    for index, location in enumerate(((3, 0, 0), (-3, 0, 0), (0, 3, 0), (0, -3, 0), (0, 0, 3), (0, 0, -3))):
+        if index % 2:
+            bpy.ops.mesh.primitive_uv_sphere_add(radius=1.0, location=location, segments=64, ring_count=32)
+        else:
+            bpy.ops.mesh.primitive_cube_add(size=1.5, location=location)
+        bpy.context.active_object.data.materials.append(material)
+    bpy.ops.mesh.primitive_plane_add(size=40.0, location=(0, 0, -5))
+
+    sun = bpy.data.objects.new("BenchSun", bpy.data.lights.new("BenchSun", 'SUN'))
+    sun.rotation_euler = (0.6, 0.2, 0.8)
+    scene.collection.objects.link(sun)
+
+    cam = bpy.data.objects.new("BenchCamera", bpy.data.cameras.new("BenchCamera"))
+    scene.collection.objects.link(cam)
+    scene.camera = cam
+    return scene, cam
+
+
+def bench_render(cases, size, samples, repeat, work_dir):
+    import bpy
+    capture = module("capture")
+    scene, cam = build_scene(bpy, samples)
+    for mode in ('FACES', 'PERSISTENT', 'PANORAMA'):
+        settings = settings_for(size, 'PNG')
+        settings.capture_mode = mode
+        run_case(cases, f"render/{mode.lower()}/{size}",
+                 lambda: capture.capture_cubemap(scene, cam, settings, work_dir), repeat, 6 * size * size)
+
+
+def compare(results, baseline, max_slowdown, max_memory_growth):
+    # Failure messages for cases that regressed against the baseline
+    failures = []
+    for name, case in results['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if not base or 'skipped' in case or 'skipped' in base:
+            continue
+        if base.get('mpix_per_s'):
+            if case.get('mpix_per_s') is None:
+                # A run too fast to time has no throughput to compare
+                failures.append(f"{name}: no throughput measured, baseline {base['mpix_per_s']:.1f} MP/s")
+            elif case['mpix_per_s'] < base['mpix_per_s'] * (1.0 - max_slowdown):
+                failures.append(f"{name}: {case['mpix_per_s']:.1f} MP/s, baseline {base['mpix_per_s']:.1f} MP/s")
+        if base.get('peak_rss') and case['peak_rss'] and case['peak_rss'] > base['peak_rss'] * (1.0 + max_memory_growth):
+            failures.append(f"{name}: peak {case['peak_rss'] / 2 ** 20:.0f} MB, "
+                            f"baseline {base['peak_rss'] / 2 ** 20:.0f} MB")
+    return failures
+
+
+def parse_args(argv):
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    else:
+        argv = argv[1:]
+    parser = argparse.ArgumentParser(prog="bench", description="Cubemap Renderer benchmarks")
+    parser.add_argument("--out", default="", help="Write the JSON results to this file")
+    parser.add_argument("--baseline", default="", help="JSON results to compare against")
+    parser.add_argument("--max-slowdown", type=float, default=0.15, help="Allowed throughput drop (fraction)")
+    parser.add_argument("--max-memory-growth", type=float, default=0.10, help="Allowed peak RSS growth (fraction)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", default=",".join(map(str, ASSEMBLY_SIZES)), help="Assembly face sizes")
+    parser.add_argument("--formats", default=",".join(ASSEMBLY_FORMATS), help="Assembly face formats")
+    parser.add_argument("--stage-size", type=int, default=1024, help="Face size for resample/convert/SH/encode")
+    parser.add_argument("--only", default="", help="Comma-separated groups: assembly, stages, render")
+    parser.add_argument("--render", action="store_true", help="Also run the Cycles face loop (inside Blender)")
+    parser.add_argument("--render-size", type=int, default=128)
+    parser.add_argument("--render-samples", type=int, default=16)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv if argv is None else argv)
+    groups = set(args.only.split(",")) if args.only else {'assembly', 'stages'} | ({'render'} if args.render else set())
+    if 'render' in groups and 'bpy' not in sys.modules:
+        try:
+            import bpy  # noqa: F401
+        except ImportError:
+            print("The render benchmark has to run inside Blender", file=sys.stderr)
+            return 2
+
+    work_dir = tempfile.mkdtemp(prefix="cubemap_bench_")
+    # Lookup tables are built fresh, so the first run of a case is cold
+    os.environ['CUBEMAP_CACHE_DIR'] = os.path.join(work_dir, "cache")
+    cases = {}
+    try:
+        if 'assembly' in groups:
+            bench_assembly(cases, [int(s) for s in args.sizes.split(",")], args.formats.split(","), args.repeat,
+                           work_dir)
+        if 'stages' in groups:
+            bench_stages(cases, args.stage_size, args.repeat)
+        if 'render' in groups:
+            bench_render(cases, args.render_size, args.render_samples, args.repeat, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+        },
+        'cases': cases,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != results['machine']:
+            print("Warning: baseline was recorded on a different machine", file=sys.stderr)
+        failures = compare(results, baseline, args.max_slowdown, args.max_memory_growth)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
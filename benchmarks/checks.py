@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import contextlib
+import argparse
+import tempfile
+import traceback
+import numpy as np
+from bench import module
+
+# Headless correctness checks for properties the benchmarks can't see, run
+# with plain Python:
+#
+#   python benchmarks/checks.py
+#   python benchmarks/checks.py --only sh
+#
+# Each check raises AssertionError with what went wrong; the exit code is 1
+# when any check fails.
+
+CHECKS = {}
+
+
+def check(run):
+    CHECKS[run.__name__[len("check_"):]] = run
+    return run
+
+
+@check
+def check_sh(work_dir):
+    # Odd face sizes are reduced like even ones, so the cached weight table
+    # stays at most SH_MAX_SIZE per side. Constant radiance 0.5 projects to
+    # L00 = 0.5 * sqrt(4 pi) whatever the size.
+    sh = module("sh")
+    tables = module("utils").cache_dir("tables")
+    limit = 6 * sh.SH_MAX_SIZE ** 2
+    expected = 0.5 * np.sqrt(4.0 * np.pi)
+    for size in (256, 1025, 4095, 9999):
+        faces = [np.broadcast_to(np.float32(0.5), (size, size, 3))] * 6
+        infos = [(size, size, 3, np.dtype(np.float32))] * 6
+        radiance = sh.project_sh(faces, infos, 'UE5')
+        assert np.allclose(radiance[0], expected, rtol=1e-3), f"{size}: L00 {radiance[0]}, expected {expected:.4f}"
+        assert np.allclose(radiance[1:], 0.0, atol=1e-3), f"{size}: higher bands {radiance[1:].ravel()} not zero"
+        for name in os.listdir(tables):
+            rows = np.load(os.path.join(tables, name), mmap_mode='r').shape[0]
+            assert rows <= limit, f"{size}: {name} has {rows} rows, limit {limit}"
+
+
+@check
+def check_layouts(work_dir):
+    # Every pair of neighbouring cells of a cross must continue each other:
+    # on faces holding their own view directions, the texels on either side
+    # of a shared edge point less than a texel or so apart. Streamed
+    # assembly must place the cells the same way.
+    const = module("const")
+    projection = module("projection")
+    layouts = module("layouts")
+    assembly = module("assembly")
+    size = 16
+    for preset_key, preset in const.CUBEMAP_PRESETS.items():
+        faces = []
+        for _, rot in preset['faces']:
+            dirs = projection.face_directions(rot, size)
+            faces.append((dirs / np.linalg.norm(dirs, axis=-1, keepdims=True)).astype(np.float32))
+        for layout_key in ('CROSS_H', 'CROSS_V'):
+            image = assembly.assemble_faces(faces, layout_key, preset_key)
+            cells = {(col, row) for _, col, row, _, _ in layouts.layout_cells(layout_key, preset_key)}
+            for col, row in cells:
+                cell = image[row * size:(row + 1) * size, col * size:(col + 1) * size]
+                if (col + 1, row) in cells:
+                    across = image[row * size:(row + 1) * size, (col + 1) * size]
+                    gap = np.linalg.norm(cell[:, -1] - across, axis=-1).max()
+                    assert gap < 0.25, f"{preset_key} {layout_key}: seam right of cell {col},{row} is {gap:.2f} wide"
+                if (col, row + 1) in cells:
+                    across = image[(row + 1) * size, col * size:(col + 1) * size]
+                    gap = np.linalg.norm(cell[-1] - across, axis=-1).max()
+                    assert gap < 0.25, f"{preset_key} {layout_key}: seam below cell {col},{row} is {gap:.2f} wide"
+
+            path = os.path.join(work_dir, f"{preset_key}_{layout_key}.npy")
+            assembly.stream_mapped(faces, path, layout_key, preset_key)
+            assert np.array_equal(np.load(path), image), f"{preset_key} {layout_key}: streamed cells differ"
+
+
+def farm_worker(spool_dir, mode):
+    # A serve() worker process with a stub task runner. Every task it starts
+    # is logged to claims.log. 'victim' kills its own process on its first
+    # task; 'late' starts after it, so the victim is sure to get one;
+    # 'flaky' fails task p0001 every time.
+    farm = module("farm")
+    if mode == 'late':
+        time.sleep(1.0)
+
+    def execute(job, task):
+        with open(os.path.join(spool_dir, "claims.log"), "a", encoding="utf-8") as f:
+            f.write(f"{task['id']} {mode} {os.getpid()}\n")
+        if mode == 'victim':
+            os.kill(os.getpid(), signal.SIGKILL)
+        if mode == 'flaky' and task['id'] == "p0001":
+            raise RuntimeError("stub failure")
+        time.sleep(0.05)
+        return {'base_name': job['probes'][task['probe']]['base_name'], 'status': 'ok'}
+
+    farm.serve(spool_dir, execute, poll=0.05)
+
+
+def run_local_farm(spool_dir, modes, probes, retries=2, timeout=2.0):
+    # run_farm with one local worker process per mode. Returns (status,
+    # task ids in claim order).
+    farm = module("farm")
+    job = {'probes': [{'base_name': f"probe{index}"} for index in range(probes)]}
+    commands = [[sys.executable, os.path.abspath(__file__), "--farm-worker", spool_dir, mode] for mode in modes]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        status = farm.run_farm(spool_dir, job, retries=retries, commands=commands, timeout=timeout,
+                               no_worker_timeout=30.0)
+    try:
+        with open(os.path.join(spool_dir, "claims.log"), "r", encoding="utf-8") as f:
+            claims = [line.split()[0] for line in f]
+    except OSError:
+        claims = []
+    return status, claims
+
+
+@check
+def check_farm(work_dir):
+    # The spool queue with real worker processes racing for tasks: each task
+    # runs exactly once, a killed worker's task is taken back once its
+    # heartbeat goes stale, and a failing task is retried `retries` times.
+    status, claims = run_local_farm(os.path.join(work_dir, "race"), ['ok'] * 3, 24)
+    assert status['status'] == 'ok', f"race: {status['errors']}"
+    assert sorted(claims) == [f"p{index:04d}" for index in range(24)], f"race: claims {sorted(claims)}"
+
+    status, claims = run_local_farm(os.path.join(work_dir, "killed"), ['victim', 'late', 'late'], 6)
+    assert status['status'] == 'ok', f"killed: {status['errors']}"
+    assert status['retried'] >= 1, "killed: the dead worker's task was not requeued"
+    assert len(claims) == 7 and set(claims) == {f"p{index:04d}" for index in range(6)}, f"killed: claims {claims}"
+
+    status, claims = run_local_farm(os.path.join(work_dir, "retries"), ['flaky'] * 2, 3, retries=2)
+    assert status['status'] == 'partial', f"retries: status {status['status']}"
+    assert claims.count("p0001") == 3, f"retries: p0001 ran {claims.count('p0001')} times, expected 3"
+    assert status['probes'][1]['status'] == 'failed' and status['retried'] == 2, f"retries: {status}"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="checks", description="Cubemap Renderer correctness checks")
+    parser.add_argument("--only", default="", help=f"Comma-separated checks: {', '.join(CHECKS)}")
+    parser.add_argument("--farm-worker", nargs=2, metavar=("SPOOL", "MODE"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv[1:])
+
+
+def main(argv=None):
+    args = parse_args(sys.argv if argv is None else argv)
+    if args.farm_worker:
+        farm_worker(*args.farm_worker)
+        return 0
+    names = args.only.split(",") if args.only else list(CHECKS)
+    work_dir = tempfile.mkdtemp(prefix="cubemap_checks_")
+    os.environ['CUBEMAP_CACHE_DIR'] = os.path.join(work_dir, "cache")
+    failed = 0
+    try:
+        for name in names:
+            print(f"{name:<20}", end="", flush=True)
+            case_dir = os.path.join(work_dir, name)
+            os.makedirs(case_dir)
+            try:
+                CHECKS[name](case_dir)
+            except Exception:
+                failed += 1
+                print("FAILED")
+                traceback.print_exc()
+            else:
+                print("ok")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
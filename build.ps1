@@ -56,6 +56,7 @@ $ExcludePatterns = @(
     "dist",
     "build\.ps1",
     "BUILD\.md",
+    "benchmarks",
     "\.pyc",
     "__pycache__",
     "\.log",
@@ -0,0 +1,759 @@
+import bpy
+import os
+import math
+import shutil
+import tempfile
+import time
+import numpy as np
+from .const import CUBEMAP_PRESETS, FLOAT_FORMATS, FORMAT_EXTENSIONS, PANORAMA_ROTATION
+from .projection import equirect_to_faces
+from .image_io import BackgroundWriter, BandReader, open_writer, read_image, write_image
+from .metrics import phase
+from .assembly import STREAM_BAND_ROWS, face_paths, strip_options
+from .utils import is_pillow_installed, make_pool
+from .rendercache import cached_faces, face_fingerprints, load_manifest, save_manifest
+
+
+# Background face encoding: writer processes and faces held in the queue
+WRITE_WORKERS = 2
+WRITE_QUEUE = 2
+
+# Largest face rendered or resampled in one piece; bigger faces need the
+# tiled capture
+MAX_FACE_SIZE = 8192
+
+# Tiled captures grow every border render by this many pixels on each side
+# and keep only the inner part, so the denoiser sees past the tile seams
+TILE_MARGIN = 16
+
+
+def scratch_dir():
+    # RAM-backed when available so render handoffs never touch the disk
+    shm = "/dev/shm"
+    return tempfile.mkdtemp(prefix="cubemap_", dir=shm if os.path.isdir(shm) else None)
+
+
+def read_render_result(scene, display=False):
+    # Last render as float32 (height, width, 4), top row first. 'Render Result'
+    # has no pixel buffer of its own, so it is dumped uncompressed to a scratch
+    # file and read back with foreach_get: a float EXR for scene-linear data,
+    # or a 16-bit TIFF with the view transform applied when display=True.
+    result = bpy.data.images.get('Render Result')
+    if result is None:
+        raise RuntimeError("No render result available")
+
+    settings = scene.render.image_settings
+    orig = (settings.file_format, settings.color_mode, settings.color_depth,
+            settings.exr_codec, settings.tiff_codec)
+    tmp_dir = scratch_dir()
+    path = os.path.join(tmp_dir, "render_result.tif" if display else "render_result.exr")
+    try:
+        if display:
+            settings.file_format = 'TIFF'
+            settings.color_mode = 'RGBA'
+            settings.color_depth = '16'
+            settings.tiff_codec = 'NONE'
+        else:
+            settings.file_format = 'OPEN_EXR'
+            settings.color_mode = 'RGBA'
+            settings.color_depth = '32'
+            settings.exr_codec = 'NONE'
+        result.save_render(path, scene=scene)
+    finally:
+        settings.file_format = orig[0]
+        settings.color_mode = orig[1]
+        settings.color_depth = orig[2]
+        settings.exr_codec = orig[3]
+        settings.tiff_codec = orig[4]
+
+    return load_scratch(path, display)
+
+
+def load_scratch(path, display):
+    # Read back and delete a scratch file written by read_render_result
+    img = bpy.data.images.load(path)
+    try:
+        if display:
+            # Keep the stored display values instead of linearizing them
+            img.colorspace_settings.is_data = True
+        width, height = img.size
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+    finally:
+        bpy.data.images.remove(img)
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    return pixels.reshape(height, width, 4)[::-1]
+
+
+def display_pixels(scene, pixels):
+    # Apply the scene view transform to scene-linear RGBA pixels, the same
+    # way read_render_result(display=True) does for a render
+    settings = scene.render.image_settings
+    orig = (settings.file_format, settings.color_mode, settings.color_depth, settings.tiff_codec)
+    path = os.path.join(scratch_dir(), "display.tif")
+    try:
+        settings.file_format = 'TIFF'
+        settings.color_mode = 'RGBA'
+        settings.color_depth = '16'
+        settings.tiff_codec = 'NONE'
+        save_face(scene, pixels, path)
+    finally:
+        settings.file_format = orig[0]
+        settings.color_mode = orig[1]
+        settings.color_depth = orig[2]
+        settings.tiff_codec = orig[3]
+    return load_scratch(path, display=True)
+
+
+def is_float_output(image_settings):
+    return image_settings.file_format in FLOAT_FORMATS
+
+
+def write_options(image_settings):
+    # Writer options matching the scene output settings
+    if image_settings.file_format == 'OPEN_EXR':
+        return {'half': image_settings.color_depth == '16'}
+    return {}
+
+
+def output_pixels(pixels, image_settings):
+    # Convert a grabbed render (display-referred for 8/16-bit formats,
+    # scene-linear for float ones) to what the scene's output settings would
+    # write: channel count and integer depth, or float32 left unclamped.
+    fmt = image_settings.file_format
+    channels = 4 if image_settings.color_mode == 'RGBA' and fmt not in ('JPEG', 'HDR') else 3
+    pixels = pixels[:, :, :channels]
+    if fmt in FLOAT_FORMATS:
+        return np.ascontiguousarray(pixels, dtype=np.float32)
+    if fmt == 'PNG' and image_settings.color_depth == '16':
+        return (np.clip(pixels, 0.0, 1.0) * 65535.0 + 0.5).astype(np.uint16)
+    return (np.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+def grab_face(scene):
+    # The render result as the output pixels a face file of the scene's
+    # output settings would hold
+    image_settings = scene.render.image_settings
+    grabbed = read_render_result(scene, display=not is_float_output(image_settings))
+    return output_pixels(grabbed, image_settings)
+
+
+def face_writer(settings, write):
+    # A BackgroundWriter when faces are written and the format can be encoded
+    # off the main thread (JPEG needs Pillow there; Blender's encoder is
+    # main-thread only), else None
+    if not (settings.background_write and write):
+        return None
+    if settings.file_format == 'JPEG' and not is_pillow_installed():
+        return None
+    return BackgroundWriter(WRITE_WORKERS, WRITE_QUEUE)
+
+
+def save_face(scene, pixels, filepath):
+    # Write a scene-linear face through the scene's output settings so the
+    # view transform and format match a regular render with write_still.
+    height, width = pixels.shape[:2]
+    img = bpy.data.images.new("cubemap_face", width, height, alpha=True, float_buffer=True)
+    try:
+        img.pixels.foreach_set(np.ascontiguousarray(pixels[::-1], dtype=np.float32).ravel())
+        img.save_render(filepath, scene=scene)
+    finally:
+        bpy.data.images.remove(img)
+
+
+def render_panorama_faces(scene, cam, faces, size, output_dir, base_name, collect=False, write=True,
+                          sample_filter='BILINEAR'):
+    # Render one equirectangular Cycles image and resample it into the faces.
+    # With collect=True the panorama is grabbed display-referred and the faces
+    # are returned as output pixels for in-memory assembly.
+    render = scene.render
+    cam_data = cam.data
+    orig_engine = render.engine
+    orig_type = cam_data.type
+    orig_pano = (
+        cam_data.panorama_type,
+        cam_data.latitude_min, cam_data.latitude_max,
+        cam_data.longitude_min, cam_data.longitude_max,
+    )
+
+    try:
+        render.engine = 'CYCLES'
+        cam_data.type = 'PANO'
+        cam_data.panorama_type = 'EQUIRECTANGULAR'
+        cam_data.latitude_min = -math.pi / 2
+        cam_data.latitude_max = math.pi / 2
+        cam_data.longitude_min = -math.pi
+        cam_data.longitude_max = math.pi
+
+        # 4N x 2N keeps equator sampling on par with an N x N face
+        render.resolution_x = size * 4
+        render.resolution_y = size * 2
+        cam.rotation_euler = PANORAMA_ROTATION
+        bpy.context.view_layer.update()
+
+        bpy.ops.render.render()
+        equirect = read_render_result(scene, display=collect and not is_float_output(render.image_settings))
+    finally:
+        render.engine = orig_engine
+        cam_data.type = orig_type
+        cam_data.panorama_type = orig_pano[0]
+        cam_data.latitude_min, cam_data.latitude_max = orig_pano[1:3]
+        cam_data.longitude_min, cam_data.longitude_max = orig_pano[3:5]
+
+    return extract_faces(scene, equirect, faces, size, output_dir, base_name, collect, write, sample_filter)
+
+
+def world_environment(scene):
+    # Image and strength of the world's Environment Texture. A Mapping node
+    # in front of it is not taken into account.
+    world = scene.world
+    if world is None or world.node_tree is None:
+        raise ValueError("The scene has no world node tree")
+    for node in world.node_tree.nodes:
+        if node.type == 'TEX_ENVIRONMENT' and node.image is not None:
+            strength = 1.0
+            for link in node.outputs['Color'].links:
+                if link.to_node.type == 'BACKGROUND':
+                    strength = link.to_node.inputs['Strength'].default_value
+            return node.image, strength
+    raise ValueError("The world has no Environment Texture with an image")
+
+
+def image_pixels(image):
+    # Scene-linear float32 RGBA pixels of an image datablock, top row first
+    width, height = image.size
+    if not width or not height:
+        raise ValueError(f"Image '{image.name}' has no pixels (is the file missing?)")
+    channels = image.channels
+    pixels = np.empty(width * height * channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(height, width, channels)[::-1]
+
+    rgba = np.ones((height, width, 4), dtype=np.float32)
+    rgba[..., :min(channels, 3)] = pixels[..., :min(channels, 3)]
+    if channels < 3:
+        rgba[..., 1:3] = pixels[..., :1]
+    # Byte images keep their encoded values in .pixels
+    if not image.is_float and image.colorspace_settings.name == 'sRGB':
+        rgb = rgba[..., :3]
+        rgba[..., :3] = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return rgba
+
+
+def environment_faces(scene, settings, output_dir, collect=False):
+    # Resample an equirectangular image (the world's Environment Texture or
+    # settings.hdri_path) into the preset faces without rendering. Writes
+    # the faces through the scene output settings like capture_cubemap;
+    # returns the faces as output pixels with collect=True.
+    preset = CUBEMAP_PRESETS.get(settings.engine_preset)
+    if not preset:
+        raise ValueError("Invalid engine preset")
+
+    if settings.hdri_source == 'FILE':
+        path = bpy.path.abspath(settings.hdri_path)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"HDRI not found: {path}")
+        image = bpy.data.images.load(path, check_existing=False)
+        try:
+            equirect = image_pixels(image)
+        finally:
+            bpy.data.images.remove(image)
+    else:
+        image, strength = world_environment(scene)
+        equirect = image_pixels(image)
+        equirect[..., :3] *= strength
+
+    settings_out = scene.render.image_settings
+    orig = (settings_out.file_format, settings_out.color_depth, settings_out.exr_codec)
+    try:
+        settings_out.file_format = settings.file_format
+        if settings.file_format == 'OPEN_EXR':
+            settings_out.color_depth = settings.exr_depth
+            settings_out.exr_codec = 'ZIP'
+        if collect and not is_float_output(settings_out):
+            equirect = display_pixels(scene, equirect)
+        write = settings.write_faces or not collect
+        return extract_faces(scene, equirect, preset['faces'], settings.resolution, output_dir,
+                             settings.base_name, collect, write, settings.sample_filter)
+    finally:
+        settings_out.file_format = orig[0]
+        settings_out.color_depth = orig[1]
+        settings_out.exr_codec = orig[2]
+
+
+def extract_faces(scene, equirect, faces, size, output_dir, base_name, collect, write, sample_filter):
+    # Resample a world-aligned equirect into the faces and write or collect
+    # them. The equirect is display-referred when collecting 8/16-bit output.
+    render = scene.render
+    ext = FORMAT_EXTENSIONS[render.image_settings.file_format]
+    collected = []
+    for idx, ((suffix, _), face) in enumerate(zip(faces, equirect_to_faces(equirect, faces, size, sample_filter))):
+        filepath = os.path.join(output_dir, f"{base_name}_{idx+1}_{suffix}{ext}")
+        if collect:
+            face = output_pixels(face, render.image_settings)
+            collected.append(face)
+            if write:
+                write_image(filepath, face, **write_options(render.image_settings))
+        elif write:
+            save_face(scene, face, filepath)
+        print(f"[{idx+1}/6] Extracted: {suffix}" + (f" -> {filepath}" if write else ""))
+    return collected if collect else None
+
+
+def render_view_faces(scene, cam, faces, output_dir, base_name, persistent=False, report=None,
+                      collect=False, write=True, cached=(), writer=None, write_options=None, skip=(),
+                      written=None):
+    # Six 90° renders. With persistent=True Cycles keeps the synced scene and
+    # BVH between faces, so only the camera is re-synced for faces 2-6.
+    # collect=True also returns each face as output pixels, taken straight
+    # from the render result; write=False then skips the face files.
+    # Faces whose index is in `cached` are read back from their files. With a
+    # BackgroundWriter the grabbed faces are encoded by its workers while the
+    # next face renders; the caller closes it to wait for the files. Faces in
+    # `skip` are left out altogether. written(idx) is called on this thread
+    # once a face file is on disk; the writer's close() reports the last ones.
+    render = scene.render
+    orig_persistent = render.use_persistent_data
+    ext = FORMAT_EXTENSIONS[render.image_settings.file_format]
+    timings = []
+    collected = []
+
+    try:
+        if persistent:
+            render.use_persistent_data = True
+
+        for idx, (suffix, rot) in enumerate(faces):
+            if idx in skip:
+                continue
+            filepath = os.path.join(output_dir, f"{base_name}_{idx+1}_{suffix}{ext}")
+            if idx in cached:
+                if collect:
+                    collected.append(read_image(filepath))
+                timings.append({'face': suffix, 'update': 0.0, 'render': 0.0, 'grab': 0.0, 'write': 0.0,
+                                'cached': True})
+                print(f"[{idx+1}/6] Unchanged: {suffix} -> {filepath}")
+                continue
+
+            t0 = time.perf_counter()
+            aim_face(cam, rot)
+            t1 = time.perf_counter()
+
+            bpy.ops.render.render()
+            t2 = time.perf_counter()
+
+            if collect or (write and writer):
+                pixels = grab_face(scene)
+                if collect:
+                    collected.append(pixels)
+            t3 = time.perf_counter()
+            if write and writer:
+                callback = (lambda _, idx=idx: written(idx)) if written else None
+                writer.submit(filepath, pixels, callback=callback, **(write_options or {}))
+                writer.drain()
+            elif write:
+                bpy.data.images['Render Result'].save_render(filepath, scene=scene)
+                if written:
+                    written(idx)
+            t4 = time.perf_counter()
+
+            timings.append({
+                'face': suffix,
+                'update': t1 - t0,
+                'render': t2 - t1,
+                'grab': t3 - t2,
+                'write': t4 - t3,
+            })
+            print(f"[{idx+1}/6] Rendered: {suffix} -> {filepath} "
+                  f"(render {t2 - t1:.2f}s, write {t4 - t3:.2f}s)")
+            if report:
+                report({'INFO'}, f"Rendered {idx+1}/6: {suffix}")
+    finally:
+        render.use_persistent_data = orig_persistent
+
+    print_timings(timings)
+    return timings, (collected if collect else None)
+
+
+def tile_grid(size, tile):
+    # [(x0, y0, x1, y1)] covering a size x size face, top row first
+    edges = list(range(0, size, tile)) + [size]
+    return [(x0, y0, x1, y1) for y0, y1 in zip(edges, edges[1:]) for x0, x1 in zip(edges, edges[1:])]
+
+
+def set_border(render, size, x0, y0, x1, y1):
+    # Pixel rect as a render border; Blender's border y runs bottom-up
+    render.border_min_x = x0 / size
+    render.border_max_x = x1 / size
+    render.border_min_y = (size - y1) / size
+    render.border_max_y = (size - y0) / size
+
+
+def tile_buffer_dir(output_dir, base_name):
+    return os.path.join(output_dir, f".{base_name}_tiles")
+
+
+def remove_tile_buffers(output_dir, base_name):
+    # Called once the faces of a tiled capture are assembled. A buffer still
+    # mapped elsewhere can't be deleted on Windows; it goes with the next
+    # tiled capture of the probe.
+    shutil.rmtree(tile_buffer_dir(output_dir, base_name), ignore_errors=True)
+
+
+def encode_buffer(buffer_path, filepath, options):
+    # Write a face file from its buffer a band at a time (in a worker
+    # process, which maps the buffer itself)
+    face = np.load(buffer_path, mmap_mode='r')
+    height, width, channels = face.shape
+    with open_writer(filepath, width, height, channels, face.dtype, **options) as writer:
+        for y in range(0, height, STREAM_BAND_ROWS):
+            writer.write_rows(face[y:y + STREAM_BAND_ROWS])
+
+
+def load_buffer(filepath, buffer_path):
+    # Copy an unchanged face file into its buffer a band at a time
+    reader = BandReader(filepath, spill_dir=os.path.dirname(buffer_path))
+    try:
+        buffer = np.lib.format.open_memmap(buffer_path, mode='w+', dtype=reader.dtype,
+                                           shape=(reader.height, reader.width, reader.channels))
+        for y in range(0, reader.height, STREAM_BAND_ROWS):
+            buffer[y:y + STREAM_BAND_ROWS] = reader.read_rows(y, min(y + STREAM_BAND_ROWS, reader.height))
+        buffer.flush()
+    finally:
+        reader.close()
+
+
+def render_tiled_faces(scene, cam, faces, size, tile, output_dir, base_name, report=None, collect=False,
+                       write=True, cached=(), write_options=None, written=None):
+    # Six 90° views, each rendered as a grid of border renders cropped to
+    # the tile, so the renderer only ever allocates one tile. Tiles are
+    # streamed into a memory-mapped .npy buffer per face in a hidden folder
+    # next to the outputs; face files are encoded from the buffers by worker
+    # processes while the next face renders. With collect=True the buffers
+    # are returned read-only mapped, for assembly.stream_mapped, and the
+    # caller removes them with remove_tile_buffers.
+    render = scene.render
+    orig_border = (render.use_border, render.use_crop_to_border, render.border_min_x, render.border_max_x,
+                   render.border_min_y, render.border_max_y)
+    ext = FORMAT_EXTENSIONS[render.image_settings.file_format]
+    buffer_dir = tile_buffer_dir(output_dir, base_name)
+    remove_tile_buffers(output_dir, base_name)
+    os.makedirs(buffer_dir)
+    rects = tile_grid(size, tile)
+    pool = make_pool(WRITE_WORKERS) if write else None
+    futures = []
+    notified = set()
+    buffers = []
+    timings = []
+
+    def notify_written():
+        # written(idx) for the face files that landed, called from this
+        # thread rather than the pool's
+        for idx, _, future in futures:
+            if written and idx not in notified and future.done() and future.exception() is None:
+                notified.add(idx)
+                written(idx)
+
+    try:
+        render.use_border = True
+        render.use_crop_to_border = True
+
+        for idx, (suffix, rot) in enumerate(faces):
+            filepath = os.path.join(output_dir, f"{base_name}_{idx+1}_{suffix}{ext}")
+            buffer_path = os.path.join(buffer_dir, f"{idx+1}_{suffix}.npy")
+            buffers.append(buffer_path)
+            if idx in cached:
+                if collect:
+                    load_buffer(filepath, buffer_path)
+                timings.append({'face': suffix, 'update': 0.0, 'render': 0.0, 'grab': 0.0, 'write': 0.0,
+                                'cached': True})
+                print(f"[{idx+1}/6] Unchanged: {suffix} -> {filepath}")
+                continue
+
+            t0 = time.perf_counter()
+            aim_face(cam, rot)
+            t1 = time.perf_counter()
+
+            render_time = grab_time = 0.0
+            buffer = None
+            for number, (x0, y0, x1, y1) in enumerate(rects):
+                mx0, my0 = max(x0 - TILE_MARGIN, 0), max(y0 - TILE_MARGIN, 0)
+                mx1, my1 = min(x1 + TILE_MARGIN, size), min(y1 + TILE_MARGIN, size)
+                set_border(render, size, mx0, my0, mx1, my1)
+                start = time.perf_counter()
+                bpy.ops.render.render()
+                rendered = time.perf_counter()
+                pixels = grab_face(scene)
+                if pixels.shape[:2] != (my1 - my0, mx1 - mx0):
+                    raise RuntimeError(f"Tile render is {pixels.shape[1]}x{pixels.shape[0]}, "
+                                       f"expected {mx1 - mx0}x{my1 - my0}")
+                if buffer is None:
+                    buffer = np.lib.format.open_memmap(buffer_path, mode='w+', dtype=pixels.dtype,
+                                                       shape=(size, size, pixels.shape[2]))
+                buffer[y0:y1, x0:x1] = pixels[y0 - my0:y1 - my0, x0 - mx0:x1 - mx0]
+                del pixels
+                render_time += rendered - start
+                grab_time += time.perf_counter() - rendered
+                if report:
+                    report({'INFO'}, f"Rendered {idx+1}/6: {suffix}, tile {number+1}/{len(rects)}")
+            buffer.flush()
+            del buffer
+
+            t3 = time.perf_counter()
+            if write:
+                futures.append((idx, filepath, pool.submit(encode_buffer, buffer_path, filepath,
+                                                           write_options or {})))
+                notify_written()
+            t4 = time.perf_counter()
+
+            timings.append({
+                'face': suffix,
+                'update': t1 - t0,
+                'render': render_time,
+                'grab': grab_time,
+                'write': t4 - t3,
+            })
+            print(f"[{idx+1}/6] Rendered: {suffix} -> {filepath} "
+                  f"({len(rects)} tiles, render {render_time:.2f}s)")
+    finally:
+        (render.use_border, render.use_crop_to_border, render.border_min_x, render.border_max_x,
+         render.border_min_y, render.border_max_y) = orig_border
+        if pool:
+            pool.shutdown(wait=True)
+
+    notify_written()
+    for _, filepath, future in futures:
+        error = future.exception()
+        if error is not None:
+            raise RuntimeError(f"Failed to write {os.path.basename(filepath)}: {error}")
+    print_timings(timings)
+    if not collect:
+        remove_tile_buffers(output_dir, base_name)
+        return timings, None
+    return timings, [np.load(path, mmap_mode='r') for path in buffers]
+
+
+def print_timings(timings):
+    timings = [t for t in timings if not t.get('cached')]
+    if not timings:
+        return
+    print(f"{'face':<8}{'update':>9}{'render':>9}{'grab':>9}{'write':>9}")
+    for t in timings:
+        print(f"{t['face']:<8}{t['update']:>9.3f}{t['render']:>9.3f}{t['grab']:>9.3f}{t['write']:>9.3f}")
+    if len(timings) > 1:
+        # Face 1 pays for scene sync and BVH build; the rest should be
+        # close to pure sampling time when the sync is shared.
+        first = timings[0]['render']
+        rest = sum(t['render'] for t in timings[1:]) / (len(timings) - 1)
+        print(f"first face {first:.3f}s, faces 2-{len(timings)} avg {rest:.3f}s "
+              f"(per-face sync overhead saved: {first - rest:.3f}s)")
+
+
+def prepare_cache(scene, cam, settings, output_dir, paths, write, report=None, metrics=None):
+    # (fingerprints, manifest, cached face indices). Faces are only skipped
+    # when their files are written, so there is something to reuse next time;
+    # fingerprints is None when the cache is off.
+    if not settings.use_render_cache or not write:
+        return None, {}, set()
+    faces = CUBEMAP_PRESETS[settings.engine_preset]['faces']
+    with phase(metrics, 'fingerprint'):
+        fingerprints = face_fingerprints(scene, cam, settings, faces)
+    manifest = load_manifest(output_dir, settings.base_name)
+    cached = cached_faces(paths, fingerprints, manifest)
+    if settings.capture_mode == 'PANORAMA' and len(cached) < len(faces):
+        # One render makes all six faces
+        cached = set()
+    # Faces about to be overwritten lose their entry until they're done
+    for idx, path in enumerate(paths):
+        if idx not in cached:
+            manifest.pop(os.path.basename(path), None)
+    save_manifest(output_dir, settings.base_name, manifest)
+    message = f"Render cache: {len(cached)} unchanged, {len(faces) - len(cached)} to render"
+    print(message)
+    if report:
+        report({'INFO'}, message)
+    return fingerprints, manifest, cached
+
+
+def record_cache(output_dir, base_name, manifest, paths, fingerprints, indices):
+    for idx in indices:
+        manifest[os.path.basename(paths[idx])] = fingerprints[idx]
+    save_manifest(output_dir, base_name, manifest)
+
+
+def setup_capture(scene, cam, settings):
+    # Point the camera and output settings at a capture; returns the state
+    # restore_capture puts back
+    render = scene.render
+    state = {
+        'rotation': cam.rotation_euler.copy(),
+        'rotation_mode': cam.rotation_mode,
+        'angle': cam.data.angle,
+        'resolution': (render.resolution_x, render.resolution_y),
+        'format': (render.image_settings.file_format, render.image_settings.color_depth,
+                   render.image_settings.exr_codec),
+        'persistent': render.use_persistent_data,
+    }
+    try:
+        cam.rotation_mode = 'XYZ'
+        render.resolution_x = settings.resolution
+        render.resolution_y = settings.resolution
+        render.image_settings.file_format = settings.file_format
+
+        if settings.file_format == 'OPEN_EXR':
+            render.image_settings.color_depth = settings.exr_depth
+            render.image_settings.exr_codec = 'ZIP'
+
+        cam.data.angle = math.radians(90.0)
+        if settings.capture_mode in {'PERSISTENT', 'TILED'}:
+            # Tiles of one face differ only in their border
+            render.use_persistent_data = True
+    except Exception:
+        restore_capture(scene, cam, state)
+        raise
+    return state
+
+
+def restore_capture(scene, cam, state):
+    render = scene.render
+    cam.rotation_euler = state['rotation']
+    cam.rotation_mode = state['rotation_mode']
+    cam.data.angle = state['angle']
+    render.resolution_x, render.resolution_y = state['resolution']
+    (render.image_settings.file_format, render.image_settings.color_depth,
+     render.image_settings.exr_codec) = state['format']
+    render.use_persistent_data = state['persistent']
+    bpy.context.view_layer.update()
+
+
+def aim_face(cam, rot):
+    cam.rotation_euler[0] = rot[0]
+    cam.rotation_euler[1] = rot[1]
+    cam.rotation_euler[2] = rot[2]
+    # Update view layer to ensure camera update takes effect
+    bpy.context.view_layer.update()
+
+
+def capture_cubemap(scene, cam, settings, output_dir, report=None, collect=False, metrics=None, done=(),
+                    written=None):
+    # Render the six faces of one probe from `cam`. `settings` is anything with
+    # the CubemapProperties fields (the scene props or a batch job entry).
+    # The camera and render state are always restored. Returns
+    # (timings, faces); faces is a list of output pixel arrays with
+    # collect=True, in which case settings.write_faces decides whether the
+    # face files are still written. Phase timings go to `metrics` (a
+    # metrics.RunReport) when given. Faces in `done` were finished by an
+    # interrupted run (sequence checkpoints) and are reused like cache hits;
+    # written(idx) is called as each face file lands. Tiled captures return
+    # memory-mapped faces, see render_tiled_faces.
+    preset = CUBEMAP_PRESETS.get(settings.engine_preset)
+    if not preset:
+        raise ValueError("Invalid engine preset")
+    if settings.capture_mode == 'TILED':
+        if settings.file_format == 'JPEG':
+            raise ValueError("Tiled captures are streamed, which JPEG can't be. Pick PNG, EXR or HDR.")
+    elif settings.resolution > MAX_FACE_SIZE:
+        raise ValueError(f"Faces above {MAX_FACE_SIZE} need the Six Views (Tiled) capture")
+
+    if settings.capture_mode == 'HDRI':
+        # No camera or render involved
+        with phase(metrics, 'resample'):
+            return [], environment_faces(scene, settings, output_dir, collect=collect)
+
+    faces = preset['faces']
+    write = settings.write_faces or not collect
+    paths = face_paths(output_dir, settings.base_name, settings.engine_preset, settings.file_format)
+    fingerprints, manifest, cached = prepare_cache(scene, cam, settings, output_dir, paths, write,
+                                                   report=report, metrics=metrics)
+    cached = cached | {idx for idx in done if os.path.isfile(paths[idx])}
+    if settings.capture_mode == 'PANORAMA' and len(cached) < len(faces):
+        cached = set()
+
+    writer = face_writer(settings, write) if settings.capture_mode in {'FACES', 'PERSISTENT'} else None
+    state = setup_capture(scene, cam, settings)
+    try:
+        if settings.capture_mode == 'PANORAMA' and cached:
+            timings = [{'face': suffix, 'update': 0.0, 'render': 0.0, 'grab': 0.0, 'write': 0.0, 'cached': True}
+                       for suffix, _ in faces]
+            pixels = [read_image(path) for path in paths] if collect else None
+        elif settings.capture_mode == 'PANORAMA':
+            timings = []
+            with phase(metrics, 'panorama'):
+                pixels = render_panorama_faces(
+                    scene, cam, faces, settings.resolution, output_dir, settings.base_name,
+                    collect=collect, write=write, sample_filter=settings.sample_filter,
+                )
+        elif settings.capture_mode == 'TILED':
+            timings, pixels = render_tiled_faces(
+                scene, cam, faces, settings.resolution, settings.tile_size, output_dir, settings.base_name,
+                report=report, collect=collect, write=write, cached=cached,
+                write_options=strip_options(paths[0], settings), written=written,
+            )
+        else:
+            timings, pixels = render_view_faces(
+                scene, cam, faces, output_dir, settings.base_name,
+                persistent=settings.capture_mode == 'PERSISTENT',
+                report=report, collect=collect, write=write, cached=cached,
+                writer=writer, write_options=strip_options(paths[0], settings), written=written,
+            )
+    except Exception:
+        if writer:
+            writer.close(raise_errors=False)
+        raise
+    finally:
+        restore_capture(scene, cam, state)
+
+    if writer:
+        # Done means every face file is on disk
+        with phase(metrics, 'write_wait'):
+            writer.close()
+
+    if metrics:
+        metrics.add_timings(timings)
+    if fingerprints:
+        record_cache(output_dir, settings.base_name, manifest, paths, fingerprints, range(len(paths)))
+    return timings, pixels
+
+
+def capture_faces(scene, cam, settings, output_dir, indices, report=None, metrics=None):
+    # Render and write only the faces in `indices` (farm face tasks). Faces
+    # the render cache still holds are skipped as in capture_cubemap, but the
+    # manifest is left to the caller because the probe's other faces render
+    # elsewhere. Returns (timings, fingerprints or None).
+    preset = CUBEMAP_PRESETS.get(settings.engine_preset)
+    if not preset:
+        raise ValueError("Invalid engine preset")
+    if settings.capture_mode not in {'FACES', 'PERSISTENT'}:
+        raise ValueError("Only Six Views captures can be split into faces")
+
+    faces = preset['faces']
+    paths = face_paths(output_dir, settings.base_name, settings.engine_preset, settings.file_format)
+    fingerprints = None
+    cached = set()
+    if settings.use_render_cache:
+        with phase(metrics, 'fingerprint'):
+            fingerprints = face_fingerprints(scene, cam, settings, faces)
+        cached = cached_faces(paths, fingerprints, load_manifest(output_dir, settings.base_name))
+
+    writer = face_writer(settings, True)
+    state = setup_capture(scene, cam, settings)
+    try:
+        timings, _ = render_view_faces(
+            scene, cam, faces, output_dir, settings.base_name,
+            persistent=settings.capture_mode == 'PERSISTENT', report=report, cached=cached,
+            writer=writer, write_options=strip_options(paths[0], settings),
+            skip=set(range(len(faces))) - set(indices),
+        )
+    except Exception:
+        if writer:
+            writer.close(raise_errors=False)
+        raise
+    finally:
+        restore_capture(scene, cam, state)
+
+    if writer:
+        with phase(metrics, 'write_wait'):
+            writer.close()
+    if metrics:
+        metrics.add_timings(timings)
+    return timings, fingerprints
@@ -13,6 +13,7 @@ CUBEMAP_PRESETS = {
             ("negz", (math.radians(90), 0, 0)),
         ],
         'order_label': '+X, -X, -Y, +Y, +Z, -Z',
+        'cube_faces': ['+X', '-X', '-Y', '+Y', '+Z', '-Z'],
         'default_format': 'PNG',
     },
     'UNITY': {
@@ -26,6 +27,86 @@ CUBEMAP_PRESETS = {
             ("back", (math.radians(90), 0, math.radians(180))),
         ],
         'order_label': 'right, left, up, down, front, back',
+        'cube_faces': ['+X', '-X', '+Y', '-Y', '+Z', '-Z'],
         'default_format': 'PNG',
     },
 }
+
+# Output layouts. Each cell is (cube face, column, row, quarter turns
+# counter-clockwise, mirror horizontally); cube faces are matched to the
+# preset through its 'cube_faces'. 'cells': None keeps the preset face order.
+# Crosses list only their 'slots' instead: the 'unfold' face sits at its
+# slot as rendered and the cube is unfolded around it, so every face that
+# borders it in the image also borders it on the cube (see
+# layouts.unfold_cells). Grids keep the faces as rendered, side by side.
+CUBEMAP_LAYOUTS = {
+    'STRIP': {
+        'name': 'Horizontal Strip',
+        'suffix': 'strip',
+        'grid': (6, 1),
+        'cells': None,
+    },
+    'CROSS_H': {
+        'name': 'Horizontal Cross',
+        'suffix': 'hcross',
+        'grid': (4, 3),
+        'unfold': ('+Z', 1, 1),
+        'slots': [(1, 0), (0, 1), (1, 1), (2, 1), (3, 1), (1, 2)],
+    },
+    'CROSS_V': {
+        'name': 'Vertical Cross',
+        'suffix': 'vcross',
+        'grid': (3, 4),
+        'unfold': ('+Z', 1, 1),
+        'slots': [(1, 0), (0, 1), (1, 1), (2, 1), (1, 2), (1, 3)],
+    },
+    'GRID_3X2': {
+        'name': '3x2 Grid',
+        'suffix': '3x2',
+        'grid': (3, 2),
+        'cells': [
+            ('+X', 0, 0, 0, False),
+            ('-X', 1, 0, 0, False),
+            ('+Y', 2, 0, 0, False),
+            ('-Y', 0, 1, 0, False),
+            ('+Z', 1, 1, 0, False),
+            ('-Z', 2, 1, 0, False),
+        ],
+    },
+    'GRID_2X3': {
+        'name': '2x3 Grid',
+        'suffix': '2x3',
+        'grid': (2, 3),
+        'cells': [
+            ('+X', 0, 0, 0, False),
+            ('-X', 1, 0, 0, False),
+            ('+Y', 0, 1, 0, False),
+            ('-Y', 1, 1, 0, False),
+            ('+Z', 0, 2, 0, False),
+            ('-Z', 1, 2, 0, False),
+        ],
+    },
+}
+
+# File extension written by Blender for each image format
+FORMAT_EXTENSIONS = {
+    'PNG': ".png",
+    'JPEG': ".jpg",
+    'OPEN_EXR': ".exr",
+    'HDR': ".hdr",
+}
+
+# Formats kept as scene-linear float end to end
+FLOAT_FORMATS = {'OPEN_EXR', 'HDR'}
+
+# Strip containers besides the face format ('FACE')
+STRIP_CONTAINERS = {
+    'FACE': None,
+    'TIFF': ".tif",
+    'RAW': ".npy",
+}
+
+# Camera rotation that aligns a Cycles equirectangular camera with world axes
+# (panorama centre looks down +X, +Z is up), so a world direction maps straight
+# to a lat-long pixel.
+PANORAMA_ROTATION = (math.radians(90), 0, math.radians(-90))
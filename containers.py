@@ -0,0 +1,236 @@
+import os
+import struct
+import numpy as np
+from .const import CUBEMAP_PRESETS
+from .assembly import face_sources, place_face, stack_faces
+from .bcn import encode_bc
+from .prefilter import downsample, prefilter_faces
+from .utils import make_pool
+
+# Single-file cube textures: DDS with a DX10 header and KTX2. Faces are
+# stored in +X, -X, +Y, -Y, +Z, -Z order using the preset's 'cube_faces',
+# i.e. the target engine's own axes. 8-bit and block-compressed formats hold
+# sRGB-encoded colour, float formats scene-linear values; alpha is linear.
+
+CUBE_ORDER = ['+X', '-X', '+Y', '-Y', '+Z', '-Z']
+
+# DXGI and Vulkan formats, bytes per block and block size in texels
+TEXTURE_FORMATS = {
+    'RGBA8': {'dxgi': 29, 'vk': 43, 'block_bytes': 4, 'block': 1},
+    'RGBA16F': {'dxgi': 10, 'vk': 97, 'block_bytes': 8, 'block': 1},
+    'RGBA32F': {'dxgi': 2, 'vk': 109, 'block_bytes': 16, 'block': 1},
+    'BC1': {'dxgi': 72, 'vk': 132, 'block_bytes': 8, 'block': 4},
+    'BC3': {'dxgi': 78, 'vk': 138, 'block_bytes': 16, 'block': 4},
+    'BC7': {'dxgi': 99, 'vk': 146, 'block_bytes': 16, 'block': 4},
+}
+
+CONTAINER_EXTENSIONS = {'DDS': ".dds", 'KTX2': ".ktx2"}
+
+DDS_MAGIC = b"DDS "
+KTX2_IDENTIFIER = b"\xabKTX 20\xbb\r\n\x1a\n"
+
+
+def srgb_to_linear(v):
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(v):
+    v = np.clip(v, 0.0, 1.0)
+    return np.where(v <= 0.0031308, v * 12.92, 1.055 * v ** (1.0 / 2.4) - 0.055)
+
+
+def linear_faces(faces, infos):
+    # (6, size, size, 4) float32 scene-linear RGBA; integer faces are taken
+    # as sRGB-encoded
+    stacked, size = stack_faces(faces, infos)
+    rgba = np.empty((6 * size, size, 4), dtype=stacked.dtype)
+    place_face(rgba, stacked[:-1].reshape(6 * size, size, -1), 0)
+    rgba = rgba.reshape(6, size, size, 4)
+    if rgba.dtype.kind == 'f':
+        return rgba.astype(np.float32, copy=False)
+    linear = rgba.astype(np.float32) / np.iinfo(rgba.dtype).max
+    linear[..., :3] = srgb_to_linear(linear[..., :3])
+    return linear
+
+
+def mip_chain(linear, mips, preset_key, settings):
+    # [(6, size, size, 4)] from the full faces down: 'NONE', 'BOX' (down to
+    # 1x1) or 'GGX' (the prefiltered roughness chain)
+    if mips == 'BOX':
+        chain = [linear]
+        while chain[-1].shape[1] > 1:
+            chain.append(downsample(chain[-1]))
+        return chain
+    if mips == 'GGX':
+        size = linear.shape[1]
+        return prefilter_faces(list(linear), [(size, size, 4, np.float32)] * 6, preset_key,
+                               settings.prefilter_levels, settings.prefilter_samples, settings.prefilter_fixup)
+    return [linear]
+
+
+def encode_face(pixels, fmt):
+    # Stored bytes of one linear float face in a TEXTURE_FORMATS format
+    if fmt == 'RGBA32F':
+        return np.ascontiguousarray(pixels, dtype='<f4').tobytes()
+    if fmt == 'RGBA16F':
+        # Keep bright spots at the largest half instead of infinity
+        return np.clip(pixels, -65504.0, 65504.0).astype('<f2').tobytes()
+    encoded = np.empty(pixels.shape, dtype=np.uint8)
+    encoded[..., :3] = np.rint(linear_to_srgb(pixels[..., :3]) * 255.0)
+    encoded[..., 3] = np.rint(np.clip(pixels[..., 3], 0.0, 1.0) * 255.0)
+    if fmt == 'RGBA8':
+        return encoded.tobytes()
+    return encode_bc(encoded, fmt)
+
+
+def encode_task(task):
+    return encode_face(*task)
+
+
+def encode_levels(chain, fmt, workers=0):
+    # [[face bytes] * 6 per mip], faces and mips encoded across a pool
+    tasks = [(face, fmt) for mip in chain for face in mip]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers > 1 and fmt.startswith('BC'):
+        with make_pool(workers) as pool:
+            data = list(pool.map(encode_task, tasks))
+    else:
+        data = [encode_task(task) for task in tasks]
+    return [data[i:i + 6] for i in range(0, len(data), 6)]
+
+
+def write_dds(path, levels, size, fmt):
+    info = TEXTURE_FORMATS[fmt]
+    compressed = info['block'] > 1
+    flags = 0x1 | 0x2 | 0x4 | 0x1000  # CAPS | HEIGHT | WIDTH | PIXELFORMAT
+    flags |= 0x80000 if compressed else 0x8  # LINEARSIZE or PITCH
+    pitch = len(levels[0][0]) if compressed else size * info['block_bytes']
+    caps = 0x1000 | 0x8  # TEXTURE | COMPLEX
+    if len(levels) > 1:
+        flags |= 0x20000  # MIPMAPCOUNT
+        caps |= 0x400000  # MIPMAP
+    cubemap = 0x200 | 0xFC00  # CUBEMAP | all six faces
+
+    with open(path, "wb") as f:
+        f.write(DDS_MAGIC)
+        f.write(struct.pack("<7I44x", 124, flags, size, size, pitch, 0, len(levels)))
+        f.write(struct.pack("<2I4s5I", 32, 0x4, b"DX10", 0, 0, 0, 0, 0))
+        f.write(struct.pack("<5I", caps, cubemap, 0, 0, 0))
+        # DX10: format, TEXTURE2D, TEXTURECUBE, array size 1
+        f.write(struct.pack("<5I", info['dxgi'], 3, 0x4, 1, 0))
+        # Face-major: every mip of +X, then every mip of -X, ...
+        for face in range(6):
+            for level in levels:
+                f.write(level[face])
+
+
+def ktx2_dfd(fmt):
+    # Basic data format descriptor
+    info = TEXTURE_FORMATS[fmt]
+    if fmt.startswith('BC'):
+        model = {'BC1': 128, 'BC3': 130, 'BC7': 134}[fmt]
+        if fmt == 'BC3':
+            samples = [(0, 63, 15 | 0x10, 0, 0xFFFFFFFF), (64, 63, 0, 0, 0xFFFFFFFF)]
+        else:
+            samples = [(0, info['block_bytes'] * 8 - 1, 0, 0, 0xFFFFFFFF)]
+        transfer = 2
+        dims = 0x0303
+    else:
+        model = 1
+        bits = info['block_bytes'] * 2
+        if fmt == 'RGBA8':
+            transfer = 2
+            samples = [(8 * c, 7, channel, 0, 255) for c, channel in enumerate((0, 1, 2))]
+            samples.append((24, 7, 15 | 0x10, 0, 255))
+        else:
+            # Signed float samples span -1..1
+            transfer = 1
+            samples = [(bits * c, bits - 1, channel | 0xC0, 0xBF800000, 0x3F800000)
+                       for c, channel in enumerate((0, 1, 2, 15))]
+        dims = 0
+    block_size = 24 + 16 * len(samples)
+    words = [
+        0,
+        2 | (block_size << 16),
+        model | (1 << 8) | (transfer << 16),
+        dims,
+        info['block_bytes'],
+        0,
+    ]
+    for offset, length, channel, lower, upper in samples:
+        words += [offset | (length << 16) | (channel << 24), 0, lower, upper]
+    return struct.pack(f"<I{len(words)}I", 4 + block_size, *words)
+
+
+def ktx2_kvd():
+    data = b""
+    for key, value in ((b"KTXorientation", b"rd"), (b"KTXwriter", b"Cubemap Renderer")):
+        entry = key + b"\0" + value + b"\0"
+        data += struct.pack("<I", len(entry)) + entry + b"\0" * (-len(entry) % 4)
+    return data
+
+
+def write_ktx2(path, levels, size, fmt):
+    info = TEXTURE_FORMATS[fmt]
+    type_size = {'RGBA16F': 2, 'RGBA32F': 4}.get(fmt, 1)
+    dfd = ktx2_dfd(fmt)
+    kvd = ktx2_kvd()
+
+    header_size = 12 + 9 * 4 + 4 * 4 + 2 * 8
+    index_size = 24 * len(levels)
+    dfd_offset = header_size + index_size
+    kvd_offset = dfd_offset + len(dfd)
+    offset = kvd_offset + len(kvd)
+
+    # Level data is stored smallest mip first, each aligned to
+    # lcm(block bytes, 4)
+    align = max(4, info['block_bytes'])
+    placed = {}
+    for level in reversed(range(len(levels))):
+        offset += -offset % align
+        length = sum(len(face) for face in levels[level])
+        placed[level] = (offset, length)
+        offset += length
+
+    with open(path, "wb") as f:
+        f.write(KTX2_IDENTIFIER)
+        f.write(struct.pack("<9I", info['vk'], type_size, size, size, 0, 0, 6, len(levels), 0))
+        f.write(struct.pack("<4I2Q", dfd_offset, len(dfd), kvd_offset, len(kvd), 0, 0))
+        for level in range(len(levels)):
+            start, length = placed[level]
+            f.write(struct.pack("<3Q", start, length, length))
+        f.write(dfd)
+        f.write(kvd)
+        for level in reversed(range(len(levels))):
+            f.write(b"\0" * (placed[level][0] - f.tell()))
+            for face in levels[level]:
+                f.write(face)
+
+
+def container_paths(output_dir, settings):
+    kinds = ['DDS', 'KTX2'] if settings.container_format == 'BOTH' else [settings.container_format]
+    return [os.path.join(output_dir, f"{settings.base_name}_cubemap{CONTAINER_EXTENSIONS[k]}") for k in kinds]
+
+
+def write_containers(output_dir, settings, faces=None):
+    # Export in-memory faces, or the face files written by capture_cubemap,
+    # as one cube texture per container. Returns the paths.
+    faces, infos = face_sources(output_dir, settings, faces)
+    preset_key = settings.engine_preset
+    linear = linear_faces(faces, infos)
+    chain = mip_chain(linear, settings.container_mips, preset_key, settings)
+
+    order = [CUBEMAP_PRESETS[preset_key]['cube_faces'].index(face) for face in CUBE_ORDER]
+    chain = [mip[order] for mip in chain]
+    levels = encode_levels(chain, settings.texture_format)
+
+    paths = container_paths(output_dir, settings)
+    for path in paths:
+        try:
+            if path.endswith(".dds"):
+                write_dds(path, levels, linear.shape[1], settings.texture_format)
+            else:
+                write_ktx2(path, levels, linear.shape[1], settings.texture_format)
+        except OSError as e:
+            raise RuntimeError(f"Failed to save {os.path.basename(path)}: {e}")
+    return paths
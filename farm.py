@@ -0,0 +1,407 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import threading
+import subprocess
+import multiprocessing
+from contextlib import contextmanager
+from .utils import can_fork
+
+# Shared-directory job queue that spreads a batch job over several machines
+# (or several local processes). The coordinator splits the job into tasks;
+# workers anywhere that can see the spool folder claim tasks by renaming the
+# task file, keep it fresh while they work and write their result back.
+#
+#   spool/
+#     job.json               the batch job plus its id
+#     scene.blend            scene copy the workers open
+#     pending/<task>.json    waiting for a worker
+#     running/<task>.json    claimed; its mtime is the worker's heartbeat
+#     done/<task>.json       results
+#     failed/<task>.json     errors, requeued by the coordinator
+#     workers/<worker>.json  worker heartbeats between tasks
+#     stop                   the job is over, workers exit
+#
+# A rename is atomic on local file systems and NFS, so exactly one worker
+# wins each task. Probe tasks render one probe like a batch shard does.
+# Face tasks render single faces of a Six Views probe, and once all six are
+# in a finish task assembles them, so one large probe can use six machines.
+
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 60.0
+POLL_INTERVAL = 0.5
+
+# Seconds the coordinator waits with no live worker before giving up
+NO_WORKER_TIMEOUT = 300.0
+
+SPOOL_DIRS = ('pending', 'running', 'done', 'failed', 'workers')
+
+# Capture modes that render faces one by one and so can be split
+FACE_MODES = {'FACES', 'PERSISTENT'}
+
+
+def write_json(path, data):
+    # Unique temp name: workers on different hosts may share a pid
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def task_names(spool_dir, state):
+    try:
+        return sorted(name for name in os.listdir(os.path.join(spool_dir, state)) if name.endswith(".json"))
+    except OSError:
+        return []
+
+
+def make_tasks(job, granularity='PROBE'):
+    # One task per probe, or one per face for Six Views probes
+    tasks = []
+    for index, probe in enumerate(job['probes']):
+        mode = probe.get('capture_mode', job.get('capture_mode', 'FACES'))
+        if granularity == 'FACE' and mode in FACE_MODES:
+            tasks += [{'id': f"p{index:04d}_f{face}", 'kind': 'face', 'probe': index, 'face': face}
+                      for face in range(6)]
+        else:
+            tasks.append({'id': f"p{index:04d}", 'kind': 'probe', 'probe': index})
+    return tasks
+
+
+def init_spool(spool_dir, job, granularity='PROBE'):
+    # Clear the previous job out of the spool and queue this one. Returns
+    # (job with its id, tasks).
+    for name in SPOOL_DIRS:
+        shutil.rmtree(os.path.join(spool_dir, name), ignore_errors=True)
+        os.makedirs(os.path.join(spool_dir, name))
+    for name in ("stop", "status.json"):
+        if os.path.exists(os.path.join(spool_dir, name)):
+            os.remove(os.path.join(spool_dir, name))
+
+    job = dict(job, job_id=uuid.uuid4().hex, granularity=granularity)
+    tasks = make_tasks(job, granularity)
+    for task in tasks:
+        queue_task(spool_dir, job, task)
+    # Last, so workers never see a job without its tasks
+    write_json(os.path.join(spool_dir, "job.json"), job)
+    return job, tasks
+
+
+def queue_task(spool_dir, job, task, attempts=0):
+    write_json(os.path.join(spool_dir, "pending", f"{task['id']}.json"),
+               dict(task, job_id=job['job_id'], attempts=attempts))
+
+
+def claim_task(spool_dir, worker_id):
+    # The first pending task this worker manages to rename, or None
+    for name in task_names(spool_dir, "pending"):
+        path = os.path.join(spool_dir, "running", name)
+        try:
+            os.rename(os.path.join(spool_dir, "pending", name), path)
+        except OSError:
+            continue  # another worker was faster
+        task = read_json(path)
+        if task is None:
+            continue
+        task['worker'] = worker_id
+        # Rewriting the file also refreshes the mtime the coordinator watches
+        write_json(path, task)
+        return task
+    return None
+
+
+def release_task(spool_dir, task):
+    # Hand a claimed task back untouched
+    name = f"{task['id']}.json"
+    try:
+        os.rename(os.path.join(spool_dir, "running", name), os.path.join(spool_dir, "pending", name))
+    except OSError:
+        pass
+
+
+def complete_task(spool_dir, task, result=None, error=None):
+    record = dict(task, finished=time.time())
+    if error is None:
+        record['result'] = result
+        write_json(os.path.join(spool_dir, "done", f"{task['id']}.json"), record)
+    else:
+        record['error'] = error
+        write_json(os.path.join(spool_dir, "failed", f"{task['id']}.json"), record)
+    try:
+        os.remove(os.path.join(spool_dir, "running", f"{task['id']}.json"))
+    except OSError:
+        pass  # taken back by the coordinator meanwhile
+
+
+def _beat(path, interval, stop, parent):
+    while not stop.wait(interval):
+        if parent is not None and os.getppid() != parent:
+            return
+        try:
+            os.utime(path)
+        except OSError:
+            return  # finished or taken back
+
+
+@contextmanager
+def heartbeat(path, interval=HEARTBEAT_INTERVAL):
+    # Touch `path` every `interval` seconds for the length of the block.
+    # A forked process keeps beating through blocking renders, during which
+    # Blender holds the GIL; a thread is the fallback where Blender can't
+    # be forked.
+    if can_fork():
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        beater = context.Process(target=_beat, args=(path, interval, stop, os.getpid()), daemon=True)
+    else:
+        stop = threading.Event()
+        beater = threading.Thread(target=_beat, args=(path, interval, stop, None), daemon=True)
+    beater.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        beater.join()
+
+
+def worker_beat(spool_dir, worker_id, task=None):
+    write_json(os.path.join(spool_dir, "workers", f"{worker_id}.json"), {
+        'worker': worker_id,
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'task': task,
+        'updated': time.time(),
+    })
+
+
+def serve(spool_dir, execute, worker_id=None, idle_timeout=NO_WORKER_TIMEOUT, poll=POLL_INTERVAL):
+    # Worker loop: wait for a job, then claim and run its tasks until the
+    # coordinator says stop, the job is replaced or nothing turns up for
+    # `idle_timeout` seconds. execute(job, task) returns the task's result
+    # and raises on failure. Returns a summary dict.
+    worker_id = worker_id or f"{socket.gethostname()}_{os.getpid()}"
+    job = None
+    done = failed = 0
+    start = time.perf_counter()
+    idle_since = time.monotonic()
+    while not os.path.exists(os.path.join(spool_dir, "stop")):
+        current = read_json(os.path.join(spool_dir, "job.json"))
+        if job is not None and (current is None or current.get('job_id') != job['job_id']):
+            break  # the scene this worker loaded belongs to an older job
+        job = current
+
+        task = claim_task(spool_dir, worker_id) if job else None
+        if task is None:
+            if time.monotonic() - idle_since > idle_timeout:
+                break
+            if job:
+                worker_beat(spool_dir, worker_id)
+            time.sleep(poll)
+            continue
+        if task.get('job_id') != job['job_id']:
+            release_task(spool_dir, task)
+            break
+
+        worker_beat(spool_dir, worker_id, task['id'])
+        print(f"Farm task {task['id']} ({task['kind']}) on {worker_id}")
+        with heartbeat(os.path.join(spool_dir, "running", f"{task['id']}.json")):
+            try:
+                complete_task(spool_dir, task, result=execute(job, task))
+                done += 1
+            except Exception as e:
+                complete_task(spool_dir, task, error=str(e))
+                failed += 1
+                print(f"Farm task {task['id']} failed: {e}")
+        idle_since = time.monotonic()
+
+    return {'worker': worker_id, 'done': done, 'failed': failed, 'elapsed': time.perf_counter() - start}
+
+
+def workers_alive(spool_dir, timeout):
+    # True if any worker heartbeat or running task is fresh
+    now = time.time()
+    for state in ("workers", "running"):
+        for name in task_names(spool_dir, state):
+            try:
+                if now - os.path.getmtime(os.path.join(spool_dir, state, name)) < timeout:
+                    return True
+            except OSError:
+                pass
+    return False
+
+
+def probe_entry(job, index, record=None, error=None):
+    # Batch-style per-probe status from a finished (or failed) task
+    probe = job['probes'][index]
+    if record is not None:
+        return record['result']
+    base_name = probe.get('base_name', job.get('base_name', ''))
+    return {'base_name': base_name, 'name': probe.get('name', base_name), 'status': 'failed', 'error': error}
+
+
+def coordinate(spool_dir, job, tasks, retries=2, progress=None, procs=(), timeout=HEARTBEAT_TIMEOUT,
+               no_worker_timeout=NO_WORKER_TIMEOUT, poll=POLL_INTERVAL):
+    # Collect results, requeue failed or silent tasks up to `retries` times
+    # and queue each probe's finish task once its six faces are done. Stops
+    # when every task is settled or no worker is left. `procs` are the
+    # local worker processes, if any.
+    start = time.perf_counter()
+    tasks = {task['id']: task for task in tasks}
+    attempts = {task_id: 0 for task_id in tasks}
+    open_ids = set(tasks)
+    records = {}
+    errors = {}
+    claimed = {}
+    retried = 0
+    error = None
+    last_alive = time.monotonic()
+
+    def settle_failure(task_id, message):
+        nonlocal retried
+        attempts[task_id] += 1
+        if attempts[task_id] <= retries:
+            retried += 1
+            print(f"Farm task {task_id} failed ({message}), retry {attempts[task_id]}/{retries}")
+            queue_task(spool_dir, job, tasks[task_id], attempts[task_id])
+        else:
+            errors[task_id] = message
+            open_ids.discard(task_id)
+
+    while open_ids:
+        for name in task_names(spool_dir, "done"):
+            task_id = name[:-5]
+            if task_id not in open_ids:
+                continue
+            record = read_json(os.path.join(spool_dir, "done", name))
+            if record is None:
+                continue
+            records[task_id] = record
+            open_ids.discard(task_id)
+            try:
+                # A late result for a task that was already requeued
+                os.remove(os.path.join(spool_dir, "pending", name))
+            except OSError:
+                pass
+            task = tasks[task_id]
+            if task['kind'] == 'face':
+                faces = [f"p{task['probe']:04d}_f{face}" for face in range(6)]
+                if all(face in records for face in faces):
+                    finish = {'id': f"p{task['probe']:04d}_finish", 'kind': 'finish', 'probe': task['probe'],
+                              'faces': [records[face]['result'] for face in faces]}
+                    tasks[finish['id']] = finish
+                    attempts[finish['id']] = 0
+                    open_ids.add(finish['id'])
+                    queue_task(spool_dir, job, finish)
+
+        for name in task_names(spool_dir, "failed"):
+            task_id = name[:-5]
+            record = read_json(os.path.join(spool_dir, "failed", name))
+            try:
+                os.remove(os.path.join(spool_dir, "failed", name))
+            except OSError:
+                pass
+            if task_id in open_ids and record is not None:
+                settle_failure(task_id, f"{record.get('worker', 'worker')}: {record['error']}")
+
+        # A claimed task whose heartbeat stopped goes back in the queue. The
+        # first sighting counts too, since a rename keeps the old mtime.
+        now = time.time()
+        for name in task_names(spool_dir, "running"):
+            task_id = name[:-5]
+            path = os.path.join(spool_dir, "running", name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if task_id not in open_ids:
+                continue
+            seen = claimed.setdefault((task_id, attempts[task_id]), now)
+            if now - max(mtime, seen) > timeout:
+                record = read_json(path) or {}
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                settle_failure(task_id, f"{record.get('worker', 'worker')} stopped responding")
+
+        if progress:
+            progress(len(tasks) - len(open_ids), len(tasks))
+        if not open_ids:
+            break
+
+        if workers_alive(spool_dir, timeout) or any(proc.poll() is None for proc in procs):
+            last_alive = time.monotonic()
+        elif procs or time.monotonic() - last_alive > no_worker_timeout:
+            error = "No workers left" if procs else f"No workers for {no_worker_timeout:.0f}s"
+            break
+        time.sleep(poll)
+
+    # Faces of a probe whose finish never ran report the probe as failed
+    results = []
+    for index in range(len(job['probes'])):
+        ids = [task_id for task_id, task in tasks.items() if task['probe'] == index]
+        final = f"p{index:04d}" if f"p{index:04d}" in tasks else f"p{index:04d}_finish"
+        if final in records:
+            results.append(probe_entry(job, index, records[final]))
+            continue
+        failures = [f"{task_id}: {errors[task_id]}" for task_id in ids if task_id in errors]
+        results.append(probe_entry(job, index, error="; ".join(failures) or error or "Not finished"))
+
+    failed = sum(1 for r in results if r.get('status') != 'ok')
+    if error is None and not failed:
+        state = 'ok'
+    else:
+        state = 'failed' if failed == len(results) else 'partial'
+    return {
+        'status': state,
+        'granularity': job.get('granularity', 'PROBE'),
+        'workers': sorted({record.get('worker', '') for record in records.values()}),
+        'tasks': len(tasks),
+        'retried': retried,
+        'probes': results,
+        'failed': failed,
+        'errors': ([error] if error else []) + [f"{task_id}: {message}" for task_id, message in errors.items()],
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def run_farm(spool_dir, job, granularity='PROBE', retries=2, commands=(), progress=None,
+             timeout=HEARTBEAT_TIMEOUT, no_worker_timeout=NO_WORKER_TIMEOUT):
+    # Queue `job`, start one local worker per command line and coordinate
+    # until every task is settled. Farm workers started elsewhere on the same
+    # spool join in. Returns the status dict, also written to status.json.
+    os.makedirs(spool_dir, exist_ok=True)
+    job, tasks = init_spool(spool_dir, job, granularity)
+    procs = []
+    logs = []
+    try:
+        for index, cmd in enumerate(commands):
+            log = open(os.path.join(spool_dir, f"local_worker_{index}.log"), "w", encoding="utf-8")
+            logs.append(log)
+            procs.append(subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT))
+            print(f"Local farm worker {index}: {' '.join(cmd)}")
+        status = coordinate(spool_dir, job, tasks, retries, progress, procs, timeout, no_worker_timeout)
+    finally:
+        with open(os.path.join(spool_dir, "stop"), "w", encoding="utf-8"):
+            pass
+        for proc in procs:
+            try:
+                proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        for log in logs:
+            log.close()
+    write_json(os.path.join(spool_dir, "status.json"), status)
+    return status
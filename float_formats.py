@@ -0,0 +1,357 @@
+import zlib
+import struct
+import numpy as np
+
+# Minimal OpenEXR and Radiance HDR support in NumPy for float faces and
+# strips. EXR is written as scanline ZIP (16 lines per block) in half or
+# float; the reader handles the NONE, ZIPS and ZIP codecs and raises
+# UnsupportedFormat for anything else so callers can fall back to
+# OpenImageIO or Blender. Arrays are (height, width, channels), top row first.
+
+EXR_MAGIC = 20000630
+EXR_HALF = 1
+EXR_FLOAT = 2
+EXR_COMPRESSION_LINES = {0: 1, 2: 1, 3: 16}  # NONE, ZIPS, ZIP
+
+# Channel names by count; EXR stores channels sorted by name
+EXR_CHANNEL_NAMES = {1: ["Y"], 2: ["Y", "A"], 3: ["R", "G", "B"], 4: ["R", "G", "B", "A"]}
+
+HDR_SIGNATURE = b"#?RADIANCE"
+
+
+class UnsupportedFormat(ValueError):
+    # A valid file in a variant the NumPy readers don't decode
+    pass
+
+
+# --- OpenEXR -----------------------------------------------------------------
+
+def _exr_attribute(name, type_name, data):
+    return name.encode() + b"\x00" + type_name.encode() + b"\x00" + struct.pack("<i", len(data)) + data
+
+
+def _exr_zip_pack(raw):
+    # OpenEXR ZIP: split even/odd bytes, delta-encode, deflate
+    data = np.frombuffer(raw, dtype=np.uint8)
+    reordered = np.concatenate([data[0::2], data[1::2]])
+    delta = reordered.copy()
+    delta[1:] = (reordered[1:].astype(np.int16) - reordered[:-1] + 128).astype(np.uint8)
+    packed = zlib.compress(delta.tobytes(), 4)
+    # OpenEXR stores a block raw when compressing doesn't pay off
+    return packed if len(packed) < len(raw) else raw
+
+
+def _exr_zip_unpack(packed, size):
+    if len(packed) >= size:
+        return packed
+    delta = np.frombuffer(zlib.decompress(packed), dtype=np.uint8).astype(np.int64)
+    delta[1:] -= 128
+    reordered = (np.cumsum(delta) & 0xFF).astype(np.uint8)
+    raw = np.empty(size, dtype=np.uint8)
+    half = (size + 1) // 2
+    raw[0::2] = reordered[:half]
+    raw[1::2] = reordered[half:]
+    return raw.tobytes()
+
+
+class ExrWriter:
+    # Streams rows into a scanline EXR. Rows are buffered into 16-line ZIP
+    # blocks; the offset table is reserved up front and patched on close.
+
+    def __init__(self, path, width, height, channels, dtype=np.float32, half=True):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.rows_written = 0
+        self.lines = EXR_COMPRESSION_LINES[3]
+        self.pixel_dtype = np.dtype("<f2" if half else "<f4")
+        names = EXR_CHANNEL_NAMES[channels]
+        # Storage order is alphabetical, e.g. A, B, G, R
+        self._order = sorted(range(channels), key=lambda i: names[i])
+        self._block = np.zeros((self.lines, width, channels), dtype=np.float32)
+        self._block_rows = 0
+        self._offsets = []
+
+        pixel_type = EXR_HALF if half else EXR_FLOAT
+        chlist = b"".join(
+            names[i].encode() + b"\x00" + struct.pack("<iB3xii", pixel_type, 0, 1, 1) for i in self._order
+        ) + b"\x00"
+        box = struct.pack("<iiii", 0, 0, width - 1, height - 1)
+        header = b"".join([
+            _exr_attribute("channels", "chlist", chlist),
+            _exr_attribute("compression", "compression", b"\x03"),
+            _exr_attribute("dataWindow", "box2i", box),
+            _exr_attribute("displayWindow", "box2i", box),
+            _exr_attribute("lineOrder", "lineOrder", b"\x00"),
+            _exr_attribute("pixelAspectRatio", "float", struct.pack("<f", 1.0)),
+            _exr_attribute("screenWindowCenter", "v2f", struct.pack("<ff", 0.0, 0.0)),
+            _exr_attribute("screenWindowWidth", "float", struct.pack("<f", 1.0)),
+        ]) + b"\x00"
+
+        self._file = open(path, "wb")
+        self._file.write(struct.pack("<ii", EXR_MAGIC, 2))
+        self._file.write(header)
+        self._table = self._file.tell()
+        self._file.write(b"\x00" * 8 * -(-height // self.lines))
+
+    def write_rows(self, rows):
+        rows = rows.reshape(rows.shape[0], self.width, self.channels)
+        start = 0
+        while start < rows.shape[0]:
+            take = min(self.lines - self._block_rows, rows.shape[0] - start)
+            self._block[self._block_rows:self._block_rows + take] = rows[start:start + take]
+            self._block_rows += take
+            start += take
+            if self._block_rows == self.lines:
+                self._flush_block()
+        self.rows_written += rows.shape[0]
+
+    def _flush_block(self):
+        y = len(self._offsets) * self.lines
+        count = min(self.lines, self.height - y)
+        # Per scanline, each channel's samples are stored contiguously
+        block = self._block[:count][:, :, self._order].transpose(0, 2, 1)
+        packed = _exr_zip_pack(block.astype(self.pixel_dtype).tobytes())
+        self._offsets.append(self._file.tell())
+        self._file.write(struct.pack("<ii", y, len(packed)))
+        self._file.write(packed)
+        self._block_rows = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._block_rows:
+                self._flush_block()
+            self._file.seek(self._table)
+            self._file.write(struct.pack(f"<{len(self._offsets)}Q", *self._offsets))
+        finally:
+            self._file.close()
+        if self.rows_written != self.height:
+            raise ValueError(f"EXR expected {self.height} rows, got {self.rows_written}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def exr_header(f):
+    # Parse the header of an open EXR file; leaves f at the offset table
+    magic, version = struct.unpack("<ii", f.read(8))
+    if magic != EXR_MAGIC:
+        raise ValueError("Not an OpenEXR file")
+    if version & 0x1200:
+        raise UnsupportedFormat("Tiled and multi-part EXR files are not supported")
+
+    def cstring():
+        out = b""
+        while True:
+            c = f.read(1)
+            if c in (b"", b"\x00"):
+                return out.decode()
+            out += c
+
+    header = {}
+    while True:
+        name = cstring()
+        if not name:
+            break
+        type_name = cstring()
+        size = struct.unpack("<i", f.read(4))[0]
+        data = f.read(size)
+        if type_name == "chlist":
+            channels = []
+            pos = 0
+            while data[pos:pos + 1] != b"\x00":
+                end = data.index(b"\x00", pos)
+                pixel_type = struct.unpack("<i", data[end + 1:end + 5])[0]
+                channels.append((data[pos:end].decode(), pixel_type))
+                pos = end + 17
+            header[name] = channels
+        elif type_name == "box2i":
+            header[name] = struct.unpack("<iiii", data)
+        elif type_name == "compression":
+            header[name] = data[0]
+        else:
+            header[name] = data
+    return header
+
+
+def exr_dtype(channels):
+    # Same rule as OpenImageIO's native format: half only when every
+    # channel is half
+    return np.float16 if all(t == EXR_HALF for _, t in channels) else np.float32
+
+
+def exr_info(path):
+    with open(path, "rb") as f:
+        header = exr_header(f)
+    x0, y0, x1, y1 = header["dataWindow"]
+    channels = header["channels"]
+    return x1 - x0 + 1, y1 - y0 + 1, len(channels), exr_dtype(channels)
+
+
+def read_exr(path):
+    with open(path, "rb") as f:
+        header = exr_header(f)
+        compression = header.get("compression", 0)
+        if compression not in EXR_COMPRESSION_LINES:
+            raise UnsupportedFormat(f"EXR compression {compression} is not supported")
+        x0, y0, x1, y1 = header["dataWindow"]
+        width, height = x1 - x0 + 1, y1 - y0 + 1
+        channels = header["channels"]
+        types = {EXR_HALF: np.dtype("<f2"), EXR_FLOAT: np.dtype("<f4"), 0: np.dtype("<u4")}
+        lines = EXR_COMPRESSION_LINES[compression]
+        blocks = -(-height // lines)
+        offsets = struct.unpack(f"<{blocks}Q", f.read(8 * blocks))
+
+        out = np.empty((height, width, len(channels)), dtype=exr_dtype(channels))
+        line_bytes = sum(types[t].itemsize for _, t in channels) * width
+        for offset in offsets:
+            f.seek(offset)
+            y, size = struct.unpack("<ii", f.read(8))
+            row = y - y0
+            count = min(lines, height - row)
+            raw = f.read(size)
+            if compression:
+                raw = _exr_zip_unpack(raw, line_bytes * count)
+            pos = 0
+            for line in range(count):
+                for c, (_, pixel_type) in enumerate(channels):
+                    dtype = types[pixel_type]
+                    out[row + line, :, c] = np.frombuffer(raw, dtype=dtype, count=width, offset=pos)
+                    pos += dtype.itemsize * width
+
+    # Back to R, G, B, A (or Y, A) order
+    names = [name.split(".")[-1] for name, _ in channels]
+    wanted = EXR_CHANNEL_NAMES.get(len(names), names)
+    if sorted(wanted) == sorted(names):
+        out = out[:, :, [names.index(n) for n in wanted]]
+    return out
+
+
+# --- Radiance HDR ------------------------------------------------------------
+
+def _float_to_rgbe(rgb):
+    rgb = np.maximum(rgb.astype(np.float32, copy=False), 0.0)
+    peak = rgb.max(axis=-1)
+    mantissa, exponent = np.frexp(peak)
+    scale = np.where(peak > 1e-32, mantissa * 256.0 / np.where(peak > 1e-32, peak, 1.0), 0.0)
+    rgbe = np.empty(rgb.shape[:-1] + (4,), dtype=np.uint8)
+    rgbe[..., :3] = np.minimum(rgb * scale[..., None], 255.0).astype(np.uint8)
+    rgbe[..., 3] = np.where(peak > 1e-32, exponent + 128, 0).astype(np.uint8)
+    return rgbe
+
+
+def _rgbe_to_float(rgbe):
+    exponent = rgbe[..., 3].astype(np.int32)
+    scale = np.where(exponent > 0, np.ldexp(1.0, exponent - 136), 0.0).astype(np.float32)
+    return rgbe[..., :3].astype(np.float32) * scale[..., None]
+
+
+class HdrWriter:
+    # Streams rows into a Radiance .hdr using new-style RLE scanlines made of
+    # literal runs only: cheap to build with NumPy and unambiguous to readers.
+
+    def __init__(self, path, width, height, channels=3, dtype=np.float32):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(path, "wb")
+        self._file.write(HDR_SIGNATURE + b"\nFORMAT=32-bit_rle_rgbe\n\n")
+        self._file.write(f"-Y {height} +X {width}\n".encode())
+
+    def write_rows(self, rows):
+        rows = rows.reshape(rows.shape[0], self.width, -1)
+        if rows.shape[2] < 3:
+            rows = np.repeat(rows[:, :, :1], 3, axis=2)
+        rgbe = _float_to_rgbe(rows[:, :, :3])
+        count = rows.shape[0]
+
+        if not 8 <= self.width <= 0x7FFF:
+            self._file.write(rgbe.tobytes())
+        else:
+            planes = rgbe.transpose(0, 2, 1)  # (rows, 4, width)
+            full = self.width // 128
+            parts = []
+            if full:
+                runs = planes[:, :, :full * 128].reshape(count, 4, full, 128)
+                marks = np.full((count, 4, full, 1), 128, dtype=np.uint8)
+                parts.append(np.concatenate([marks, runs], axis=3).reshape(count, 4, -1))
+            tail = self.width - full * 128
+            if tail:
+                marks = np.full((count, 4, 1), tail, dtype=np.uint8)
+                parts.append(np.concatenate([marks, planes[:, :, full * 128:]], axis=2))
+            body = np.concatenate(parts, axis=2).reshape(count, -1)
+            head = np.tile(np.array([2, 2, self.width >> 8, self.width & 0xFF], dtype=np.uint8), (count, 1))
+            self._file.write(np.concatenate([head, body], axis=1).tobytes())
+        self.rows_written += count
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.rows_written != self.height:
+            raise ValueError(f"HDR expected {self.height} rows, got {self.rows_written}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def _hdr_header(f):
+    if not f.readline().startswith(b"#?"):
+        raise ValueError("Not a Radiance HDR file")
+    while f.readline().strip():
+        pass
+    size = f.readline().split()
+    if len(size) != 4 or size[0] != b"-Y" or size[2] != b"+X":
+        raise UnsupportedFormat("Only -Y H +X W oriented HDR files are supported")
+    return int(size[3]), int(size[1])
+
+
+def hdr_info(path):
+    with open(path, "rb") as f:
+        width, height = _hdr_header(f)
+    return width, height, 3, np.float32
+
+
+def read_hdr(path):
+    with open(path, "rb") as f:
+        width, height = _hdr_header(f)
+        data = np.frombuffer(f.read(), dtype=np.uint8)
+
+    rgbe = np.empty((height, width, 4), dtype=np.uint8)
+    pos = 0
+    for y in range(height):
+        head = data[pos:pos + 4]
+        if not (8 <= width <= 0x7FFF and head[0] == 2 and head[1] == 2 and head[2] < 128):
+            # Flat scanline
+            rgbe[y] = data[pos:pos + width * 4].reshape(width, 4)
+            pos += width * 4
+            continue
+        pos += 4
+        for c in range(4):
+            x = 0
+            plane = rgbe[y, :, c]
+            while x < width:
+                n = int(data[pos])
+                if n > 128:
+                    n -= 128
+                    plane[x:x + n] = data[pos + 1]
+                    pos += 2
+                else:
+                    plane[x:x + n] = data[pos + 1:pos + 1 + n]
+                    pos += 1 + n
+                x += n
+    return _rgbe_to_float(rgbe)
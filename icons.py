@@ -0,0 +1,52 @@
+import os
+import bpy
+
+# Custom UI icons. The SVGs are rasterized the first time the panel asks
+# for one, not at registration, and never in background sessions, which
+# don't draw any UI.
+
+ICONS_DIR = os.path.join(os.path.dirname(__file__), "assets")
+
+ICON_FILES = {
+    "ICON_RENDER": "icon_render.svg",
+    "ICON_ASSEMBLE": "icon_assemble.svg",
+    "ICON_FOLDER": "icon_folder.svg",
+    "ICON_UE5": "unreal_engine.svg",
+    "ICON_UNITY": "unity.svg",
+}
+
+_previews = None
+
+
+def load_icons():
+    import bpy.utils.previews
+    pcoll = bpy.utils.previews.new()
+    for name, filename in ICON_FILES.items():
+        path = os.path.join(ICONS_DIR, filename)
+        if not os.path.exists(path):
+            print(f"✗ Icon file not found: {path}")
+            continue
+        try:
+            pcoll.load(name, path, 'IMAGE')
+        except Exception as e:
+            print(f"⚠ Failed to load icon {filename}: {e}")
+    return pcoll
+
+
+def get_icon(name):
+    # icon_id of a custom icon, or 0 when it isn't available
+    global _previews
+    if _previews is None:
+        if bpy.app.background:
+            return 0
+        _previews = load_icons()
+    item = _previews.get(name)
+    return item.icon_id if item else 0
+
+
+def clear_icons():
+    global _previews
+    if _previews is not None:
+        import bpy.utils.previews
+        bpy.utils.previews.remove(_previews)
+        _previews = None
@@ -0,0 +1,697 @@
+import os
+import zlib
+import struct
+import queue
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .utils import is_pillow_installed, make_pool
+from .float_formats import ExrWriter, HdrWriter, UnsupportedFormat, exr_info, hdr_info, read_exr, read_hdr
+
+# Image file I/O on NumPy arrays shaped (height, width, channels), row 0 at
+# the top. Decoding prefers OpenImageIO (bundled with Blender, keeps 16-bit
+# and float data), then the NumPy readers (float_formats for EXR and HDR,
+# read_png for 16-bit PNG), then Pillow for 8-bit files when it is installed
+# and finally Blender's own image loader, so nothing here needs Pillow.
+# PNG, EXR, HDR, tiled TIFF and raw .npy are written by band-wise writers so
+# the output never needs a full-size buffer; the bytes written only depend
+# on the pixels, not on the band sizes fed in.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG colour type <-> channel count
+PNG_COLOR_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+PNG_CHANNEL_COLORS = {1: 0, 2: 4, 3: 2, 4: 6}
+
+# Rows encoded per zlib call
+PNG_BAND_ROWS = 64
+
+# Fixed IDAT chunk size keeps files identical however rows are fed in
+PNG_IDAT_SIZE = 1 << 20
+
+TIFF_TILE_SIZE = 256
+
+
+def png_header(path):
+    with open(path, "rb") as f:
+        head = f.read(33)
+    if head[:8] != PNG_SIGNATURE or head[12:16] != b"IHDR":
+        raise ValueError(f"Not a PNG file: {path}")
+    width, height, depth, color_type = struct.unpack(">IIBB", head[16:26])
+    return width, height, depth, color_type
+
+
+def _png_paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+
+def read_png(path):
+    # NumPy decoder for non-interlaced 8/16-bit PNGs, for the 16-bit colour
+    # files Pillow would cut down to 8 bits. Rows filtered with None, Sub or
+    # Up are undone a row at a time; Average and Paeth depend on the pixel to
+    # the left as well as above, so files using them are undone one
+    # anti-diagonal at a time instead.
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError(f"Not a PNG file: {path}")
+    pos = 8
+    header = None
+    idat = []
+    while pos < len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        if tag == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif tag == b"IDAT":
+            idat.append(chunk)
+        elif tag == b"IEND":
+            break
+        pos += 12 + length
+    width, height, depth, color_type, _, _, interlace = header
+    if interlace or depth not in (8, 16) or color_type == 3:
+        raise UnsupportedFormat("Interlaced, palette and sub-byte PNGs are not supported")
+    channels = PNG_COLOR_CHANNELS[color_type]
+    bpp = channels * depth // 8
+
+    raw = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(height, 1 + width * bpp)
+    filters = raw[:, 0]
+    lines = raw[:, 1:].reshape(height, width, bpp)
+    if filters.max() > 4:
+        raise ValueError(f"Corrupt PNG filter type in {path}")
+
+    if filters.max() <= 2:
+        out = np.empty((height, width, bpp), dtype=np.uint8)
+        prev = np.zeros((width, bpp), dtype=np.uint8)
+        for y in range(height):
+            if filters[y] == 1:
+                out[y] = np.cumsum(lines[y], axis=0, dtype=np.uint8)
+            elif filters[y] == 2:
+                out[y] = lines[y] + prev
+            else:
+                out[y] = lines[y]
+            prev = out[y]
+    else:
+        # Padded by one zero row and column for the neighbours off the edge
+        padded = np.zeros((height + 1, width + 1, bpp), dtype=np.int16)
+        for d in range(height + width - 1):
+            ys = np.arange(max(0, d - width + 1), min(d, height - 1) + 1)
+            xs = d - ys
+            a = padded[ys + 1, xs]
+            b = padded[ys, xs + 1]
+            c = padded[ys, xs]
+            kind = filters[ys][:, None]
+            predicted = np.select([kind == 1, kind == 2, kind == 3, kind == 4],
+                                  [a, b, (a + b) >> 1, _png_paeth(a, b, c)], 0)
+            padded[ys + 1, xs + 1] = (lines[ys, xs] + predicted) & 0xFF
+        out = padded[1:, 1:].astype(np.uint8)
+
+    if depth == 16:
+        return out.reshape(height, -1).view(">u2").astype(np.uint16).reshape(height, width, channels)
+    return out.reshape(height, width, channels)
+
+
+def image_info(path):
+    # (width, height, channels, dtype) read from the header only
+    if path.lower().endswith(".npy"):
+        pixels = np.load(path, mmap_mode='r')
+        height, width, channels = pixels.shape
+        return width, height, channels, pixels.dtype
+    if path.lower().endswith(".exr"):
+        return exr_info(path)
+    if path.lower().endswith(".hdr"):
+        return hdr_info(path)
+    if path.lower().endswith(".png"):
+        width, height, depth, color_type = png_header(path)
+        return width, height, PNG_COLOR_CHANNELS[color_type], np.uint16 if depth == 16 else np.uint8
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return _info_bpy(path)
+    with Image.open(path) as img:
+        channels = len(img.getbands())
+        # Pillow opens 16-bit colour TIFFs as 8-bit modes; BitsPerSample
+        # still says what the file holds
+        bits = getattr(img, 'tag_v2', {}).get(258) or (8,)
+        dtype = np.uint16 if img.mode.startswith("I;16") or max(bits) == 16 else np.uint8
+        return img.size[0], img.size[1], channels, dtype
+
+
+def _read_oiio(path):
+    import OpenImageIO as oiio
+    inp = oiio.ImageInput.open(path)
+    if inp is None:
+        raise OSError(oiio.geterror())
+    try:
+        spec = inp.spec()
+        pixels = inp.read_image(0, 0, 0, spec.nchannels, spec.format)
+    finally:
+        inp.close()
+    if pixels is None:
+        raise OSError(f"Failed to read {path}")
+    return pixels.reshape(spec.height, spec.width, spec.nchannels)
+
+
+def _read_pillow(path):
+    from PIL import Image
+    with Image.open(path) as img:
+        if img.mode == "P":
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        elif img.mode in ("1", "CMYK", "YCbCr"):
+            img = img.convert("RGB")
+        if img.mode.startswith("I;16"):
+            pixels = np.asarray(img).astype(np.uint16, copy=False)
+        else:
+            pixels = np.asarray(img)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    return pixels
+
+
+def _bpy_layout(img, path):
+    # (channels, dtype) of the file behind a loaded bpy image. Blender holds
+    # 8-bit files as bytes and everything deeper as float; `depth` is the
+    # file's bits per pixel for byte images.
+    if path.lower().endswith(".exr"):
+        try:
+            return exr_info(path)[2:]
+        except UnsupportedFormat:
+            return img.channels, np.float32
+    if path.lower().endswith(".hdr"):
+        return img.channels, np.float32
+    if path.lower().endswith(".png"):
+        _, _, depth, color_type = png_header(path)
+        return PNG_COLOR_CHANNELS[color_type], np.uint16 if depth == 16 else np.uint8
+    if img.is_float:
+        return img.channels, np.uint16
+    return max(1, min(4, img.depth // 8)), np.uint8
+
+
+def _info_bpy(path):
+    import bpy
+    img = bpy.data.images.load(path, check_existing=False)
+    try:
+        width, height = img.size
+        channels, dtype = _bpy_layout(img, path)
+    finally:
+        bpy.data.images.remove(img)
+    return width, height, channels, dtype
+
+
+def _read_bpy(path):
+    # Blender's own loader: pixels come back as RGBA float and are cut down
+    # to the file's channels and converted back to its integer depth
+    import bpy
+    img = bpy.data.images.load(path, check_existing=False)
+    try:
+        img.colorspace_settings.is_data = True
+        width, height = img.size
+        channels, dtype = _bpy_layout(img, path)
+        pixels = np.empty(width * height * img.channels, dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+        pixels = pixels.reshape(height, width, img.channels)[::-1]
+    finally:
+        bpy.data.images.remove(img)
+    if pixels.shape[2] == 4 and channels != 4:
+        pixels = pixels[:, :, (0, 3) if channels == 2 else slice(0, channels)]
+    if np.dtype(dtype).kind == "f":
+        return np.ascontiguousarray(pixels, dtype=dtype)
+    limit = np.iinfo(dtype).max
+    return np.rint(np.clip(pixels, 0.0, 1.0) * limit).astype(dtype)
+
+
+def _read_fallback(path):
+    # Decoders that work without OpenImageIO. Float formats never go
+    # through Pillow, whose float support is limited to single channels.
+    ext = path.lower()
+    if ext.endswith(".exr"):
+        try:
+            return read_exr(path)
+        except UnsupportedFormat:
+            return _read_bpy(path)
+    if ext.endswith(".hdr"):
+        try:
+            return read_hdr(path)
+        except UnsupportedFormat:
+            return _read_bpy(path)
+    if ext.endswith(".png") and png_header(path)[2] == 16:
+        # Pillow opens 16-bit colour PNGs as 8-bit RGB(A)
+        try:
+            return read_png(path)
+        except UnsupportedFormat:
+            return _read_bpy(path)
+    if not is_pillow_installed():
+        return _read_bpy(path)
+    _, _, channels, dtype = image_info(path)
+    if np.dtype(dtype).itemsize > 1 and channels > 1:
+        # Same for other 16-bit colour files; only single-channel ones keep
+        # their depth in Pillow
+        return _read_bpy(path)
+    return _read_pillow(path)
+
+
+def read_image(path):
+    if path.lower().endswith(".npy"):
+        return np.load(path)
+    try:
+        return _read_oiio(path)
+    except ImportError:
+        return _read_fallback(path)
+
+
+class BandReader:
+    # Reads an image a band of rows at a time. Raw .npy faces are memory
+    # mapped and OpenImageIO reads scanlines; without OpenImageIO the face is
+    # decoded once and spilled to a temporary .npy so only one face is ever
+    # held in memory.
+
+    def __init__(self, path, spill_dir=None):
+        self.path = path
+        self.width, self.height, self.channels, self.dtype = image_info(path)
+        self._spill_dir = spill_dir
+        self._spill_path = None
+        self._pixels = None
+        self._input = None
+        self._format = None
+
+        if path.lower().endswith(".npy"):
+            self._pixels = np.load(path, mmap_mode='r')
+            return
+        try:
+            import OpenImageIO as oiio
+        except ImportError:
+            self._spill()
+            return
+        self._input = oiio.ImageInput.open(path)
+        if self._input is None:
+            raise OSError(oiio.geterror())
+        spec = self._input.spec()
+        self.channels = spec.nchannels
+        self._format = spec.format
+
+    def read_rows(self, y0, y1):
+        if self._input is not None:
+            rows = self._input.read_scanlines(0, 0, y0, y1, 0, 0, self.channels, self._format)
+            return rows.reshape(y1 - y0, self.width, self.channels)
+        return self._pixels[y0:y1]
+
+    def _spill(self):
+        pixels = _read_fallback(self.path)
+        # The strip is sized from the header; a decoder that narrowed the
+        # depth would silently lose bits
+        if pixels.dtype != self.dtype:
+            raise ValueError(f"{os.path.basename(self.path)} decoded as {pixels.dtype}, "
+                             f"header says {np.dtype(self.dtype)}")
+        self.channels = pixels.shape[2]
+        fd, self._spill_path = tempfile.mkstemp(suffix=".npy", dir=self._spill_dir)
+        os.close(fd)
+        np.save(self._spill_path, pixels)
+        del pixels
+        self._pixels = np.load(self._spill_path, mmap_mode='r')
+
+    def close(self):
+        if self._input is not None:
+            self._input.close()
+            self._input = None
+        self._pixels = None
+        if self._spill_path:
+            os.remove(self._spill_path)
+            self._spill_path = None
+
+
+class PngWriter:
+    # Streams rows into a PNG file. Rows are Up-filtered with NumPy and
+    # deflated band by band, so memory stays at one band whatever the size.
+
+    def __init__(self, path, width, height, channels, dtype=np.uint8, compress_level=6):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.rows_written = 0
+        self._prev = None
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        self._file = open(path, "wb")
+        depth = 16 if self.dtype.itemsize == 2 else 8
+        self._file.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, depth, PNG_CHANNEL_COLORS[channels], 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(tag)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        rows = rows.reshape(rows.shape[0], self.width * self.channels)
+        if self.dtype.itemsize == 2:
+            rows = rows.astype(">u2", copy=False)
+        raw = rows.view(np.uint8).reshape(rows.shape[0], -1)
+
+        filtered = np.empty((raw.shape[0], raw.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2  # Up
+        filtered[:, 1:] = raw
+        if self._prev is not None:
+            filtered[0, 1:] -= self._prev
+        filtered[1:, 1:] -= raw[:-1]
+        self._prev = raw[-1].copy()
+
+        self._pending += self._compressor.compress(filtered.tobytes())
+        while len(self._pending) >= PNG_IDAT_SIZE:
+            self._chunk(b"IDAT", bytes(self._pending[:PNG_IDAT_SIZE]))
+            del self._pending[:PNG_IDAT_SIZE]
+        self.rows_written += raw.shape[0]
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self._pending += self._compressor.flush()
+            for start in range(0, len(self._pending), PNG_IDAT_SIZE):
+                self._chunk(b"IDAT", bytes(self._pending[start:start + PNG_IDAT_SIZE]))
+            self._chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+        if self.rows_written != self.height:
+            raise ValueError(f"PNG expected {self.height} rows, got {self.rows_written}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+class TiffWriter:
+    # Streams rows into a tiled, Deflate-compressed TIFF. Rows are buffered
+    # until a full row of tiles is available; the IFD goes at the end.
+
+    def __init__(self, path, width, height, channels, dtype=np.uint8, compress_level=6, tile=TIFF_TILE_SIZE):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.tile = tile
+        self.compress_level = compress_level
+        self.rows_written = 0
+        self._band = np.zeros((tile, width, channels), dtype=self.dtype)
+        self._band_rows = 0
+        self._offsets = []
+        self._counts = []
+        self._file = open(path, "wb")
+        self._file.write(b"II*\x00\x00\x00\x00\x00")
+
+    def write_rows(self, rows):
+        rows = rows.reshape(rows.shape[0], self.width, self.channels)
+        start = 0
+        while start < rows.shape[0]:
+            take = min(self.tile - self._band_rows, rows.shape[0] - start)
+            self._band[self._band_rows:self._band_rows + take] = rows[start:start + take]
+            self._band_rows += take
+            start += take
+            if self._band_rows == self.tile:
+                self._flush_band()
+        self.rows_written += rows.shape[0]
+
+    def _flush_band(self):
+        # Tiles are always full size; the last row and column are zero padded
+        self._band[self._band_rows:] = 0
+        for x in range(0, self.width, self.tile):
+            tile = np.zeros((self.tile, self.tile, self.channels), dtype=self.dtype)
+            part = self._band[:, x:x + self.tile]
+            tile[:, :part.shape[1]] = part
+            data = zlib.compress(tile.astype(self.dtype.newbyteorder("<"), copy=False).tobytes(), self.compress_level)
+            self._offsets.append(self._file.tell())
+            self._counts.append(len(data))
+            self._file.write(data)
+            if self._file.tell() & 1:
+                self._file.write(b"\x00")
+        self._band_rows = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._band_rows:
+                self._flush_band()
+            self._write_ifd()
+        finally:
+            self._file.close()
+        if self.rows_written != self.height:
+            raise ValueError(f"TIFF expected {self.height} rows, got {self.rows_written}")
+
+    def _write_ifd(self):
+        f = self._file
+        if f.tell() + 12 * len(self._offsets) > 0xFFFFFFFF:
+            raise ValueError("Strip too large for a classic TIFF; use the raw container")
+
+        bits = self.dtype.itemsize * 8
+        sample_format = 3 if self.dtype.kind == "f" else 1
+        extra = self.channels in (2, 4)
+        spp = self.channels
+
+        # Out-of-line arrays first, then the IFD pointing at them
+        def array(fmt, values):
+            offset = f.tell()
+            f.write(struct.pack("<" + fmt * len(values), *values))
+            if f.tell() & 1:
+                f.write(b"\x00")
+            return offset
+
+        def value(type_, fmt, values):
+            packed = struct.pack("<" + fmt * len(values), *values)
+            if len(packed) <= 4:
+                return type_, len(values), packed.ljust(4, b"\x00")
+            return type_, len(values), struct.pack("<I", array(fmt, values))
+
+        SHORT, LONG = 3, 4
+        tags = {
+            256: value(LONG, "I", [self.width]),
+            257: value(LONG, "I", [self.height]),
+            258: value(SHORT, "H", [bits] * spp),
+            259: value(SHORT, "H", [8]),  # Adobe Deflate
+            262: value(SHORT, "H", [2 if spp >= 3 else 1]),
+            277: value(SHORT, "H", [spp]),
+            284: value(SHORT, "H", [1]),
+            322: value(SHORT, "H", [self.tile]),
+            323: value(SHORT, "H", [self.tile]),
+            324: value(LONG, "I", self._offsets),
+            325: value(LONG, "I", self._counts),
+            339: value(SHORT, "H", [sample_format] * spp),
+        }
+        if extra:
+            tags[338] = value(SHORT, "H", [2])  # unassociated alpha
+
+        ifd_offset = f.tell()
+        f.write(struct.pack("<H", len(tags)))
+        for tag in sorted(tags):
+            type_, count, data = tags[tag]
+            f.write(struct.pack("<HHI", tag, type_, count) + data)
+        f.write(struct.pack("<I", 0))
+        f.seek(4)
+        f.write(struct.pack("<I", ifd_offset))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+class RawWriter:
+    # Streams rows into a .npy file (NumPy header + C-order pixels), which
+    # np.load(path, mmap_mode='r') maps back without reading it all.
+
+    def __init__(self, path, width, height, channels, dtype=np.uint8):
+        self.height = height
+        self.shape = (height, width, channels)
+        self.dtype = np.dtype(dtype)
+        self.rows_written = 0
+        self._file = open(path, "wb")
+        np.lib.format.write_array_header_1_0(self._file, {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': self.shape,
+        })
+
+    def write_rows(self, rows):
+        self._file.write(np.ascontiguousarray(rows, dtype=self.dtype).tobytes())
+        self.rows_written += rows.shape[0]
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.rows_written != self.height:
+            raise ValueError(f"Raw expected {self.height} rows, got {self.rows_written}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+STREAM_WRITERS = {
+    ".exr": ExrWriter,
+    ".hdr": HdrWriter,
+    ".png": PngWriter,
+    ".tif": TiffWriter,
+    ".tiff": TiffWriter,
+    ".npy": RawWriter,
+}
+
+
+def open_writer(path, width, height, channels, dtype, **options):
+    ext = os.path.splitext(path)[1].lower()
+    writer = STREAM_WRITERS.get(ext)
+    if writer is None:
+        raise ValueError(f"Streaming output not supported for {ext}; use PNG, EXR, HDR, TIFF or raw")
+    return writer(path, width, height, channels, dtype, **options)
+
+
+def _write_bpy(path, pixels, file_format, quality=90):
+    # Blender's own encoder, for formats without a NumPy writer. Must run
+    # on Blender's main thread.
+    import bpy
+    height, width, channels = pixels.shape
+    values = pixels[::-1].astype(np.float32)
+    if pixels.dtype.kind != "f":
+        values /= np.iinfo(pixels.dtype).max
+    rgba = np.ones((height, width, 4), dtype=np.float32)
+    rgba[:, :, :3] = values[:, :, :3] if channels >= 3 else values[:, :, :1]
+    if channels in (2, 4):
+        rgba[:, :, 3] = values[:, :, -1]
+    img = bpy.data.images.new("cubemap_write", width, height, alpha=channels in (2, 4),
+                              float_buffer=pixels.dtype != np.uint8)
+    try:
+        img.colorspace_settings.is_data = True
+        img.pixels.foreach_set(rgba.ravel())
+        img.file_format = file_format
+        img.filepath_raw = path
+        img.save(filepath=path, quality=quality)
+    finally:
+        bpy.data.images.remove(img)
+
+
+def write_jpeg(path, pixels, quality=75, subsampling=None):
+    # subsampling: None (Pillow's default), "4:4:4", "4:2:2" or "4:2:0".
+    # Without Pillow, Blender encodes it and picks the subsampling itself.
+    try:
+        from PIL import Image
+    except ImportError:
+        _write_bpy(path, pixels, 'JPEG', quality)
+        return
+    if pixels.shape[2] == 1:
+        img = Image.fromarray(pixels[:, :, 0], "L")
+    else:
+        img = Image.fromarray(np.ascontiguousarray(pixels[:, :, :3]), "RGB")
+    if subsampling:
+        img.save(path, quality=quality, subsampling=subsampling)
+    else:
+        img.save(path, quality=quality)
+
+
+def write_image(path, pixels, **options):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jpg", ".jpeg"):
+        write_jpeg(path, pixels, **options)
+        return
+    height, width, channels = pixels.shape
+    with open_writer(path, width, height, channels, pixels.dtype, **options) as writer:
+        for y in range(0, height, PNG_BAND_ROWS):
+            writer.write_rows(pixels[y:y + PNG_BAND_ROWS])
+
+
+def _write_scratch(scratch_path, path, options):
+    # Worker side of BackgroundWriter: encode a face from its scratch copy
+    try:
+        pixels = np.load(scratch_path, mmap_mode='r')
+        write_image(path, pixels, **options)
+        del pixels
+    finally:
+        os.remove(scratch_path)
+
+
+class BackgroundWriter:
+    # Encodes and writes images in worker processes while the caller goes
+    # on with the next one; Blender keeps the GIL for the length of a
+    # blocking render, so threads would stall (they are the fallback outside
+    # Linux, see utils.make_pool). At most `max_pending` images
+    # are queued or being written; submit() blocks until a slot frees up,
+    # which caps the memory held by the queue. Process workers get the
+    # pixels as a memory-mapped scratch .npy next to the output rather than
+    # pickled through a pipe. Completion callbacks are queued and run by
+    # drain() or close() on the caller's thread, never the pool's, so they
+    # may touch Blender data.
+
+    def __init__(self, workers=2, max_pending=2):
+        self._pool = make_pool(workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self._done = queue.SimpleQueue()
+
+    def submit(self, path, pixels, callback=None, **options):
+        # callback(path) runs from drain() or close() once the file is written
+        self._slots.acquire()
+        scratch = None
+        try:
+            if isinstance(self._pool, ProcessPoolExecutor):
+                fd, scratch = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(path) or None)
+                os.close(fd)
+                np.save(scratch, pixels)
+                future = self._pool.submit(_write_scratch, scratch, path, options)
+            else:
+                future = self._pool.submit(write_image, path, pixels, **options)
+        except Exception:
+            self._slots.release()
+            if scratch:
+                os.remove(scratch)
+            raise
+
+        def finished(future):
+            self._slots.release()
+            if callback is not None and future.exception() is None:
+                self._done.put((callback, path))
+
+        future.add_done_callback(finished)
+        self._futures.append((path, future))
+
+    def drain(self):
+        # Run the callbacks of the files written since the last call
+        while True:
+            try:
+                callback, path = self._done.get_nowait()
+            except queue.Empty:
+                return
+            callback(path)
+
+    def close(self, raise_errors=True):
+        # Wait for every write; raises the first failure unless told not to
+        self._pool.shutdown(wait=True)
+        self.drain()
+        for path, future in self._futures:
+            error = future.exception()
+            if error is not None and raise_errors:
+                raise RuntimeError(f"Failed to write {os.path.basename(path)}: {error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(raise_errors=exc_type is None)
+
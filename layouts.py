@@ -0,0 +1,108 @@
+import os
+from functools import lru_cache
+import numpy as np
+from .const import CUBEMAP_LAYOUTS, CUBEMAP_PRESETS
+from .projection import face_basis
+from .utils import cache_dir, cached_array
+
+# Layout engine: every layout is a gather map holding, for each output pixel,
+# an index into the six faces stacked as one (6 * size * size + 1, channels)
+# array. The extra last row is the fill value for empty cells, so assembling
+# any layout is a single fancy-indexing gather.
+
+# Bumped when cell placement changes, so maps cached on disk are rebuilt
+MAP_VERSION = 2
+
+
+def layout_cells(layout_key, preset_key):
+    # [(face index, column, row, quarter turns, mirror)] in preset face order
+    layout = CUBEMAP_LAYOUTS.get(layout_key)
+    if not layout:
+        raise ValueError(f"Unknown layout '{layout_key}'")
+    preset = CUBEMAP_PRESETS.get(preset_key)
+    if not preset:
+        raise ValueError("Invalid engine preset")
+    if 'unfold' in layout:
+        return unfold_cells(layout, preset)
+    if layout['cells'] is None:
+        return [(i, i, 0, 0, False) for i in range(len(preset['faces']))]
+    order = preset['cube_faces']
+    return [(order.index(face), col, row, turns, mirror) for face, col, row, turns, mirror in layout['cells']]
+
+
+def cell_turns(face_axes, cell_axes):
+    # (quarter turns, mirror) that line the face's right and up axes up with
+    # the cell's, in the order build_map applies them
+    right, up = (np.array([axis @ cell_axes[0], axis @ cell_axes[1]]) for axis in face_axes)
+    for mirror in (False, True):
+        for turns in range(4):
+            r, u = np.array([1, 0]), np.array([0, 1])
+            for _ in range(turns):
+                # A counter-clockwise quarter turn of the image
+                r, u = np.array([-r[1], r[0]]), np.array([-u[1], u[0]])
+            if mirror:
+                r, u = r * [-1, 1], u * [-1, 1]
+            if (r == right).all() and (u == up).all():
+                return turns, mirror
+    raise ValueError("Face axes don't fit the cell")
+
+
+def unfold_cells(layout, preset):
+    # Cells of a cross, derived from the preset's face directions: starting
+    # at the anchor face, each neighbouring slot gets the face across that
+    # edge of the cube, turned so the shared edge lines up
+    bases = [tuple(np.rint(axis).astype(int) for axis in face_basis(rot)) for _, rot in preset['faces']]
+    anchor, col, row = layout['unfold']
+    slots = set(layout['slots'])
+    axes = {(col, row): bases[preset['cube_faces'].index(anchor)]}
+    queue = [(col, row)]
+    while queue:
+        col, row = queue.pop(0)
+        right, up, forward = axes[(col, row)]
+        steps = {
+            (1, 0): (-forward, up, right),
+            (-1, 0): (forward, up, -right),
+            (0, -1): (right, -forward, up),
+            (0, 1): (right, forward, -up),
+        }
+        for (dc, dr), neighbour in steps.items():
+            slot = (col + dc, row + dr)
+            if slot in slots and slot not in axes:
+                axes[slot] = neighbour
+                queue.append(slot)
+
+    cells = []
+    for (col, row), (right, up, forward) in axes.items():
+        index = next(i for i, basis in enumerate(bases) if (basis[2] == forward).all())
+        turns, mirror = cell_turns(bases[index][:2], (right, up))
+        cells.append((index, col, row, turns, mirror))
+    return sorted(cells)
+
+
+def layout_size(layout_key, size):
+    cols, rows = CUBEMAP_LAYOUTS[layout_key]['grid']
+    return cols * size, rows * size
+
+
+def build_map(layout_key, preset_key, size):
+    width, height = layout_size(layout_key, size)
+    face_pixels = size * size
+    gather = np.full((height, width), 6 * face_pixels, dtype=np.uint32)
+    local = np.arange(face_pixels, dtype=np.uint32).reshape(size, size)
+    for index, col, row, turns, mirror in layout_cells(layout_key, preset_key):
+        cell = np.rot90(local, turns)
+        if mirror:
+            cell = cell[:, ::-1]
+        gather[row * size:(row + 1) * size, col * size:(col + 1) * size] = cell + index * face_pixels
+    return gather
+
+
+def map_path(layout_key, preset_key, size):
+    return os.path.join(cache_dir("layouts"), f"{layout_key}_{preset_key}_{size}_v{MAP_VERSION}.npy")
+
+
+@lru_cache(maxsize=8)
+def gather_map(layout_key, preset_key, size):
+    # Read-only map from memory, then disk (memory-mapped, so large maps
+    # aren't held in RAM between assemblies), else built and saved
+    return cached_array(map_path(layout_key, preset_key, size), lambda: build_map(layout_key, preset_key, size))
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+from .image_io import image_info
+
+# Run instrumentation: wall time per phase (per face for captures), peak
+# resident memory and the files written. Every operator run writes one
+# report next to its outputs as {base_name}_report.json.
+
+REPORT_VERSION = 1
+
+# Per-face capture phases, in the order they happen
+FACE_PHASES = ('update', 'render', 'grab', 'write')
+
+
+def reset_peak_rss():
+    # Linux can restart the high-water mark, so the peak covers this run
+    # only; elsewhere it is the peak since Blender started
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    # Peak resident set size of this process in bytes, or None
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage',
+                )
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def children_peak_rss():
+    # Largest peak of any finished worker process (process pools), or None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+@contextmanager
+def phase(metrics, name, face=None):
+    # Time a block into `metrics`; a no-op when metrics is None
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start, face)
+
+
+class RunReport:
+    def __init__(self, operation, settings):
+        self.operation = operation
+        self.settings = {
+            key: getattr(settings, key, None)
+            for key in ('base_name', 'engine_preset', 'resolution', 'file_format', 'capture_mode', 'layout')
+        }
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.run_peak = reset_peak_rss()
+        self.phases = {}
+        self.faces = []
+        self.files = []
+
+    def face_entry(self, face):
+        entry = next((f for f in self.faces if f['face'] == face), None)
+        if entry is None:
+            entry = {'face': face}
+            self.faces.append(entry)
+        return entry
+
+    def add(self, name, seconds, face=None):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        if face is not None:
+            entry = self.face_entry(face)
+            entry[name] = entry.get(name, 0.0) + seconds
+
+    def add_timings(self, timings):
+        # Per-face timings as returned by capture_cubemap
+        for timing in timings:
+            for name in FACE_PHASES:
+                if name in timing:
+                    self.add(name, timing[name], timing['face'])
+            if timing.get('cached'):
+                self.face_entry(timing['face'])['cached'] = True
+
+    def add_files(self, paths):
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            entry = {'path': path, 'bytes': os.path.getsize(path)}
+            try:
+                width, height, channels, dtype = image_info(path)
+                entry.update(width=width, height=height, channels=channels, dtype=str(dtype))
+            except Exception:
+                pass
+            self.files.append(entry)
+
+    def as_dict(self):
+        return {
+            'version': REPORT_VERSION,
+            'operation': self.operation,
+            'settings': self.settings,
+            'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            'elapsed': time.perf_counter() - self.start,
+            'phases': self.phases,
+            'faces': self.faces,
+            'peak_rss': peak_rss(),
+            'peak_rss_scope': "run" if self.run_peak else "process",
+            'peak_rss_children': children_peak_rss(),
+            'bytes_written': sum(f['bytes'] for f in self.files),
+            'files': self.files,
+        }
+
+    def summary(self):
+        # One short line per fact, for the panel
+        data = self.as_dict()
+        lines = [f"{self.operation}: {data['elapsed']:.1f}s"]
+        top = sorted(self.phases.items(), key=lambda item: -item[1])[:3]
+        if top:
+            lines.append(", ".join(f"{name} {seconds:.1f}s" for name, seconds in top))
+        cached = sum(1 for f in self.faces if f.get('cached'))
+        if cached:
+            lines.append(f"{cached}/{len(self.faces)} faces unchanged")
+        if data['peak_rss']:
+            lines.append(f"Peak memory {format_bytes(data['peak_rss'])}")
+        lines.append(f"{len(self.files)} files, {format_bytes(data['bytes_written'])}")
+        return "\n".join(lines)
+
+    def write(self, output_dir, base_name):
+        path = os.path.join(output_dir, f"{base_name}_report.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+        return path
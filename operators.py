@@ -1,10 +1,55 @@
 import bpy
 import os
+import json
 import math
 import platform
 import subprocess
-from .const import CUBEMAP_PRESETS
-from .utils import install_pillow, is_pillow_installed
+import time
+from .const import CUBEMAP_LAYOUTS, CUBEMAP_PRESETS
+from .capture import (
+    MAX_FACE_SIZE, aim_face, capture_cubemap, environment_faces, face_writer, grab_face, prepare_cache,
+    record_cache, remove_tile_buffers, restore_capture, setup_capture,
+)
+from .assembly import assemble_faces, face_paths, stitch_strip, strip_options, write_mapped_strip, write_strip
+from .batch import SETTING_KEYS, run_cli
+from .probes import auto_budget, collect_probes, farm_worker_command, probe_entries, run_workers
+from .farm import run_farm
+from .sequence import expand_sequence, frame_range
+from .prefilter import write_prefiltered
+from .reproject import write_converted
+from .sh import write_sh
+from .containers import write_containers
+from .pyramid import write_tiers
+from .metrics import RunReport, phase
+from .utils import install_pillow, invalidate_pillow_status
+
+# Cube textures are encoded from the whole faces at once
+TILED_CONTAINER_ERROR = "Cube textures can't follow a tiled capture; turn off Cube Texture"
+
+
+def save_report(props, metrics, output_dir):
+    # Write the JSON run report and keep its summary for the panel
+    try:
+        path = metrics.write(output_dir, props.base_name)
+    except OSError as e:
+        print(f"Failed to write run report: {e}")
+        path = None
+    props.last_report = metrics.summary()
+    return path
+
+
+def write_extras(output_dir, props, metrics, faces=None):
+    # SH, cube texture and tier outputs that follow a render
+    if props.write_sh:
+        with phase(metrics, 'sh'):
+            metrics.add_files(write_sh(output_dir, props, faces))
+    if props.write_container:
+        with phase(metrics, 'container'):
+            metrics.add_files(write_containers(output_dir, props, faces))
+    if props.write_tiers:
+        with phase(metrics, 'tiers'):
+            metrics.add_files(write_tiers(output_dir, props, faces))
+
 
 class CUBEMAP_OT_create_camera(bpy.types.Operator):
     bl_idname = "cubemap.create_camera"
@@ -67,89 +112,560 @@ class CUBEMAP_OT_apply_preset(bpy.types.Operator):
 class CUBEMAP_OT_render(bpy.types.Operator):
     bl_idname = "cubemap.render"
     bl_label = "Render Cubemap"
+    bl_description = "Render the six faces one after another without blocking the interface (Esc cancels)"
     bl_options = {'REGISTER'}
 
+    # Seconds between checks of the running face render
+    TIMER_STEP = 0.05
+
+    # One modal capture at a time
+    running = False
+
+    @classmethod
+    def poll(cls, context):
+        return not cls.running
+
+    def prepare(self, context):
+        # (output_dir, preset), or (None, None) after reporting the error
+        scene = context.scene
+        props = scene.cubemap_props
+
+        if scene.camera is None and props.capture_mode != 'HDRI':
+            self.report({'ERROR'}, "No active camera. Create or select a camera first.")
+            return None, None
+
+        output_dir = bpy.path.abspath(props.output_path)
+        if not output_dir or output_dir == "":
+            self.report({'ERROR'}, "Output path is not set")
+            return None, None
+        os.makedirs(output_dir, exist_ok=True)
+
+        preset = CUBEMAP_PRESETS.get(props.engine_preset)
+        if not preset:
+            self.report({'ERROR'}, "Invalid engine preset")
+            return None, None
+        if props.resolution > MAX_FACE_SIZE and props.capture_mode != 'TILED':
+            self.report({'ERROR'}, f"Faces above {MAX_FACE_SIZE} need the Six Views (Tiled) capture")
+            return None, None
+        if props.capture_mode == 'TILED' and props.write_container:
+            self.report({'ERROR'}, TILED_CONTAINER_ERROR)
+            return None, None
+        return output_dir, preset
+
     def execute(self, context):
+        # Blocking capture, for scripts and background mode
         scene = context.scene
         props = scene.cubemap_props
         cam = scene.camera
+        output_dir, preset = self.prepare(context)
+        if not output_dir:
+            return {'CANCELLED'}
 
-        if cam is None:
+        self.report({'INFO'}, f"Starting {preset['name']} cubemap render...")
+        start = time.perf_counter()
+        metrics = RunReport("Render", props)
+
+        try:
+            capture_cubemap(scene, cam, props, output_dir, report=self.report, metrics=metrics)
+            metrics.add_files(face_paths(output_dir, props.base_name, props.engine_preset, props.file_format))
+            write_extras(output_dir, props, metrics)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to render: {str(e)}")
+            return {'CANCELLED'}
+        save_report(props, metrics, output_dir)
+
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, f"✓ {preset['name']} cubemap complete in {elapsed:.1f}s! 6 files saved to: {output_dir}")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        # Each face is an asynchronous render job started from a timer, so
+        # the interface stays live between and during faces. Single-render
+        # and tiled captures and background mode use the blocking path.
+        scene = context.scene
+        props = scene.cubemap_props
+        if bpy.app.background or props.capture_mode in {'PANORAMA', 'HDRI', 'TILED'}:
+            return self.execute(context)
+        if CUBEMAP_OT_render.running:
+            self.report({'ERROR'}, "A cubemap render is already running")
+            return {'CANCELLED'}
+
+        self.output_dir, self.preset = self.prepare(context)
+        if not self.output_dir:
+            return {'CANCELLED'}
+
+        self.cam = scene.camera
+        self.faces = self.preset['faces']
+        self.paths = face_paths(self.output_dir, props.base_name, props.engine_preset, props.file_format)
+        self.metrics = RunReport("Render", props)
+        self.start = time.perf_counter()
+        try:
+            self.fingerprints, self.manifest, cached = prepare_cache(
+                scene, self.cam, props, self.output_dir, self.paths, True, report=self.report, metrics=self.metrics,
+            )
+            self.state = setup_capture(scene, self.cam, props)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to render: {str(e)}")
+            return {'CANCELLED'}
+
+        self.metrics.add_timings([
+            {'face': self.faces[idx][0], 'cached': True} for idx in sorted(cached)
+        ])
+        self.writer = face_writer(props, True)
+        self.written = []
+        self.write_options = strip_options(self.paths[0], props)
+        self.queue = [idx for idx in range(len(self.faces)) if idx not in cached]
+        self.total = len(self.queue)
+        self.face_times = []
+        self.current = None
+        self.rendering = False
+        self.render_failed = False
+        self.cancel_requested = False
+
+        # Render job callbacks; they only flip flags; the timer does the work
+        def on_complete(*args):
+            self.render_end = time.perf_counter()
+            self.rendering = False
+
+        def on_cancel(*args):
+            self.rendering = False
+            self.render_failed = True
+
+        self.handlers = ((bpy.app.handlers.render_complete, on_complete),
+                         (bpy.app.handlers.render_cancel, on_cancel))
+        for handlers, callback in self.handlers:
+            handlers.append(callback)
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(self.TIMER_STEP, window=context.window)
+        wm.progress_begin(0, max(self.total, 1))
+        wm.modal_handler_add(self)
+        CUBEMAP_OT_render.running = True
+        self.report({'INFO'}, f"Starting {self.preset['name']} cubemap render ({self.total} faces, Esc to cancel)...")
+        self.set_status(context, "Starting...")
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            # Passed on so a running render job is stopped as well
+            self.cancel_requested = True
+            return {'PASS_THROUGH'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if self.writer:
+            # Completion notices of the background writes, on the main thread
+            self.writer.drain()
+        if self.rendering:
+            return {'PASS_THROUGH'}
+
+        try:
+            if self.current is not None and not self.render_failed:
+                self.save_face(context)
+            if self.cancel_requested or self.render_failed:
+                return self.finish(context, cancelled=True)
+            if not self.queue:
+                return self.finish(context)
+            self.render_face(context)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to render: {str(e)}")
+            return self.finish(context, cancelled=True)
+        return {'RUNNING_MODAL'}
+
+    def render_face(self, context):
+        idx = self.queue.pop(0)
+        suffix, rot = self.faces[idx]
+        t0 = time.perf_counter()
+        aim_face(self.cam, rot)
+        self.current = (idx, t0, time.perf_counter())
+        self.rendering = True
+        if 'CANCELLED' in bpy.ops.render.render('INVOKE_DEFAULT'):
+            self.rendering = False
+            self.current = None
+            raise RuntimeError("Blender refused to start the render (is another render running?)")
+
+    def save_face(self, context):
+        idx, t0, t1 = self.current
+        self.current = None
+        suffix = self.faces[idx][0]
+        t2 = time.perf_counter()
+        if self.writer:
+            pixels = grab_face(context.scene)
+            grabbed = time.perf_counter()
+            # Cached once the writer has the file on disk
+            self.writer.submit(self.paths[idx], pixels, callback=lambda _, idx=idx: self.written.append(idx),
+                               **self.write_options)
+        else:
+            grabbed = t2
+            bpy.data.images['Render Result'].save_render(self.paths[idx], scene=context.scene)
+        t3 = time.perf_counter()
+        self.metrics.add_timings([{
+            'face': suffix, 'update': t1 - t0, 'render': self.render_end - t1, 'grab': grabbed - t2,
+            'write': t3 - grabbed,
+        }])
+        if not self.writer and self.fingerprints:
+            # Recorded per face, so a cancelled run keeps what it finished
+            record_cache(self.output_dir, context.scene.cubemap_props.base_name, self.manifest, self.paths,
+                         self.fingerprints, [idx])
+
+        self.face_times.append(t3 - t0)
+        done = len(self.face_times)
+        eta = sum(self.face_times) / done * (self.total - done)
+        context.window_manager.progress_update(done)
+        print(f"[{idx+1}/6] Rendered: {suffix} -> {self.paths[idx]} "
+              f"(render {self.render_end - t1:.2f}s, write {t3 - t2:.2f}s)")
+        self.report({'INFO'}, f"Rendered {done}/{self.total}: {suffix}")
+        self.set_status(context, f"{done}/{self.total} faces, ETA {eta:.0f}s (Esc to cancel)", done / self.total)
+
+    def set_status(self, context, text, factor=0.0):
+        props = context.scene.cubemap_props
+        props.render_status = text
+        props.render_progress = factor
+        for window in context.window_manager.windows:
+            if window.screen:
+                for area in window.screen.areas:
+                    area.tag_redraw()
+
+    def finish(self, context, cancelled=False):
+        scene = context.scene
+        props = scene.cubemap_props
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        for handlers, callback in self.handlers:
+            if callback in handlers:
+                handlers.remove(callback)
+        restore_capture(scene, self.cam, self.state)
+        CUBEMAP_OT_render.running = False
+        self.set_status(context, "")
+
+        if self.writer:
+            # Done means every face file is on disk
+            try:
+                with phase(self.metrics, 'write_wait'):
+                    self.writer.close()
+                if self.fingerprints:
+                    record_cache(self.output_dir, props.base_name, self.manifest, self.paths, self.fingerprints,
+                                 self.written)
+            except Exception as e:
+                self.report({'ERROR'}, str(e))
+                cancelled = True
+        if not cancelled:
+            try:
+                write_extras(self.output_dir, props, self.metrics)
+            except Exception as e:
+                self.report({'ERROR'}, f"Failed to render: {str(e)}")
+                cancelled = True
+        self.metrics.add_files(self.paths)
+        save_report(props, self.metrics, self.output_dir)
+
+        elapsed = time.perf_counter() - self.start
+        if cancelled:
+            self.report({'WARNING'}, f"Cubemap render stopped after {len(self.face_times)}/{self.total} faces "
+                                     f"({elapsed:.1f}s); camera and render settings restored")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"✓ {self.preset['name']} cubemap complete in {elapsed:.1f}s! "
+                              f"6 files saved to: {self.output_dir}")
+        return {'FINISHED'}
+
+    def cancel(self, context):
+        # Blender is tearing the operator down (file load, window closed)
+        if CUBEMAP_OT_render.running:
+            self.finish(context, cancelled=True)
+
+
+class CUBEMAP_OT_faces_from_hdri(bpy.types.Operator):
+    bl_idname = "cubemap.faces_from_hdri"
+    bl_label = "Faces from HDRI"
+    bl_description = "Resample the world's HDRI (or the HDRI file) straight into the six faces, without rendering"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        scene = context.scene
+        props = scene.cubemap_props
+
+        output_dir = bpy.path.abspath(props.output_path)
+        if not output_dir:
+            self.report({'ERROR'}, "Output path is not set")
+            return {'CANCELLED'}
+        os.makedirs(output_dir, exist_ok=True)
+
+        start = time.perf_counter()
+        try:
+            environment_faces(scene, props, output_dir)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to resample HDRI: {str(e)}")
+            return {'CANCELLED'}
+
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, f"✓ Faces resampled from HDRI in {elapsed:.1f}s to: {output_dir}")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_render_assemble(bpy.types.Operator):
+    bl_idname = "cubemap.render_assemble"
+    bl_label = "Render and Assemble Cubemap"
+    bl_description = "Render the faces and assemble the strip in memory, without re-reading face files"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        scene = context.scene
+        props = scene.cubemap_props
+        cam = scene.camera
+
+        if cam is None and props.capture_mode != 'HDRI':
             self.report({'ERROR'}, "No active camera. Create or select a camera first.")
             return {'CANCELLED'}
 
         output_dir = bpy.path.abspath(props.output_path)
-        if not output_dir or output_dir == "":
+        if not output_dir:
             self.report({'ERROR'}, "Output path is not set")
             return {'CANCELLED'}
+        if props.capture_mode == 'TILED' and props.write_container:
+            self.report({'ERROR'}, TILED_CONTAINER_ERROR)
+            return {'CANCELLED'}
         os.makedirs(output_dir, exist_ok=True)
 
-        # Save original state
-        orig_rot = cam.rotation_euler.copy()
-        orig_rot_mode = cam.rotation_mode
-        orig_filepath = scene.render.filepath
-        orig_res_x = scene.render.resolution_x
-        orig_res_y = scene.render.resolution_y
-        orig_format = scene.render.image_settings.file_format
+        start = time.perf_counter()
+        metrics = RunReport("Render and Assemble", props)
+        try:
+            _, faces = capture_cubemap(scene, cam, props, output_dir, report=self.report, collect=True,
+                                       metrics=metrics)
+            if props.capture_mode == 'TILED':
+                # Memory-mapped faces are streamed, never assembled whole
+                output_path, width, height = write_mapped_strip(output_dir, props, faces, metrics)
+            else:
+                with phase(metrics, 'assemble'):
+                    strip = assemble_faces(faces, props.layout, props.engine_preset)
+                output_path, width, height = write_strip(output_dir, props, strip, metrics)
+                del strip
+            if props.write_faces:
+                metrics.add_files(face_paths(output_dir, props.base_name, props.engine_preset, props.file_format))
+            metrics.add_files([output_path])
+            write_extras(output_dir, props, metrics, faces)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to render and assemble: {str(e)}")
+            return {'CANCELLED'}
+        finally:
+            if props.capture_mode == 'TILED':
+                faces = None
+                remove_tile_buffers(output_dir, props.base_name)
+        save_report(props, metrics, output_dir)
 
-        # Setup render settings
-        cam.rotation_mode = 'XYZ'
-        scene.render.resolution_x = props.resolution
-        scene.render.resolution_y = props.resolution
-        scene.render.image_settings.file_format = props.file_format
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, f"✓ Cubemap saved in {elapsed:.1f}s: {output_path} ({width}x{height})")
+        return {'FINISHED'}
 
-        if props.file_format == 'OPEN_EXR':
-            scene.render.image_settings.color_depth = '32'
-            scene.render.image_settings.exr_codec = 'ZIP'
 
-        cam.data.angle = math.radians(90.0)
+class CUBEMAP_OT_batch(bpy.types.Operator):
+    bl_idname = "cubemap.batch"
+    bl_label = "Batch Render Cubemaps"
+    bl_description = "Render and assemble the probes listed in a JSON job file (reads '-- --cubemap job.json' when run headless)"
+    bl_options = {'REGISTER'}
 
-        preset = CUBEMAP_PRESETS.get(props.engine_preset)
-        if not preset:
-            self.report({'ERROR'}, "Invalid engine preset")
+    job_file: bpy.props.StringProperty(default="", subtype='FILE_PATH')
+    status_file: bpy.props.StringProperty(default="", subtype='FILE_PATH')
+
+    def execute(self, context):
+        status = run_cli(context.scene, job_file=self.job_file, status_file=self.status_file)
+        if status['status'] != 'ok':
+            detail = status.get('error') or f"{status['failed']} probe(s) failed"
+            self.report({'ERROR'}, f"Batch {status['status']}: {detail}")
             return {'CANCELLED'}
 
-        faces = preset['faces']
-        self.report({'INFO'}, f"Starting {preset['name']} cubemap render...")
+        if 'worker' in status:
+            self.report({'INFO'}, f"✓ Farm worker finished: {status['done']} task(s) done, "
+                                  f"{status['failed']} failed in {status['elapsed']:.1f}s")
+            return {'FINISHED'}
+        self.report({'INFO'}, f"✓ Batch complete: {len(status['probes'])} probe(s) in {status['elapsed']:.1f}s")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_render_probes(bpy.types.Operator):
+    bl_idname = "cubemap.render_probes"
+    bl_label = "Render Probe Set"
+    bl_description = "Render every probe of the probe set in parallel background Blender processes"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        scene = context.scene
+        props = scene.cubemap_props
+
+        output_dir = bpy.path.abspath(props.output_path)
+        if not output_dir:
+            self.report({'ERROR'}, "Output path is not set")
+            return {'CANCELLED'}
 
         try:
-            for idx, (suffix, rot) in enumerate(faces):
-                cam.rotation_euler[0] = rot[0]
-                cam.rotation_euler[1] = rot[1]
-                cam.rotation_euler[2] = rot[2]
+            probes = collect_probes(props)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
 
-                filepath = os.path.join(output_dir, f"{props.base_name}_{idx+1}_{suffix}")
-                scene.render.filepath = filepath
-                
-                # Update view layer to ensure camera update takes effect
-                bpy.context.view_layer.update()
+        workers, threads = auto_budget(len(probes), props.probe_workers)
 
-                bpy.ops.render.render(write_still=True)
-                print(f"[{idx+1}/6] Rendered: {suffix} -> {filepath}")
-                self.report({'INFO'}, f"Rendered {idx+1}/6: {suffix}")
+        # Workers load a copy so unsaved changes are rendered too
+        work_dir = os.path.join(output_dir, ".probe_jobs")
+        os.makedirs(work_dir, exist_ok=True)
+        blend_path = os.path.join(work_dir, "probe_scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
 
-        except Exception as e:
-            self.report({'ERROR'}, f"Failed to render: {str(e)}")
+        job = {key: getattr(props, key) for key in SETTING_KEYS}
+        job['output_path'] = output_dir
+        job['probes'] = probe_entries(probes, output_dir)
+
+        self.report({'INFO'}, f"Rendering {len(probes)} probes with {workers} worker(s) x {threads} thread(s)...")
+        wm = context.window_manager
+        wm.progress_begin(0, workers)
+        try:
+            status = run_workers(blend_path, job, work_dir, workers, threads,
+                                 progress=lambda done, total: wm.progress_update(done))
+        finally:
+            wm.progress_end()
+
+        with open(os.path.join(work_dir, "probe_status.json"), "w", encoding="utf-8") as f:
+            json.dump(status, f, indent=2)
+
+        if status['status'] != 'ok':
+            self.report({'ERROR'}, f"Probe set {status['status']}: {status['failed']} probe(s) failed, "
+                                   f"{len(status['errors'])} worker error(s). See {work_dir}")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f"✓ {len(probes)} probes rendered in {status['elapsed']:.1f}s to: {output_dir}")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_render_sequence(bpy.types.Operator):
+    bl_idname = "cubemap.render_sequence"
+    bl_label = "Render Sequence"
+    bl_description = "Render the cubemap on every frame of the scene's frame range in parallel background Blender processes"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        scene = context.scene
+        props = scene.cubemap_props
+
+        output_dir = bpy.path.abspath(props.output_path)
+        if not output_dir:
+            self.report({'ERROR'}, "Output path is not set")
+            return {'CANCELLED'}
+        if scene.camera is None and props.capture_mode != 'HDRI':
+            self.report({'ERROR'}, "No active camera found")
+            return {'CANCELLED'}
+
+        job = {key: getattr(props, key) for key in SETTING_KEYS}
+        job['output_path'] = output_dir
+        job['frames'] = [scene.frame_start, scene.frame_end, scene.frame_step]
+        try:
+            frames = len(frame_range(job['frames']))
+            job = expand_sequence(job, props, resume=props.sequence_resume)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        if not job['probes']:
+            self.report({'INFO'}, f"✓ All {frames} frames already rendered")
+            return {'FINISHED'}
+
+        workers, threads = auto_budget(len(job['probes']), props.probe_workers)
+
+        # Workers load a copy so unsaved changes are rendered too
+        work_dir = os.path.join(output_dir, ".sequence_jobs")
+        os.makedirs(work_dir, exist_ok=True)
+        blend_path = os.path.join(work_dir, "sequence_scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+        self.report({'INFO'}, f"Rendering {len(job['probes'])} of {frames} frames "
+                              f"with {workers} worker(s) x {threads} thread(s)...")
+        wm = context.window_manager
+        wm.progress_begin(0, workers)
+        try:
+            status = run_workers(blend_path, job, work_dir, workers, threads,
+                                 progress=lambda done, total: wm.progress_update(done))
+        finally:
+            wm.progress_end()
+
+        with open(os.path.join(work_dir, "sequence_status.json"), "w", encoding="utf-8") as f:
+            json.dump(status, f, indent=2)
+
+        if status['status'] != 'ok':
+            self.report({'ERROR'}, f"Sequence {status['status']}: {status['failed']} frame(s) failed, "
+                                   f"{len(status['errors'])} worker error(s). Run again to resume. See {work_dir}")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f"✓ {len(job['probes'])} frames rendered in {status['elapsed']:.1f}s "
+                              f"({job['skipped_frames']} already done) to: {output_dir}")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_render_farm(bpy.types.Operator):
+    bl_idname = "cubemap.render_farm"
+    bl_label = "Render on Farm"
+    bl_description = "Queue the probe (or the probe set) in the farm spool folder and collect what local and farm workers render"
+    bl_options = {'REGISTER'}
+
+    probe_set: bpy.props.BoolProperty(default=False, options={'SKIP_SAVE'})
+
+    def execute(self, context):
+        scene = context.scene
+        props = scene.cubemap_props
+
+        output_dir = bpy.path.abspath(props.output_path)
+        if not output_dir:
+            self.report({'ERROR'}, "Output path is not set")
             return {'CANCELLED'}
-            
+
+        if self.probe_set:
+            try:
+                probes = probe_entries(collect_probes(props), output_dir)
+            except ValueError as e:
+                self.report({'ERROR'}, str(e))
+                return {'CANCELLED'}
+        else:
+            if scene.camera is None and props.capture_mode != 'HDRI':
+                self.report({'ERROR'}, "No active camera found")
+                return {'CANCELLED'}
+            probes = [{'name': props.base_name}]
+
+        # Workers, here and on the farm, open a copy so unsaved changes are
+        # rendered too
+        spool_dir = bpy.path.abspath(props.farm_spool) or os.path.join(output_dir, ".farm")
+        os.makedirs(spool_dir, exist_ok=True)
+        blend_path = os.path.join(spool_dir, "scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+        job = {key: getattr(props, key) for key in SETTING_KEYS}
+        job['output_path'] = output_dir
+        job['probes'] = probes
+
+        commands = []
+        if props.farm_workers:
+            workers, threads = auto_budget(props.farm_workers, props.farm_workers)
+            host = platform.node() or "local"
+            commands = [farm_worker_command(blend_path, spool_dir, f"{host}_local_{index}", threads)
+                        for index in range(workers)]
+
+        self.report({'INFO'}, f"Queued {len(probes)} probe(s) in {spool_dir} with {len(commands)} local worker(s)...")
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        try:
+            status = run_farm(spool_dir, job, props.farm_granularity, props.farm_retries, commands,
+                              progress=lambda done, total: wm.progress_update(100 * done // total))
         finally:
-            # Restore original state
-            cam.rotation_euler = orig_rot
-            cam.rotation_mode = orig_rot_mode
-            scene.render.filepath = orig_filepath
-            scene.render.resolution_x = orig_res_x
-            scene.render.resolution_y = orig_res_y
-            scene.render.image_settings.file_format = orig_format
-            bpy.context.view_layer.update()
-
-        self.report({'INFO'}, f"✓ {preset['name']} cubemap complete! 6 files saved to: {output_dir}")
+            wm.progress_end()
+
+        if status['status'] != 'ok':
+            detail = "; ".join(status['errors'][:3])
+            self.report({'ERROR'}, f"Farm job {status['status']}: {status['failed']} probe(s) failed. {detail}")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f"✓ {len(probes)} probe(s) rendered by {len(status['workers'])} worker(s) "
+                              f"in {status['elapsed']:.1f}s ({status['retried']} retried)")
         return {'FINISHED'}
 
 
 class CUBEMAP_OT_install_pillow(bpy.types.Operator):
     bl_idname = "cubemap.install_pillow"
     bl_label = "Install Pillow"
-    bl_description = "Install or reinstall Pillow library required for cubemap assembly"
+    bl_description = "Install or reinstall the optional Pillow library, which speeds up JPEG and TIFF I/O"
 
     force_reinstall: bpy.props.BoolProperty(default=False)
 
@@ -161,7 +677,7 @@ class CUBEMAP_OT_install_pillow(bpy.types.Operator):
 
             def draw(self_popup, context_popup):
                 self_popup.layout.label(text="Pillow installed successfully!")
-                self_popup.layout.label(text="Please RESTART Blender to use Assemble Cubemap")
+                self_popup.layout.label(text="Please RESTART Blender to use it")
 
             context.window_manager.popup_menu(draw, title="Restart Required", icon='INFO')
             return {'FINISHED'}
@@ -175,6 +691,29 @@ class CUBEMAP_OT_stitch(bpy.types.Operator):
     bl_label = "Assemble Cubemap"
     bl_options = {'REGISTER'}
 
+    def execute(self, context):
+        props = context.scene.cubemap_props
+        output_dir = bpy.path.abspath(props.output_path)
+
+        metrics = RunReport("Assemble", props)
+        try:
+            output_path, width, height = stitch_strip(output_dir, props, metrics)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        metrics.add_files([output_path])
+        save_report(props, metrics, output_dir)
+
+        self.report({'INFO'}, f"✓ Cubemap {CUBEMAP_LAYOUTS[props.layout]['name'].lower()} saved: {output_path} ({width}x{height})")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_convert(bpy.types.Operator):
+    bl_idname = "cubemap.convert"
+    bl_label = "Convert Cubemap"
+    bl_description = "Resample the rendered faces into an equirectangular or octahedral map"
+    bl_options = {'REGISTER'}
+
     def execute(self, context):
         props = context.scene.cubemap_props
         output_dir = bpy.path.abspath(props.output_path)
@@ -183,58 +722,108 @@ class CUBEMAP_OT_stitch(bpy.types.Operator):
             self.report({'ERROR'}, "Output folder doesn't exist. Render cubemap first.")
             return {'CANCELLED'}
 
-        if not is_pillow_installed():
-            self.report({'ERROR'}, "Pillow not installed or Blender not restarted. Click 'Install Pillow' then RESTART Blender.")
+        start = time.perf_counter()
+        try:
+            output_path, width, height = write_converted(output_dir, props, props.convert_target)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, f"✓ Converted in {elapsed:.1f}s: {output_path} ({width}x{height})")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_prefilter(bpy.types.Operator):
+    bl_idname = "cubemap.prefilter"
+    bl_label = "Prefilter Specular"
+    bl_description = "Build the GGX roughness mip chain of the rendered faces for reflection captures"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        props = context.scene.cubemap_props
+        output_dir = bpy.path.abspath(props.output_path)
+
+        if not os.path.exists(output_dir):
+            self.report({'ERROR'}, "Output folder doesn't exist. Render cubemap first.")
             return {'CANCELLED'}
-        
+
+        start = time.perf_counter()
         try:
-            from PIL import Image
-        except ImportError:
-             self.report({'ERROR'}, "Pillow import failed despite check.")
-             return {'CANCELLED'}
+            paths = write_prefiltered(output_dir, props)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to prefilter: {str(e)}")
+            return {'CANCELLED'}
 
-        preset = CUBEMAP_PRESETS.get(props.engine_preset)
-        if not preset:
-            self.report({'ERROR'}, "Invalid engine preset")
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, f"✓ {len(paths)} prefiltered mips in {elapsed:.1f}s to: {output_dir}")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_extract_sh(bpy.types.Operator):
+    bl_idname = "cubemap.extract_sh"
+    bl_label = "Extract Spherical Harmonics"
+    bl_description = "Project the rendered faces onto SH9 and write the coefficients next to them"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        props = context.scene.cubemap_props
+        output_dir = bpy.path.abspath(props.output_path)
+
+        try:
+            paths = write_sh(output_dir, props)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
-        ext = ".exr" if props.file_format == 'OPEN_EXR' else (".png" if props.file_format == 'PNG' else ".jpg")
-        if ext == ".exr":
-            self.report({'ERROR'}, "EXR stitching not supported. Change format to PNG or JPEG.")
+        self.report({'INFO'}, f"✓ SH9 saved: {', '.join(paths)}")
+        return {'FINISHED'}
+
+
+class CUBEMAP_OT_export_container(bpy.types.Operator):
+    bl_idname = "cubemap.export_container"
+    bl_label = "Export Cube Texture"
+    bl_description = "Write the rendered faces as a DDS/KTX2 cube texture with optional mips and block compression"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        props = context.scene.cubemap_props
+        output_dir = bpy.path.abspath(props.output_path)
+
+        start = time.perf_counter()
+        try:
+            paths = write_containers(output_dir, props)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to export cube texture: {str(e)}")
             return {'CANCELLED'}
 
-        images = []
-        for idx, (suffix, _) in enumerate(preset['faces']):
-            filepath = os.path.join(output_dir, f"{props.base_name}_{idx+1}_{suffix}{ext}")
-            if not os.path.exists(filepath):
-                self.report({'ERROR'}, f"File not found: {filepath}. Render cubemap first.")
-                return {'CANCELLED'}
-            try:
-                img = Image.open(filepath)
-                images.append(img)
-            except Exception as e:
-                self.report({'ERROR'}, f"Failed to open {filepath}: {str(e)}")
-                return {'CANCELLED'}
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, f"✓ Cube texture saved in {elapsed:.1f}s: {', '.join(paths)}")
+        return {'FINISHED'}
 
-        widths, heights = zip(*(i.size for i in images))
-        total_width = sum(widths)
-        max_height = max(heights)
 
-        stitched = Image.new('RGB', (total_width, max_height))
+class CUBEMAP_OT_write_tiers(bpy.types.Operator):
+    bl_idname = "cubemap.write_tiers"
+    bl_label = "Build Tiers"
+    bl_description = "Write half, quarter, ... resolution copies of the rendered faces in the chosen layout"
+    bl_options = {'REGISTER'}
 
-        x_offset = 0
-        for img in images:
-            stitched.paste(img, (x_offset, 0))
-            x_offset += img.size[0]
+    def execute(self, context):
+        props = context.scene.cubemap_props
+        output_dir = bpy.path.abspath(props.output_path)
 
-        output_path = os.path.join(output_dir, f"{props.base_name}_cubemap_strip{ext}")
+        start = time.perf_counter()
         try:
-            stitched.save(output_path)
+            paths = write_tiers(output_dir, props)
         except Exception as e:
-             self.report({'ERROR'}, f"Failed to save stitched image: {e}")
-             return {'CANCELLED'}
+            self.report({'ERROR'}, f"Failed to build tiers: {str(e)}")
+            return {'CANCELLED'}
 
-        self.report({'INFO'}, f"✓ Cubemap strip saved: {output_path} ({total_width}x{max_height})")
+        if not paths:
+            self.report({'WARNING'}, "Face size can't be halved, no tiers written")
+            return {'CANCELLED'}
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, f"✓ {len(paths)} tiers in {elapsed:.1f}s to: {output_dir}")
         return {'FINISHED'}
 
 
@@ -270,6 +859,8 @@ class CUBEMAP_OT_check_pillow(bpy.types.Operator):
     bl_label = "Check Pillow Version"
 
     def execute(self, context):
+        # Re-probe, so the panels pick up a Pillow installed some other way
+        invalidate_pillow_status()
         try:
             import PIL
             version = getattr(PIL, "__version__", "Unknown")
@@ -1,5 +1,6 @@
 import bpy
 from .const import CUBEMAP_PRESETS
+from .icons import get_icon
 from .utils import is_pillow_installed
 
 class CUBEMAP_PT_main_panel(bpy.types.Panel):
@@ -16,16 +17,6 @@ class CUBEMAP_PT_main_panel(bpy.types.Panel):
             return
         props = context.scene.cubemap_props
         
-        # Get icons
-        from . import preview_collections
-        pcoll = preview_collections.get("main")
-        
-        # Helper to safely get icon_id
-        def get_icon(name):
-            if pcoll and name in pcoll:
-                return pcoll[name].icon_id
-            return 0  # Fallback to no icon if missing
-        
         layout.use_property_split = True
         layout.use_property_decorate = False
 
@@ -124,6 +115,68 @@ class CUBEMAP_PT_main_panel(bpy.types.Panel):
         sub = col.row(align=True)
         sub.prop(props, "resolution", text="Res")
         sub.prop(props, "file_format", text="")
+        if props.file_format == 'OPEN_EXR':
+            col.prop(props, "exr_depth", text="Depth")
+        elif props.file_format == 'PNG':
+            col.prop(props, "png_compression")
+        elif props.file_format == 'JPEG':
+            sub = col.row(align=True)
+            sub.prop(props, "jpeg_quality")
+            sub.prop(props, "jpeg_subsampling", text="")
+        col.prop(props, "background_write")
+        col.prop(props, "capture_mode", text="Capture")
+        if props.capture_mode == 'TILED':
+            col.prop(props, "tile_size")
+        if props.capture_mode != 'HDRI':
+            col.prop(props, "use_render_cache")
+        if props.capture_mode == 'HDRI':
+            col.prop(props, "hdri_source")
+            if props.hdri_source == 'FILE':
+                col.prop(props, "hdri_path")
+        if props.capture_mode in {'PANORAMA', 'HDRI'}:
+            col.prop(props, "sample_filter")
+        col.prop(props, "layout")
+        col.prop(props, "strip_container", text="Strip")
+        col.prop(props, "stream_assembly")
+
+        # --- PROBE SET ---
+        box = layout.box()
+        box.label(text="Probe Set", icon='LIGHTPROBE_SPHERE')
+
+        col = box.column(align=True)
+        col.prop(props, "probe_source")
+        if props.probe_source == 'EMPTIES':
+            col.prop(props, "probe_collection")
+        else:
+            col.prop(props, "probe_volume")
+            col.prop(props, "probe_grid")
+        col.prop(props, "probe_workers")
+
+        row = box.row()
+        row.scale_y = 1.2
+        row.operator("cubemap.render_probes", text="Render Probe Set", icon='RENDER_ANIMATION')
+
+        # --- SEQUENCE ---
+        box = layout.box()
+        row = box.row()
+        row.label(text=f"Sequence: frames {context.scene.frame_start}-{context.scene.frame_end}", icon='SEQUENCE')
+        row.prop(props, "sequence_resume")
+        box.operator("cubemap.render_sequence", text="Render Sequence", icon='RENDER_ANIMATION')
+
+        # --- FARM ---
+        box = layout.box()
+        box.label(text="Farm", icon='NETWORK_DRIVE')
+
+        col = box.column(align=True)
+        col.prop(props, "farm_spool")
+        col.prop(props, "farm_granularity")
+        row = col.row(align=True)
+        row.prop(props, "farm_workers")
+        row.prop(props, "farm_retries")
+
+        row = box.row(align=True)
+        row.operator("cubemap.render_farm", text="Render on Farm", icon='RENDER_STILL').probe_set = False
+        row.operator("cubemap.render_farm", text="Probe Set", icon='RENDER_ANIMATION').probe_set = True
 
         # --- ACTIONS ---
         layout.separator()
@@ -138,25 +191,69 @@ class CUBEMAP_PT_main_panel(bpy.types.Panel):
             col.operator("cubemap.render", text="Render Faces", icon_value=icon_render)
         else:
             col.operator("cubemap.render", text="Render Faces", icon='RENDER_STILL')
+        if props.render_status:
+            col.progress(factor=props.render_progress, type='BAR', text=props.render_status)
         
+        col.operator("cubemap.faces_from_hdri", text="Faces from HDRI", icon='WORLD_DATA')
+        col.operator("cubemap.render_assemble", text="Render and Assemble", icon='IMAGE_PLANE')
+        col.prop(props, "write_faces")
+
         col.separator()
         
-        # Assemble Button - Check Pillow
-        pillow_status = is_pillow_installed()
-        if pillow_status:
-            icon_assemble = get_icon("ICON_ASSEMBLE")
-            if icon_assemble:
-                col.operator("cubemap.stitch", text="Assemble Strip", icon_value=icon_assemble)
-            else:
-                col.operator("cubemap.stitch", text="Assemble Strip", icon='IMAGE_PLANE')
+        # Assemble Button
+        icon_assemble = get_icon("ICON_ASSEMBLE")
+        if icon_assemble:
+            col.operator("cubemap.stitch", text="Assemble Strip", icon_value=icon_assemble)
         else:
-            box_err = col.box()
-            box_err.alert = True
-            box_err.label(text="Pillow not installed", icon='ERROR')
-            box_err.label(text="Install in Preferences or here", icon='INFO')
-            box_err.operator("cubemap.install_pillow", text="Install Pillow", icon='IMPORT')
-            op = box_err.operator("cubemap.install_pillow", text="Force Reinstall", icon='RECOVER_LAST')
-            op.force_reinstall = True
+            col.operator("cubemap.stitch", text="Assemble Strip", icon='IMAGE_PLANE')
+
+        # Last run summary; the full report is written next to the outputs
+        if props.last_report:
+            box = layout.box()
+            col = box.column(align=True)
+            for index, line in enumerate(props.last_report.splitlines()):
+                col.label(text=line, icon='TIME' if index == 0 else 'BLANK1')
+
+        # Convert to a single-image projection
+        box = layout.box()
+        row = box.row(align=True)
+        row.prop(props, "convert_target", text="")
+        row.prop(props, "convert_size")
+        box.operator("cubemap.convert", text="Convert", icon='WORLD')
+
+        # Roughness mip chain for reflection captures
+        box = layout.box()
+        row = box.row(align=True)
+        row.prop(props, "prefilter_samples")
+        row.prop(props, "prefilter_levels")
+        box.prop(props, "prefilter_fixup")
+        box.operator("cubemap.prefilter", text="Prefilter Specular", icon='SHADING_RENDERED')
+
+        # Diffuse irradiance
+        box = layout.box()
+        row = box.row(align=True)
+        row.prop(props, "write_sh")
+        row.prop(props, "sh_format", text="")
+        box.operator("cubemap.extract_sh", text="Extract SH9", icon='LIGHT_SUN')
+
+        # Engine-ready cube texture
+        box = layout.box()
+        row = box.row(align=True)
+        row.prop(props, "write_container")
+        row.prop(props, "container_format", text="")
+        row = box.row(align=True)
+        row.prop(props, "texture_format", text="")
+        row.prop(props, "container_mips", text="")
+        box.operator("cubemap.export_container", text="Export Cube Texture", icon='TEXTURE')
+
+        # Lower-resolution copies of the same capture
+        box = layout.box()
+        row = box.row(align=True)
+        row.prop(props, "write_tiers")
+        row.prop(props, "tier_filter", text="")
+        row = box.row(align=True)
+        row.prop(props, "tier_levels")
+        row.operator("cubemap.write_tiers", text="Build Tiers", icon='RENDERLAYERS')
 
         # Open Folder
         row = layout.row()
@@ -186,8 +283,8 @@ class CUBEMAP_PT_prefs(bpy.types.AddonPreferences):
             row.label(text="Pillow Library", icon='CHECKMARK')
             row.label(text="Installed", icon='CHECKMARK')
         else:
-            row.label(text="Pillow Library", icon='ERROR')
-            row.label(text="Not installed")
+            row.label(text="Pillow Library", icon='INFO')
+            row.label(text="Not installed (optional)")
 
         row = box.row()
         row.scale_y = 1.3
@@ -201,4 +298,5 @@ class CUBEMAP_PT_prefs(bpy.types.AddonPreferences):
             op = row.operator("cubemap.install_pillow", text="Force Reinstall", icon='RECOVER_LAST')
             op.force_reinstall = True
 
-        box.label(text="Pillow is required for assembling cubemap strips.", icon='INFO')
+        box.label(text="Pillow is optional: assembly uses Blender's image I/O without it.", icon='INFO')
+        box.label(text="With Pillow, JPEG and TIFF faces are read and written faster.", icon='BLANK1')
@@ -0,0 +1,212 @@
+import os
+import math
+from functools import lru_cache
+import numpy as np
+from .const import CUBEMAP_PRESETS, FORMAT_EXTENSIONS, STRIP_CONTAINERS
+from .assembly import assemble_faces, face_sources, stack_faces, strip_options
+from .image_io import write_image
+from .projection import direction_to_face, face_directions
+from .reproject import pad_faces, pad_map, sample_padded
+from .utils import make_pool
+
+# GGX prefiltered specular chain for reflection probes (split-sum
+# approximation with N = V = R). Mip 0 is the faces themselves; each lower
+# mip is convolved with the GGX lobe of roughness level / (levels - 1).
+# Samples come from a fixed Hammersley set per roughness and read a
+# box-filtered source chain at a per-sample LOD picked from the sample's PDF
+# (filtered importance sampling), so a few dozen samples are noise free.
+# Convolution works on the stored values: feed scene-linear EXR/HDR faces,
+# display-referred 8/16-bit faces only give an approximation.
+
+# Smallest prefiltered mip
+PREFILTER_MIN_SIZE = 4
+
+# Output texels per pool task, so big mips are spread over all workers
+TASK_TEXELS = 65536
+
+# Source chain for pool workers, set before the pool starts so forked
+# workers inherit it instead of receiving a pickled copy per task
+_source = None
+
+
+def prefilter_sizes(size, levels=0):
+    sizes = [size]
+    while sizes[-1] // 2 >= PREFILTER_MIN_SIZE and (not levels or len(sizes) < levels):
+        sizes.append(sizes[-1] // 2)
+    return sizes
+
+
+def downsample(faces):
+    # 2x2 box filter of a (6, size, size, channels) stack
+    count, size, _, channels = faces.shape
+    half = size // 2
+    faces = faces[:, :half * 2, :half * 2]
+    return faces.reshape(count, half, 2, half, 2, channels).mean(axis=(2, 4))
+
+
+def source_chain(faces, preset_key):
+    # [(size, padded stack)] from the full faces down to 1x1
+    chain = []
+    while True:
+        count, size, _, channels = faces.shape
+        stacked = np.concatenate((faces.reshape(-1, channels), np.zeros((1, channels), dtype=faces.dtype)))
+        chain.append((size, pad_faces(stacked, preset_key, size)))
+        if size == 1:
+            return chain
+        faces = downsample(faces)
+
+
+def hammersley(count):
+    i = np.arange(count, dtype=np.uint32)
+    bits = (i << 16) | (i >> 16)
+    bits = ((bits & 0x55555555) << 1) | ((bits & 0xAAAAAAAA) >> 1)
+    bits = ((bits & 0x33333333) << 2) | ((bits & 0xCCCCCCCC) >> 2)
+    bits = ((bits & 0x0F0F0F0F) << 4) | ((bits & 0xF0F0F0F0) >> 4)
+    bits = ((bits & 0x00FF00FF) << 8) | ((bits & 0xFF00FF00) >> 8)
+    return (i + 0.5) / count, bits.astype(np.float64) / 2.0 ** 32
+
+
+@lru_cache(maxsize=64)
+def sample_set(roughness, count, base_size, max_lod):
+    # Tangent-space light directions (z = normal), NdotL weights and source
+    # LODs of the GGX importance samples for one roughness
+    a2 = roughness ** 4
+    u1, u2 = hammersley(count)
+    phi = 2.0 * math.pi * u1
+    cos_h = np.sqrt((1.0 - u2) / (1.0 + (a2 - 1.0) * u2))
+    sin_h = np.sqrt(1.0 - cos_h * cos_h)
+    # L = reflect(-V, H) with V = N
+    lights = np.stack((
+        2.0 * cos_h * sin_h * np.cos(phi),
+        2.0 * cos_h * sin_h * np.sin(phi),
+        2.0 * cos_h * cos_h - 1.0,
+    ), axis=-1)
+    keep = lights[:, 2] > 0.0
+    lights, cos_h = lights[keep], cos_h[keep]
+
+    # pdf(L) = D(H) * NdotH / (4 * VdotH) = D / 4 when N = V
+    d = a2 / (math.pi * ((a2 - 1.0) * cos_h * cos_h + 1.0) ** 2)
+    sample_angle = 4.0 / (count * d)
+    texel_angle = 4.0 * math.pi / (6.0 * base_size * base_size)
+    lods = np.clip(0.5 * np.log2(sample_angle / texel_angle) + 1.0, 0.0, max_lod)
+    return lights.astype(np.float32), lights[:, 2].astype(np.float32), lods
+
+
+def prefilter_rows(task):
+    # Rows y0..y1 of one face of one mip
+    index, size, rows, roughness, samples, preset_key = task
+    chain = _source
+    faces = CUBEMAP_PRESETS[preset_key]['faces']
+    channels = chain[0][1].shape[1]
+
+    normals = face_directions(faces[index][1], size, rows).reshape(-1, 3)
+    normals /= np.linalg.norm(normals, axis=-1, keepdims=True)
+    up = np.where(np.abs(normals[:, 2:3]) < 0.999, [[0.0, 0.0, 1.0]], [[1.0, 0.0, 0.0]])
+    tangents = np.cross(up, normals)
+    tangents /= np.linalg.norm(tangents, axis=-1, keepdims=True)
+    bitangents = np.cross(normals, tangents)
+    normals, tangents, bitangents = (v.astype(np.float32) for v in (normals, tangents, bitangents))
+
+    lights, weights, lods = sample_set(roughness, samples, chain[0][0], len(chain) - 1)
+    acc = np.zeros((len(normals), channels), dtype=np.float32)
+    for (lx, ly, lz), weight, lod in zip(lights, weights, lods):
+        dirs = lx * tangents + ly * bitangents + lz * normals
+        # Coordinates for a 1x1 face, rescaled for every source mip
+        face, px, py = direction_to_face(dirs, faces, 1)
+        low = int(lod)
+        high = min(low + 1, len(chain) - 1)
+        blend = lod - low
+        for level, amount in ((low, 1.0 - blend), (high, blend)):
+            if amount <= 0.0:
+                continue
+            level_size, padded = chain[level]
+            sx = (px + 0.5) * level_size + 0.5
+            sy = (py + 0.5) * level_size + 0.5
+            acc += sample_padded(padded, level_size, face, sx, sy) * (weight * amount)
+    acc /= weights.sum()
+    return acc.reshape(rows[1] - rows[0], size, channels)
+
+
+def edge_fixup(level, preset_key):
+    # Average every edge texel with the texel across the seam, for samplers
+    # without seamless cube filtering
+    count, size, _, channels = level.shape
+    nbrs = pad_map(preset_key, size)
+    grid = np.arange(count * size * size).reshape(count, size, size)
+    edges = np.concatenate([
+        grid[:, 0, :].ravel(), grid[:, -1, :].ravel(), grid[:, :, 0].ravel(), grid[:, :, -1].ravel(),
+    ])
+    across = np.concatenate([
+        nbrs[:, 0, 1:-1].ravel(), nbrs[:, -1, 1:-1].ravel(), nbrs[:, 1:-1, 0].ravel(), nbrs[:, 1:-1, -1].ravel(),
+    ]).astype(np.int64)
+    flat = level.reshape(-1, channels)
+    fixed = flat.copy()
+    fixed[edges] = 0.5 * (flat[edges] + flat[across])
+    return fixed.reshape(level.shape)
+
+
+def prefilter_faces(faces, infos, preset_key, levels=0, samples=32, fixup=True, workers=0):
+    # faces: six arrays or face file paths in preset order. Returns a list of
+    # mips, each a (6, size, size, channels) array in the faces' dtype.
+    global _source
+    stacked, size = stack_faces(faces, infos)
+    dtype = stacked.dtype
+    base = stacked[:-1].reshape(6, size, size, -1).astype(np.float32)
+    del stacked
+
+    sizes = prefilter_sizes(size, levels)
+    mips = [base] + [np.empty((6, s, s, base.shape[3]), dtype=np.float32) for s in sizes[1:]]
+    places = []
+    tasks = []
+    for level, level_size in enumerate(sizes[1:], 1):
+        roughness = level / (len(sizes) - 1)
+        step = max(1, TASK_TEXELS // level_size)
+        for index in range(6):
+            for y in range(0, level_size, step):
+                rows = (y, min(y + step, level_size))
+                places.append((level, index, rows))
+                tasks.append((index, level_size, rows, roughness, samples, preset_key))
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks) or 1)
+    _source = source_chain(base, preset_key)
+    pool = make_pool(workers) if workers > 1 else None
+    try:
+        results = pool.map(prefilter_rows, tasks) if pool else map(prefilter_rows, tasks)
+        for (level, index, rows), result in zip(places, results):
+            mips[level][index, rows[0]:rows[1]] = result
+    finally:
+        if pool:
+            pool.shutdown()
+        _source = None
+
+    if fixup:
+        mips[1:] = [edge_fixup(mip, preset_key) for mip in mips[1:]]
+    if dtype.kind != 'f':
+        limit = np.iinfo(dtype).max
+        mips = [np.clip(np.rint(mip), 0, limit).astype(dtype) for mip in mips]
+    else:
+        mips = [mip.astype(dtype, copy=False) for mip in mips]
+    return mips
+
+
+def prefiltered_path(output_dir, settings, level):
+    ext = STRIP_CONTAINERS.get(settings.strip_container) or FORMAT_EXTENSIONS[settings.file_format]
+    return os.path.join(output_dir, f"{settings.base_name}_prefiltered_mip{level}{ext}")
+
+
+def write_prefiltered(output_dir, settings, faces=None):
+    # Prefilter in-memory faces, or the face files written by capture_cubemap,
+    # and write one image per mip in the chosen layout. Returns the paths.
+    faces, infos = face_sources(output_dir, settings, faces)
+    mips = prefilter_faces(faces, infos, settings.engine_preset, settings.prefilter_levels,
+                           settings.prefilter_samples, settings.prefilter_fixup)
+    paths = []
+    for level, mip in enumerate(mips):
+        output_path = prefiltered_path(output_dir, settings, level)
+        image = assemble_faces(list(mip), settings.layout, settings.engine_preset)
+        try:
+            write_image(output_path, image, **strip_options(output_path, settings))
+        except Exception as e:
+            raise RuntimeError(f"Failed to save prefiltered mip {level}: {e}")
+        paths.append(output_path)
+    return paths
@@ -0,0 +1,186 @@
+import bpy
+import os
+import json
+import time
+import subprocess
+from mathutils import Vector
+
+# Probe sets: many capture positions rendered by a pool of background Blender
+# workers. Each worker runs the batch entry point on its shard of one shared
+# job file, so placement and naming are identical to a single batch run.
+
+
+def probes_from_empties(collection):
+    empties = sorted((o for o in collection.all_objects if o.type == 'EMPTY'), key=lambda o: o.name)
+    return [(o.name, tuple(o.matrix_world.translation)) for o in empties]
+
+
+def grid_positions(bounds_min, bounds_max, counts):
+    # Cell centres of a counts[0] x counts[1] x counts[2] grid inside the box
+    axes = []
+    for lo, hi, n in zip(bounds_min, bounds_max, counts):
+        n = max(1, int(n))
+        step = (hi - lo) / n
+        axes.append([lo + (i + 0.5) * step for i in range(n)])
+    return [
+        ((ix, iy, iz), (x, y, z))
+        for iz, z in enumerate(axes[2])
+        for iy, y in enumerate(axes[1])
+        for ix, x in enumerate(axes[0])
+    ]
+
+
+def probes_from_grid(volume, counts):
+    corners = [volume.matrix_world @ Vector(c) for c in volume.bound_box]
+    bounds_min = [min(c[i] for c in corners) for i in range(3)]
+    bounds_max = [max(c[i] for c in corners) for i in range(3)]
+    return [
+        (f"{volume.name}_{ix}_{iy}_{iz}", location)
+        for (ix, iy, iz), location in grid_positions(bounds_min, bounds_max, counts)
+    ]
+
+
+def probes_from_coordinates(coordinates, prefix="probe"):
+    return [(f"{prefix}_{i:03d}", tuple(loc)) for i, loc in enumerate(coordinates)]
+
+
+def probe_entries(probes, output_dir):
+    # One job entry per probe, each written to its own subfolder
+    return [
+        {'name': name, 'output_path': os.path.join(output_dir, name), 'location': list(location)}
+        for name, location in probes
+    ]
+
+
+def collect_probes(props):
+    if props.probe_source == 'EMPTIES':
+        if props.probe_collection is None:
+            raise ValueError("No probe collection set")
+        probes = probes_from_empties(props.probe_collection)
+    elif props.probe_source == 'GRID':
+        if props.probe_volume is None:
+            raise ValueError("No bounding volume set")
+        probes = probes_from_grid(props.probe_volume, props.probe_grid)
+    else:
+        raise ValueError(f"Unknown probe source '{props.probe_source}'")
+    if not probes:
+        raise ValueError("Probe set is empty")
+    return probes
+
+
+def expand_probe_set(scene, job):
+    # Batch jobs may list a "probe_set" instead of (or besides) explicit probes:
+    #   {"collection": "Probes"}, {"volume": "RoomBounds", "counts": [4, 2, 1]}
+    #   or {"coordinates": [[0, 0, 1.5], [3, 0, 1.5]]}
+    probe_set = job.get('probe_set')
+    if not probe_set:
+        return job
+    if 'collection' in probe_set:
+        collection = bpy.data.collections.get(probe_set['collection'])
+        if collection is None:
+            raise ValueError(f"Collection '{probe_set['collection']}' not found")
+        probes = probes_from_empties(collection)
+    elif 'volume' in probe_set:
+        volume = scene.objects.get(probe_set['volume'])
+        if volume is None:
+            raise ValueError(f"Object '{probe_set['volume']}' not found")
+        probes = probes_from_grid(volume, probe_set.get('counts', (1, 1, 1)))
+    elif 'coordinates' in probe_set:
+        probes = probes_from_coordinates(probe_set['coordinates'])
+    else:
+        raise ValueError("'probe_set' needs 'collection', 'volume' or 'coordinates'")
+
+    output_dir = bpy.path.abspath(job.get('output_path', scene.cubemap_props.output_path))
+    job = dict(job)
+    job['probes'] = job.get('probes', []) + probe_entries(probes, output_dir)
+    return job
+
+
+def auto_budget(probe_count, workers=0, cores=None):
+    # Cycles scales well with threads inside one process, so only split the
+    # machine into a few workers and give each an equal share of the cores.
+    cores = cores or os.cpu_count() or 1
+    if workers <= 0:
+        workers = max(1, cores // 8)
+    workers = max(1, min(workers, probe_count, cores))
+    threads = max(1, cores // workers)
+    return workers, threads
+
+
+def worker_command(blend_path, job_path, status_path, shard, threads):
+    return [
+        bpy.app.binary_path, "-b", blend_path,
+        "--addons", __package__,
+        "-t", str(threads),
+        "--python-exit-code", "1",
+        "--python-expr", "import bpy; assert bpy.ops.cubemap.batch() == {'FINISHED'}",
+        "--", "--cubemap", job_path, "--status", status_path, "--shard", f"{shard[0]}/{shard[1]}",
+    ]
+
+
+def farm_worker_command(blend_path, spool_dir, worker_id, threads):
+    return [
+        bpy.app.binary_path, "-b", blend_path,
+        "--addons", __package__,
+        "-t", str(threads),
+        "--python-exit-code", "1",
+        "--python-expr", "import bpy; assert bpy.ops.cubemap.batch() == {'FINISHED'}",
+        "--", "--spool", spool_dir, "--worker-id", worker_id,
+    ]
+
+
+def run_workers(blend_path, job, work_dir, workers, threads, progress=None):
+    # Launch `workers` background Blender processes on shards of `job` and
+    # wait for all of them. Returns the merged status dict.
+    os.makedirs(work_dir, exist_ok=True)
+    job_path = os.path.join(work_dir, "probe_job.json")
+    with open(job_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, indent=2)
+
+    start = time.perf_counter()
+    running = []
+    for index in range(workers):
+        status_path = os.path.join(work_dir, f"worker_{index}_status.json")
+        if os.path.exists(status_path):
+            os.remove(status_path)
+        log = open(os.path.join(work_dir, f"worker_{index}.log"), "w", encoding="utf-8")
+        cmd = worker_command(blend_path, job_path, status_path, (index, workers), threads)
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        running.append((index, proc, status_path, log))
+        print(f"Worker {index}: {' '.join(cmd)}")
+
+    done = 0
+    while done < len(running):
+        done = sum(1 for _, proc, _, _ in running if proc.poll() is not None)
+        if progress:
+            progress(done, len(running))
+        if done < len(running):
+            time.sleep(0.5)
+
+    results = []
+    errors = []
+    for index, proc, status_path, log in running:
+        log.close()
+        try:
+            with open(status_path, "r", encoding="utf-8") as f:
+                status = json.load(f)
+            results.extend(status.get('probes', []))
+            if status.get('error'):
+                errors.append(f"worker {index}: {status['error']}")
+        except (OSError, ValueError):
+            errors.append(f"worker {index} exited with code {proc.returncode} and no status (see worker_{index}.log)")
+
+    failed = sum(1 for r in results if r.get('status') != 'ok')
+    if errors or failed:
+        state = 'failed' if failed == len(results) else 'partial'
+    else:
+        state = 'ok'
+    return {
+        'status': state,
+        'workers': workers,
+        'threads': threads,
+        'probes': results,
+        'failed': failed,
+        'errors': errors,
+        'elapsed': time.perf_counter() - start,
+    }
@@ -0,0 +1,192 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Pure NumPy cubemap projection helpers. Images are (height, width, channels)
+# arrays with row 0 at the top, like image files (Blender pixel buffers are
+# bottom-up and get flipped at the bpy boundary).
+
+# Output rows per thread pool task
+TILE_ROWS = 128
+
+
+def run_tiles(height, work, threads=0):
+    # Call work(y0, y1) for row tiles across a thread pool; NumPy drops the
+    # GIL inside the heavy loops, so tiles overlap
+    tiles = [(y, min(y + TILE_ROWS, height)) for y in range(0, height, TILE_ROWS)]
+    threads = threads or os.cpu_count() or 1
+    if threads == 1 or len(tiles) == 1:
+        for y0, y1 in tiles:
+            work(y0, y1)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _ in pool.map(lambda tile: work(*tile), tiles):
+            pass
+
+
+def euler_matrix(rot):
+    # Blender 'XYZ' euler: R = Rz @ Ry @ Rx
+    x, y, z = rot
+    cx, sx = math.cos(x), math.sin(x)
+    cy, sy = math.cos(y), math.sin(y)
+    cz, sz = math.cos(z), math.sin(z)
+    rx = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    ry = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rz = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+def face_basis(rot):
+    # Camera looks down local -Z with +Y up; returns world right, up, forward
+    m = euler_matrix(rot)
+    return m[:, 0], m[:, 1], -m[:, 2]
+
+
+def face_directions(rot, size, rows=None):
+    # Unnormalized view directions through the pixel centres of a 90° face
+    right, up, forward = face_basis(rot)
+    if rows is None:
+        rows = (0, size)
+    t = (np.arange(size, dtype=np.float64) + 0.5) * (2.0 / size) - 1.0
+    xs = t
+    ys = -t[rows[0]:rows[1]]
+    dirs = (forward[None, None, :]
+            + xs[None, :, None] * right[None, None, :]
+            + ys[:, None, None] * up[None, None, :])
+    return dirs
+
+
+def direction_to_equirect(dirs, width, height):
+    # Same mapping as Cycles' equirectangular camera and Blender's Environment
+    # Texture: +X at the centre, longitude decreasing to the right, +Z at the top.
+    x, y, z = dirs[..., 0], dirs[..., 1], dirs[..., 2]
+    u = 0.5 - np.arctan2(y, x) / (2.0 * math.pi)
+    v = 0.5 + np.arctan2(z, np.hypot(x, y)) / math.pi
+    px = u * width - 0.5
+    py = (1.0 - v) * height - 0.5
+    return px, py
+
+
+def sample_bilinear(image, px, py, wrap_x=False):
+    h, w = image.shape[:2]
+    x0 = np.floor(px)
+    y0 = np.floor(py)
+    fx = (px - x0).astype(np.float32)[..., None]
+    fy = (py - y0).astype(np.float32)[..., None]
+    x0 = x0.astype(np.int64)
+    y0 = y0.astype(np.int64)
+    x1 = x0 + 1
+    y1 = y0 + 1
+    if wrap_x:
+        x0 %= w
+        x1 %= w
+    else:
+        np.clip(x0, 0, w - 1, out=x0)
+        np.clip(x1, 0, w - 1, out=x1)
+    np.clip(y0, 0, h - 1, out=y0)
+    np.clip(y1, 0, h - 1, out=y1)
+
+    top = image[y0, x0] * (1.0 - fx) + image[y0, x1] * fx
+    bottom = image[y1, x0] * (1.0 - fx) + image[y1, x1] * fx
+    return top * (1.0 - fy) + bottom * fy
+
+
+def cubic_weights(t):
+    # Catmull-Rom weights of the taps at -1, 0, +1, +2
+    t2 = t * t
+    t3 = t2 * t
+    return (
+        -0.5 * t3 + t2 - 0.5 * t,
+        1.5 * t3 - 2.5 * t2 + 1.0,
+        -1.5 * t3 + 2.0 * t2 + 0.5 * t,
+        0.5 * t3 - 0.5 * t2,
+    )
+
+
+def sample_bicubic(image, px, py, wrap_x=False):
+    h, w = image.shape[:2]
+    x0 = np.floor(px)
+    y0 = np.floor(py)
+    wx = cubic_weights((px - x0).astype(np.float32)[..., None])
+    wy = cubic_weights((py - y0).astype(np.float32)[..., None])
+    x0 = x0.astype(np.int64)
+    y0 = y0.astype(np.int64)
+    out = 0.0
+    for j in range(4):
+        y = np.clip(y0 + (j - 1), 0, h - 1)
+        row = 0.0
+        for i in range(4):
+            x = x0 + (i - 1)
+            x = x % w if wrap_x else np.clip(x, 0, w - 1)
+            row = row + image[y, x] * wx[i]
+        out = out + row * wy[j]
+    return out
+
+
+def equirect_to_face(equirect, rot, size, sample_filter='BILINEAR', threads=0):
+    h, w = equirect.shape[:2]
+    source = equirect.astype(np.float32, copy=False)
+    face = np.empty((size, size, equirect.shape[2]), dtype=equirect.dtype)
+
+    def work(y0, y1):
+        px, py = direction_to_equirect(face_directions(rot, size, (y0, y1)), w, h)
+        if sample_filter == 'BICUBIC':
+            # Catmull-Rom overshoots next to bright spots; radiance can't be negative
+            face[y0:y1] = np.maximum(sample_bicubic(source, px, py, wrap_x=True), 0.0)
+        else:
+            face[y0:y1] = sample_bilinear(source, px, py, wrap_x=True)
+
+    run_tiles(size, work, threads)
+    return face
+
+
+def equirect_to_faces(equirect, faces, size, sample_filter='BILINEAR', threads=0):
+    # faces: preset face list of (suffix, rotation)
+    return [equirect_to_face(equirect, rot, size, sample_filter, threads) for _, rot in faces]
+
+
+def equirect_directions(width, height, rows=None):
+    # Unit directions through the pixel centres of a lat-long image, the
+    # inverse of direction_to_equirect
+    if rows is None:
+        rows = (0, height)
+    phi = (0.5 - (np.arange(width, dtype=np.float64) + 0.5) / width) * (2.0 * math.pi)
+    lat = (0.5 - (np.arange(rows[0], rows[1], dtype=np.float64) + 0.5) / height) * math.pi
+    cos_lat = np.cos(lat)[:, None]
+    return np.stack(np.broadcast_arrays(
+        cos_lat * np.cos(phi)[None, :],
+        cos_lat * np.sin(phi)[None, :],
+        np.sin(lat)[:, None],
+    ), axis=-1)
+
+
+def octahedral_directions(size, rows=None):
+    # Octahedral map with +Z at the centre and -Z folded into the corners;
+    # +X points right and +Y up. Directions are unnormalized.
+    if rows is None:
+        rows = (0, size)
+    t = (np.arange(size, dtype=np.float64) + 0.5) * (2.0 / size) - 1.0
+    u, v = np.broadcast_arrays(t[None, :], -t[rows[0]:rows[1], None])
+    z = 1.0 - np.abs(u) - np.abs(v)
+    lower = z < 0
+    x = np.where(lower, (1.0 - np.abs(v)) * np.sign(u), u)
+    y = np.where(lower, (1.0 - np.abs(u)) * np.sign(v), v)
+    return np.stack((x, y, z), axis=-1)
+
+
+def direction_to_face(dirs, faces, size):
+    # Face index and pixel coordinates (same convention as face_directions)
+    # of the face each direction hits. faces: preset face list.
+    bases = [face_basis(rot) for _, rot in faces]
+    rights = np.array([b[0] for b in bases], dtype=dirs.dtype)
+    ups = np.array([b[1] for b in bases], dtype=dirs.dtype)
+    forwards = np.array([b[2] for b in bases], dtype=dirs.dtype)
+    dots = dirs @ forwards.T
+    face = np.argmax(dots, axis=-1)
+    depth = np.take_along_axis(dots, face[..., None], axis=-1)[..., 0]
+    x = np.einsum('...i,...i->...', dirs, rights[face]) / depth
+    y = np.einsum('...i,...i->...', dirs, ups[face]) / depth
+    px = (x + 1.0) * (0.5 * size) - 0.5
+    py = (1.0 - y) * (0.5 * size) - 0.5
+    return face, px, py
@@ -1,6 +1,8 @@
 import bpy
-from bpy.props import StringProperty, IntProperty, EnumProperty, PointerProperty
-from .const import CUBEMAP_PRESETS
+from bpy.props import (
+    BoolProperty, StringProperty, IntProperty, IntVectorProperty, EnumProperty, FloatProperty, PointerProperty,
+)
+from .const import CUBEMAP_LAYOUTS, CUBEMAP_PRESETS
 
 def update_engine_preset(self, context):
     props = context.scene.cubemap_props
@@ -35,10 +37,11 @@ class CubemapProperties(bpy.types.PropertyGroup):
 
     resolution: IntProperty(
         name="Resolution",
-        description="Resolution of each cubemap face (square)",
+        description="Resolution of each cubemap face (square); above 8192 needs the Six Views (Tiled) capture",
         default=2048,
         min=512,
-        max=8192,
+        max=16384,
+        soft_max=8192,
         step=512
     )
 
@@ -48,6 +51,357 @@ class CubemapProperties(bpy.types.PropertyGroup):
         items=[
             ('PNG', "PNG (.png)", "Standard PNG format, lossless"),
             ('JPEG', "JPEG (.jpg)", "JPEG format (lossy, smaller file size)"),
+            ('OPEN_EXR', "OpenEXR (.exr)", "Scene-linear float, for HDR reflection probes"),
+            ('HDR', "Radiance HDR (.hdr)", "Scene-linear RGBE, widely supported HDR format"),
         ],
         default='PNG'
     )
+
+    png_compression: IntProperty(
+        name="Compression",
+        description="Deflate level of PNG and TIFF files written by the add-on (0 = none, 9 = smallest)",
+        default=6,
+        min=0,
+        max=9
+    )
+
+    jpeg_quality: IntProperty(
+        name="Quality",
+        description="JPEG quality of files written by the add-on",
+        default=90,
+        min=1,
+        max=100
+    )
+
+    jpeg_subsampling: EnumProperty(
+        name="Subsampling",
+        description="JPEG chroma subsampling",
+        items=[
+            ('4:4:4', "4:4:4", "Full colour resolution"),
+            ('4:2:2', "4:2:2", "Half horizontal colour resolution"),
+            ('4:2:0', "4:2:0", "Quarter colour resolution, smallest files"),
+        ],
+        default='4:2:0'
+    )
+
+    background_write: BoolProperty(
+        name="Background Encoding",
+        description="Encode and write each face in background worker processes while the next face renders (threads outside Linux)",
+        default=True
+    )
+
+    exr_depth: EnumProperty(
+        name="EXR Depth",
+        description="Float precision of EXR faces and strips",
+        items=[
+            ('16', "Half", "16-bit half float, half the size of full float"),
+            ('32', "Float", "32-bit full float"),
+        ],
+        default='16'
+    )
+
+    capture_mode: EnumProperty(
+        name="Capture",
+        description="How the six faces are captured",
+        items=[
+            ('FACES', "Six Views", "Render each face separately with a 90° camera"),
+            ('PERSISTENT', "Six Views (Single Sync)", "Render the six faces off one scene sync using Cycles persistent data"),
+            ('TILED', "Six Views (Tiled)", "Render each face as a grid of cropped border renders streamed into a memory-mapped buffer on disk, for faces above 8192"),
+            ('PANORAMA', "Single Panorama", "Render one equirectangular Cycles image and resample it into the six faces"),
+            ('HDRI', "Environment Image", "No render: resample the world's equirectangular HDRI (or an image file) into the six faces"),
+        ],
+        default='FACES'
+    )
+
+    tile_size: IntProperty(
+        name="Tile Size",
+        description="Width and height of each border render of a tiled capture",
+        default=4096,
+        min=256,
+        max=8192,
+        step=256
+    )
+
+    use_render_cache: BoolProperty(
+        name="Skip Unchanged Faces",
+        description="Keep face files whose camera, settings and scene haven't changed since they were rendered (tracked in a render cache manifest in the output folder)",
+        default=True
+    )
+
+    hdri_source: EnumProperty(
+        name="Source",
+        description="Equirectangular image used by the Environment Image capture",
+        items=[
+            ('WORLD', "World", "Image of the world's Environment Texture node, times its Background strength"),
+            ('FILE', "File", "An equirectangular image file"),
+        ],
+        default='WORLD'
+    )
+
+    hdri_path: StringProperty(
+        name="HDRI",
+        description="Equirectangular image file (.hdr, .exr, .png, ...)",
+        default="",
+        subtype='FILE_PATH'
+    )
+
+    sample_filter: EnumProperty(
+        name="Filter",
+        description="Filter used when resampling an equirectangular image into faces",
+        items=[
+            ('BILINEAR', "Bilinear", "4 taps, fast and never overshoots"),
+            ('BICUBIC', "Bicubic", "16-tap Catmull-Rom, sharper"),
+        ],
+        default='BILINEAR'
+    )
+
+    probe_source: EnumProperty(
+        name="Probes",
+        description="Where the probe set positions come from",
+        items=[
+            ('EMPTIES', "Empties", "One probe per empty in a collection"),
+            ('GRID', "Grid", "A grid of probes inside an object's bounding box"),
+        ],
+        default='EMPTIES'
+    )
+
+    probe_collection: PointerProperty(
+        name="Collection",
+        description="Collection whose empties mark probe positions",
+        type=bpy.types.Collection
+    )
+
+    probe_volume: PointerProperty(
+        name="Volume",
+        description="Object whose bounding box contains the probe grid",
+        type=bpy.types.Object
+    )
+
+    probe_grid: IntVectorProperty(
+        name="Grid",
+        description="Number of probes along X, Y and Z",
+        size=3,
+        default=(2, 2, 1),
+        min=1,
+        max=64
+    )
+
+    probe_workers: IntProperty(
+        name="Workers",
+        description="Background Blender processes to render probe sets and sequences with (0 = automatic)",
+        default=0,
+        min=0,
+        max=64
+    )
+
+    sequence_resume: BoolProperty(
+        name="Resume",
+        description="Skip frames and faces an interrupted run of the same sequence already finished",
+        default=True
+    )
+
+    farm_spool: StringProperty(
+        name="Spool",
+        description="Shared folder farm workers take tasks from (empty = .farm in the output folder)",
+        default="",
+        subtype='DIR_PATH'
+    )
+
+    farm_granularity: EnumProperty(
+        name="Split",
+        description="How farm jobs are divided into tasks",
+        items=[
+            ('PROBE', "Per Probe", "One task per probe"),
+            ('FACE', "Per Face", "One task per face, so a single probe can use six machines (Six Views captures)"),
+        ],
+        default='PROBE'
+    )
+
+    farm_workers: IntProperty(
+        name="Local Workers",
+        description="Workers started on this machine; farm workers pointed at the spool join in",
+        default=1,
+        min=0,
+        max=64
+    )
+
+    farm_retries: IntProperty(
+        name="Retries",
+        description="Times a failed or unresponsive task is queued again",
+        default=2,
+        min=0,
+        max=10
+    )
+
+    stream_assembly: BoolProperty(
+        name="Stream Assembly",
+        description="Assemble the strip in row bands so memory stays bounded at any resolution",
+        default=False
+    )
+
+    strip_container: EnumProperty(
+        name="Strip Format",
+        description="File format of the assembled strip",
+        items=[
+            ('FACE', "Same as Faces", "Use the face image format"),
+            ('TIFF', "Tiled TIFF (.tif)", "Deflate-compressed tiled TIFF"),
+            ('RAW', "Raw (.npy)", "Uncompressed pixels with a NumPy header, memory-mappable"),
+        ],
+        default='FACE'
+    )
+
+    layout: EnumProperty(
+        name="Layout",
+        description="Arrangement of the six faces in the assembled image",
+        items=[(key, layout['name'], f"{layout['grid'][0]}x{layout['grid'][1]} faces") for key, layout in CUBEMAP_LAYOUTS.items()],
+        default='STRIP'
+    )
+
+    convert_target: EnumProperty(
+        name="Convert To",
+        description="Projection written by Convert",
+        items=[
+            ('EQUIRECT', "Equirectangular", "Lat-long map, 2:1"),
+            ('OCTAHEDRAL', "Octahedral", "Square octahedral map, +Z at the centre"),
+        ],
+        default='EQUIRECT'
+    )
+
+    convert_size: IntProperty(
+        name="Width",
+        description="Width of the converted map (0 = match the face sampling density)",
+        default=0,
+        min=0,
+        max=32768
+    )
+
+    prefilter_samples: IntProperty(
+        name="Samples",
+        description="GGX importance samples per texel of the prefiltered mips",
+        default=32,
+        min=4,
+        max=1024
+    )
+
+    prefilter_levels: IntProperty(
+        name="Mips",
+        description="Number of prefiltered mips including the sharp one (0 = down to 4x4)",
+        default=0,
+        min=0,
+        max=14
+    )
+
+    prefilter_fixup: BoolProperty(
+        name="Edge Fixup",
+        description="Average texels along face edges, for engines that sample cubemaps without seamless filtering",
+        default=True
+    )
+
+    write_sh: BoolProperty(
+        name="Spherical Harmonics",
+        description="Write SH9 irradiance coefficients next to the faces after every render",
+        default=False
+    )
+
+    sh_format: EnumProperty(
+        name="SH Format",
+        description="File format of the SH9 coefficients",
+        items=[
+            ('JSON', "JSON", "Radiance and irradiance coefficients as JSON"),
+            ('BINARY', "Binary", "9x3 little-endian float32 radiance coefficients"),
+            ('BOTH', "Both", "JSON and binary"),
+        ],
+        default='JSON'
+    )
+
+    write_container: BoolProperty(
+        name="Cube Texture",
+        description="Write a DDS/KTX2 cube texture next to the faces after every render",
+        default=False
+    )
+
+    container_format: EnumProperty(
+        name="Container",
+        description="Cube texture container",
+        items=[
+            ('DDS', "DDS", "DirectDraw Surface with a DX10 header"),
+            ('KTX2', "KTX2", "Khronos texture 2.0"),
+            ('BOTH', "Both", "DDS and KTX2"),
+        ],
+        default='DDS'
+    )
+
+    texture_format: EnumProperty(
+        name="Texture Format",
+        description="Pixel format of the cube texture",
+        items=[
+            ('RGBA8', "RGBA8 sRGB", "Uncompressed 8-bit sRGB"),
+            ('RGBA16F', "RGBA16F", "Half float, scene-linear"),
+            ('RGBA32F', "RGBA32F", "Full float, scene-linear"),
+            ('BC1', "BC1 sRGB", "Block-compressed RGB, 4 bits per texel"),
+            ('BC3', "BC3 sRGB", "Block-compressed RGBA, 8 bits per texel"),
+            ('BC7', "BC7 sRGB", "Block-compressed RGBA, 8 bits per texel, higher quality"),
+        ],
+        default='RGBA8'
+    )
+
+    container_mips: EnumProperty(
+        name="Mips",
+        description="Mip chain stored in the cube texture",
+        items=[
+            ('NONE', "None", "Full resolution only"),
+            ('BOX', "Box", "Box-filtered mips down to 1x1"),
+            ('GGX', "GGX", "Prefiltered specular roughness mips (uses the Prefilter settings)"),
+        ],
+        default='BOX'
+    )
+
+    write_tiers: BoolProperty(
+        name="Quality Tiers",
+        description="Write half, quarter, ... resolution copies in the chosen layout after every render",
+        default=False
+    )
+
+    tier_levels: IntProperty(
+        name="Tiers",
+        description="Number of lower-resolution tiers; stops early once the face size is odd",
+        default=3,
+        min=1,
+        max=8
+    )
+
+    tier_filter: EnumProperty(
+        name="Tier Filter",
+        description="Filter used to halve each tier, in linear light",
+        items=[
+            ('BOX', "Box", "2x2 average, fastest"),
+            ('KAISER', "Kaiser", "Kaiser-windowed sinc, sharper with little aliasing"),
+        ],
+        default='KAISER'
+    )
+
+    write_faces: BoolProperty(
+        name="Write Face Files",
+        description="Also save the six face images when rendering and assembling in one go",
+        default=True
+    )
+
+    last_report: StringProperty(
+        name="Last Run",
+        description="Summary of the last render or assembly run (the full report is the _report.json file)",
+        default=""
+    )
+
+    render_status: StringProperty(
+        name="Render Status",
+        description="Progress of the running cubemap render",
+        default=""
+    )
+
+    render_progress: FloatProperty(
+        name="Render Progress",
+        default=0.0,
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR'
+    )
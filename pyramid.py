@@ -0,0 +1,177 @@
+import numpy as np
+from .assembly import STREAM_BAND_ROWS, assemble_faces, face_sources, stack_faces, strip_options, strip_path
+from .containers import linear_to_srgb, srgb_to_linear
+from .image_io import BackgroundWriter, BandReader, write_image
+from .prefilter import downsample
+from .utils import is_pillow_installed
+
+# Quality tiers: the faces at 1/2, 1/4, ... of the rendered size, each
+# assembled in the chosen layout and written as
+# {base_name}_{size}_cubemap_{layout}. Every tier is filtered from the one
+# above it, in linear light (integer faces are sRGB-encoded), and encoded in
+# worker processes while the next tier is filtered. Tiled captures are too
+# big to stack, so their first tier is box-filtered a band of rows at a time.
+
+# Kaiser-windowed sinc: radius in output pixels and window shape
+KAISER_RADIUS = 2
+KAISER_ALPHA = 4.0
+
+TIER_WORKERS = 3
+
+
+def kaiser_weights():
+    # Taps for a 2x decimation: output pixel i is centred between input
+    # pixels 2i and 2i+1, so the taps sit at half-pixel offsets
+    offsets = np.arange(-2 * KAISER_RADIUS, 2 * KAISER_RADIUS) + 0.5
+    x = offsets / 2.0
+    window = np.i0(KAISER_ALPHA * np.sqrt(np.clip(1.0 - (x / KAISER_RADIUS) ** 2, 0.0, 1.0))) / np.i0(KAISER_ALPHA)
+    weights = np.sinc(x) * window
+    return (weights / weights.sum()).astype(np.float32)
+
+
+def kaiser_axis(faces, axis):
+    # Decimate one image axis of a (6, size, size, channels) stack; face
+    # borders are clamped
+    weights = kaiser_weights()
+    pad = len(weights) // 2 - 1
+    half = faces.shape[axis] // 2
+    widths = [(0, 0)] * faces.ndim
+    widths[axis] = (pad, pad)
+    padded = np.pad(faces, widths, mode='edge')
+    out = None
+    for tap, weight in enumerate(weights):
+        index = [slice(None)] * faces.ndim
+        index[axis] = slice(tap, tap + 2 * half, 2)
+        term = padded[tuple(index)] * weight
+        out = term if out is None else out + term
+    return out
+
+
+def kaiser_downsample(faces):
+    out = kaiser_axis(kaiser_axis(faces, 1), 2)
+    # The negative lobes can ring below zero next to hard edges
+    return np.maximum(out, 0.0, out=out)
+
+
+TIER_FILTERS = {
+    'BOX': downsample,
+    'KAISER': kaiser_downsample,
+}
+
+
+def color_channels(channels):
+    # Channels holding colour; the last of 2 or 4 is alpha
+    return channels - 1 if channels in (2, 4) else channels
+
+
+def to_linear(stacked):
+    if stacked.dtype.kind == 'f':
+        return stacked.astype(np.float32, copy=False)
+    linear = stacked.astype(np.float32) / np.iinfo(stacked.dtype).max
+    color = color_channels(linear.shape[-1])
+    linear[..., :color] = srgb_to_linear(linear[..., :color])
+    return linear
+
+
+def from_linear(linear, dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return linear.astype(dtype)
+    out = np.clip(linear, 0.0, 1.0)
+    color = color_channels(out.shape[-1])
+    out[..., :color] = linear_to_srgb(out[..., :color])
+    return np.rint(out * np.iinfo(dtype).max).astype(dtype)
+
+
+def block_mean(band, row_edges, col_edges):
+    # Mean of each block of a (rows, cols, channels) band between the edges
+    rows, cols = np.diff(row_edges), np.diff(col_edges)
+    if (rows == rows[0]).all() and (cols == cols[0]).all():
+        return band.reshape(len(rows), rows[0], len(cols), cols[0], band.shape[-1]).mean(axis=(1, 3))
+    sums = np.add.reduceat(np.add.reduceat(band, row_edges[:-1], axis=0), col_edges[:-1], axis=1)
+    return sums / (rows[:, None, None] * cols[None, :, None]).astype(np.float32)
+
+
+def reduce_faces(faces, size):
+    # Box-reduce faces (arrays, memory maps or file paths) to `size` in
+    # linear light. Each output texel averages the input texels it covers;
+    # when the sizes don't divide, blocks differ by one texel. Each face is
+    # read a band of rows at a time. Returns float32 (size, size, channels)
+    # faces.
+    reduced = []
+    for face in faces:
+        reader = BandReader(face) if isinstance(face, str) else None
+        try:
+            height = reader.height if reader else face.shape[0]
+            edges = np.arange(size + 1) * height // size
+            step = max(1, STREAM_BAND_ROWS * size // height)
+            bands = []
+            for y in range(0, size, step):
+                row_edges = edges[y:min(y + step, size) + 1]
+                y0, y1 = row_edges[0], row_edges[-1]
+                band = reader.read_rows(y0, y1) if reader else face[y0:y1]
+                bands.append(block_mean(to_linear(np.asarray(band)), row_edges - y0, edges))
+        finally:
+            if reader:
+                reader.close()
+        reduced.append(np.concatenate(bands))
+    return reduced
+
+
+def tier_sizes(size, levels):
+    # Sizes below `size`, halving while the size stays even
+    sizes = []
+    while len(sizes) < levels and size % 2 == 0:
+        size //= 2
+        sizes.append(size)
+    return sizes
+
+
+def tier_path(output_dir, settings, size):
+    return strip_path(output_dir, f"{settings.base_name}_{size}", settings.file_format, settings.strip_container,
+                      settings.layout)
+
+
+def write_tiers(output_dir, settings, faces=None):
+    # Write the lower tiers of in-memory faces, or of the face files written
+    # by capture_cubemap. Returns the paths written.
+    faces, infos = face_sources(output_dir, settings, faces)
+    sizes = tier_sizes(infos[0][0], settings.tier_levels)
+    if not sizes:
+        return []
+    filters = [TIER_FILTERS[settings.tier_filter]] * len(sizes)
+    if settings.capture_mode == 'TILED':
+        dtype = infos[0][3]
+        level = np.stack(reduce_faces(faces, sizes[0]))
+        filters[0] = None
+    else:
+        stacked, size = stack_faces(faces, infos)
+        dtype = stacked.dtype
+        level = to_linear(stacked[:-1].reshape(len(infos), size, size, -1))
+        del stacked
+    del faces
+
+    paths = [tier_path(output_dir, settings, tier) for tier in sizes]
+    # Blender's own JPEG encoder only runs in the main process
+    if paths[0].endswith(".jpg") and not is_pillow_installed():
+        writer = None
+    else:
+        writer = BackgroundWriter(TIER_WORKERS, TIER_WORKERS)
+    try:
+        for path, tier_filter in zip(paths, filters):
+            if tier_filter:
+                level = tier_filter(level)
+            image = assemble_faces([from_linear(face, dtype) for face in level], settings.layout,
+                                   settings.engine_preset)
+            options = strip_options(path, settings)
+            if writer:
+                writer.submit(path, image, **options)
+            else:
+                write_image(path, image, **options)
+    except Exception:
+        if writer:
+            writer.close(raise_errors=False)
+        raise
+    if writer:
+        writer.close()
+    return paths
@@ -0,0 +1,247 @@
+import bpy
+import os
+import json
+import hashlib
+import numpy as np
+
+# Render cache manifest, one per probe in its output folder. Each face file
+# is recorded with a fingerprint of everything that can change its pixels:
+# probe position, face rotation, output and render settings and the scene
+# content (object transforms, mesh geometry, modifiers, materials, lights,
+# world and image files), plus every evaluated object instance (final
+# transform and geometry, so poses, shape keys, geometry nodes and
+# collection instances count) and the collection visibility flags of each
+# view layer. A face whose fingerprint matches and whose file still exists
+# is not rendered again.
+
+MANIFEST_VERSION = 1
+
+# Node properties that only affect the node editor
+NODE_UI_KEYS = {
+    'location', 'width', 'height', 'dimensions', 'select', 'hide', 'label', 'color', 'use_custom_color',
+    'show_options', 'show_preview', 'show_texture', 'warning_propagation',
+}
+
+# Per-object ray visibility and holdout flags
+OBJECT_RENDER_FLAGS = (
+    'hide_render', 'visible_camera', 'visible_diffuse', 'visible_glossy', 'visible_transmission',
+    'visible_volume_scatter', 'visible_shadow', 'is_holdout', 'is_shadow_catcher',
+)
+
+
+def manifest_path(output_dir, base_name):
+    return os.path.join(output_dir, f"{base_name}_render_cache.json")
+
+
+def load_manifest(output_dir, base_name):
+    # {face file name: fingerprint}; a missing or unreadable manifest is empty
+    try:
+        with open(manifest_path(output_dir, base_name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('faces', {})
+
+
+def save_manifest(output_dir, base_name, entries):
+    path = manifest_path(output_dir, base_name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({'version': MANIFEST_VERSION, 'faces': entries}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def rna_values(struct, skip=()):
+    # Plain property values of an RNA struct; pointers and collections are
+    # hashed by the caller where they matter
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier in skip or prop.type in {'POINTER', 'COLLECTION'}:
+            continue
+        try:
+            value = getattr(struct, prop.identifier)
+        except AttributeError:
+            continue
+        if hasattr(value, '__len__') and not isinstance(value, str):
+            value = tuple(value)
+        values.append((prop.identifier, value))
+    return values
+
+
+class SceneHasher:
+    # Builds one digest of the render-relevant scene state. Datablocks
+    # shared by several objects are hashed once.
+
+    def __init__(self):
+        self.digest = hashlib.sha1()
+        self.seen = set()
+
+    def add(self, *values):
+        self.digest.update(repr(values).encode())
+
+    def once(self, block):
+        if block is None:
+            return False
+        key = (type(block).__name__, block.name_full)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        return True
+
+    def array(self, items, attr, count, dtype=np.float32):
+        values = np.empty(len(items) * count, dtype=dtype)
+        items.foreach_get(attr, values)
+        self.digest.update(values.tobytes())
+
+    def image(self, image):
+        if not self.once(image):
+            return
+        self.add(image.name_full, image.source, image.filepath, image.colorspace_settings.name, image.alpha_mode)
+        if image.packed_file:
+            self.add(image.packed_file.size)
+            return
+        path = bpy.path.abspath(image.filepath, library=image.library)
+        try:
+            stat = os.stat(path)
+            self.add(stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            self.add(None)
+
+    def node_tree(self, tree):
+        if not self.once(tree):
+            return
+        for node in tree.nodes:
+            self.add(node.bl_idname, node.name, rna_values(node, NODE_UI_KEYS))
+            for socket in node.inputs:
+                if hasattr(socket, 'default_value'):
+                    value = socket.default_value
+                    self.add(socket.identifier, tuple(value) if hasattr(value, '__len__') and not isinstance(value, str) else value)
+            if getattr(node, 'image', None):
+                self.image(node.image)
+            if getattr(node, 'node_tree', None):
+                self.node_tree(node.node_tree)
+        for link in tree.links:
+            self.add(link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier,
+                     link.is_muted)
+
+    def material(self, material):
+        if not self.once(material):
+            return
+        self.add(rna_values(material))
+        if material.use_nodes and material.node_tree:
+            self.node_tree(material.node_tree)
+
+    def data(self, data):
+        if not self.once(data):
+            return
+        self.add(type(data).__name__, rna_values(data))
+        if isinstance(data, bpy.types.Mesh):
+            self.array(data.vertices, 'co', 3)
+            self.array(data.loops, 'vertex_index', 1, np.int32)
+            self.array(data.polygons, 'loop_total', 1, np.int32)
+            for layer in data.uv_layers:
+                self.array(layer.data, 'uv', 2)
+        if getattr(data, 'node_tree', None):
+            self.node_tree(data.node_tree)
+        for material in getattr(data, 'materials', ()):
+            self.material(material)
+
+    def object(self, obj):
+        if not self.once(obj):
+            return
+        self.add(obj.name_full, obj.type, tuple(map(tuple, obj.matrix_world)),
+                 [getattr(obj, flag, None) for flag in OBJECT_RENDER_FLAGS])
+        for mod in obj.modifiers:
+            self.add(mod.type, rna_values(mod))
+            if getattr(mod, 'node_group', None):
+                self.node_tree(mod.node_group)
+        for slot in obj.material_slots:
+            self.add(slot.link)
+            self.material(slot.material)
+        self.data(obj.data)
+        if obj.instance_type == 'COLLECTION' and obj.instance_collection:
+            for child in obj.instance_collection.all_objects:
+                self.object(child)
+
+    def instance(self, instance):
+        # One evaluated object instance: where it ends up and what it looks
+        # like after modifiers, constraints, drivers and instancing. Evaluated
+        # geometry is keyed by pointer, as it is only shared within this
+        # depsgraph.
+        obj = instance.object
+        self.add(obj.name_full, obj.type, tuple(map(tuple, instance.matrix_world)),
+                 instance.parent.original.name_full if instance.is_instance and instance.parent else None,
+                 tuple(instance.persistent_id) if instance.is_instance else None,
+                 [slot.material.name_full if slot.material else None for slot in obj.material_slots])
+        data = obj.data
+        if data is None:
+            return
+        key = ('evaluated', data.as_pointer())
+        if key in self.seen:
+            self.add(data.name_full)
+            return
+        self.seen.add(key)
+        self.add(data.name_full, rna_values(data))
+        if isinstance(data, bpy.types.Mesh):
+            self.array(data.vertices, 'co', 3)
+            self.array(data.loops, 'vertex_index', 1, np.int32)
+            self.array(data.polygons, 'loop_total', 1, np.int32)
+            self.array(data.polygons, 'material_index', 1, np.int32)
+
+    def layer_collection(self, layer):
+        # Exclude, holdout and indirect-only live on the view layer, hide_render
+        # on the collection itself
+        self.add(layer.name, layer.exclude, layer.holdout, layer.indirect_only, layer.hide_viewport,
+                 layer.collection.hide_render)
+        for child in layer.children:
+            self.layer_collection(child)
+
+
+def scene_fingerprint(scene, cam):
+    # Digest of everything but the probe camera's own transform, which is
+    # part of each face's fingerprint instead
+    hasher = SceneHasher()
+    render = scene.render
+    hasher.add(scene.frame_current, render.engine, rna_values(render, {'filepath'}),
+               rna_values(render.image_settings), rna_values(scene.view_settings),
+               scene.display_settings.display_device)
+    for engine in ('cycles', 'eevee'):
+        if hasattr(scene, engine):
+            hasher.add(engine, rna_values(getattr(scene, engine)))
+    for view_layer in scene.view_layers:
+        hasher.add(rna_values(view_layer))
+        hasher.layer_collection(view_layer.layer_collection)
+    if scene.world:
+        hasher.add(rna_values(scene.world))
+        if scene.world.use_nodes and scene.world.node_tree:
+            hasher.node_tree(scene.world.node_tree)
+    hasher.data(cam.data)
+    for obj in scene.objects:
+        if obj != cam and not obj.hide_render:
+            hasher.object(obj)
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for instance in depsgraph.object_instances:
+        if instance.object.original != cam:
+            hasher.instance(instance)
+    return hasher.digest.hexdigest()
+
+
+def face_fingerprints(scene, cam, settings, faces):
+    # One fingerprint per preset face. The camera's rotation is replaced by
+    # the face rotation, so only its location and parenting count.
+    scene_hash = scene_fingerprint(scene, cam)
+    parent = tuple(map(tuple, cam.parent.matrix_world @ cam.matrix_parent_inverse)) if cam.parent else None
+    common = (scene_hash, settings.capture_mode, settings.resolution, settings.file_format, settings.exr_depth,
+              settings.sample_filter, tuple(cam.location), parent)
+    return [hashlib.sha1(repr(common + (idx, suffix, tuple(rot))).encode()).hexdigest()
+            for idx, (suffix, rot) in enumerate(faces)]
+
+
+def cached_faces(paths, fingerprints, manifest):
+    # Indices of faces that don't need rendering
+    return {
+        idx for idx, (path, fingerprint) in enumerate(zip(paths, fingerprints))
+        if manifest.get(os.path.basename(path)) == fingerprint and os.path.isfile(path)
+    }
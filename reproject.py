@@ -0,0 +1,144 @@
+import os
+from functools import lru_cache
+import numpy as np
+from .const import CUBEMAP_PRESETS, FORMAT_EXTENSIONS, STRIP_CONTAINERS
+from .assembly import face_sources, stack_faces, strip_options
+from .image_io import write_image
+from .projection import direction_to_face, equirect_directions, face_basis, octahedral_directions, run_tiles
+from .utils import cache_dir, cached_array
+
+# Six faces -> equirectangular / octahedral maps. Per output pixel a lookup
+# table holds (face, x, y) in a face stack padded by one texel on every side;
+# the padding is gathered from the neighbouring faces, so bilinear taps at
+# face edges blend across the seam. Tables only depend on the preset and the
+# sizes and are cached as memory-mapped .npy files.
+
+CONVERT_SUFFIXES = {'EQUIRECT': "equirect", 'OCTAHEDRAL': "octahedral"}
+
+
+def output_size(target, face_size, size=0):
+    # (width, height); size 0 keeps sampling density close to the faces
+    if target == 'EQUIRECT':
+        width = size or face_size * 4
+        return width, max(1, width // 2)
+    if target == 'OCTAHEDRAL':
+        size = size or face_size * 2
+        return size, size
+    raise ValueError(f"Unknown conversion target '{target}'")
+
+
+def target_directions(target, width, height, rows):
+    if target == 'EQUIRECT':
+        return equirect_directions(width, height, rows)
+    return octahedral_directions(width, rows)
+
+
+def table_path(name):
+    return os.path.join(cache_dir("tables"), f"{name}.npy")
+
+
+def build_pad_map(preset_key, size):
+    # Index into the six stacked faces for every texel of the padded faces
+    faces = CUBEMAP_PRESETS[preset_key]['faces']
+    padded = size + 2
+    t = (np.arange(padded, dtype=np.float64) - 0.5) * (2.0 / size) - 1.0
+    pad_map = np.empty((len(faces), padded, padded), dtype=np.uint32)
+    for index, (_, rot) in enumerate(faces):
+        right, up, forward = face_basis(rot)
+        dirs = forward + t[None, :, None] * right + (-t)[:, None, None] * up
+        face, px, py = direction_to_face(dirs, faces, size)
+        x = np.clip(np.rint(px), 0, size - 1).astype(np.uint32)
+        y = np.clip(np.rint(py), 0, size - 1).astype(np.uint32)
+        pad_map[index] = face * (size * size) + y * size + x
+    return pad_map
+
+
+@lru_cache(maxsize=8)
+def pad_map(preset_key, size):
+    return cached_array(table_path(f"pad_{preset_key}_{size}"), lambda: build_pad_map(preset_key, size))
+
+
+def build_lookup(target, preset_key, face_size, width, height):
+    faces = CUBEMAP_PRESETS[preset_key]['faces']
+    table = np.empty((height, width, 3), dtype=np.float32)
+
+    def work(y0, y1):
+        face, px, py = direction_to_face(target_directions(target, width, height, (y0, y1)), faces, face_size)
+        table[y0:y1, :, 0] = face
+        table[y0:y1, :, 1] = px + 1.0
+        table[y0:y1, :, 2] = py + 1.0
+
+    run_tiles(height, work)
+    return table
+
+
+@lru_cache(maxsize=8)
+def lookup_table(target, preset_key, face_size, width, height):
+    # (height, width, 3) float32 of face index and padded pixel coordinates
+    name = f"{CONVERT_SUFFIXES[target]}_{preset_key}_{face_size}_{width}x{height}"
+    return cached_array(table_path(name), lambda: build_lookup(target, preset_key, face_size, width, height))
+
+
+def sample_padded(padded, face_size, face, px, py):
+    # Bilinear filter of the flattened padded face stack at padded pixel
+    # coordinates
+    p = face_size + 2
+    x0 = np.clip(np.floor(px), 0, p - 2)
+    y0 = np.clip(np.floor(py), 0, p - 2)
+    fx = (px - x0)[..., None]
+    fy = (py - y0)[..., None]
+    base = (face.astype(np.intp) * p + y0.astype(np.intp)) * p + x0.astype(np.intp)
+    # One gather for the four taps
+    taps = padded.take(np.stack((base, base + 1, base + p, base + p + 1)), axis=0).astype(np.float32, copy=False)
+    top = taps[0] + (taps[1] - taps[0]) * fx
+    bottom = taps[2] + (taps[3] - taps[2]) * fx
+    return top + (bottom - top) * fy
+
+
+def pad_faces(stacked, preset_key, face_size):
+    # Stacked faces (see assembly.stack_faces) -> flattened padded stack
+    return stacked[pad_map(preset_key, face_size)].reshape(-1, stacked.shape[1])
+
+
+def convert_faces(faces, infos, preset_key, target, size=0, threads=0):
+    # faces: six arrays or face file paths in preset order; infos as from
+    # image_info. Returns the converted image in the faces' dtype.
+    stacked, face_size = stack_faces(faces, infos)
+    channels = stacked.shape[1]
+    padded = pad_faces(stacked, preset_key, face_size)
+    del stacked
+
+    width, height = output_size(target, face_size, size)
+    table = lookup_table(target, preset_key, face_size, width, height)
+    out = np.empty((height, width, channels), dtype=padded.dtype)
+    integer = out.dtype.kind != 'f'
+
+    def work(y0, y1):
+        tile = table[y0:y1]
+        rows = sample_padded(padded, face_size, tile[..., 0], tile[..., 1], tile[..., 2])
+        if integer:
+            np.rint(rows, out=rows)
+            np.clip(rows, 0, np.iinfo(out.dtype).max, out=rows)
+        out[y0:y1] = rows
+
+    run_tiles(height, work, threads)
+    return out
+
+
+def converted_path(output_dir, settings, target):
+    ext = STRIP_CONTAINERS.get(settings.strip_container) or FORMAT_EXTENSIONS[settings.file_format]
+    return os.path.join(output_dir, f"{settings.base_name}_{CONVERT_SUFFIXES[target]}{ext}")
+
+
+def write_converted(output_dir, settings, target, faces=None):
+    # Convert in-memory faces, or the face files written by capture_cubemap.
+    # Returns (path, width, height).
+    faces, infos = face_sources(output_dir, settings, faces)
+    image = convert_faces(faces, infos, settings.engine_preset, target, settings.convert_size)
+    output_path = converted_path(output_dir, settings, target)
+    try:
+        write_image(output_path, image, **strip_options(output_path, settings))
+    except Exception as e:
+        raise RuntimeError(f"Failed to save converted image: {e}")
+    height, width = image.shape[:2]
+    return output_path, width, height
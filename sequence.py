@@ -0,0 +1,147 @@
+import bpy
+import os
+import json
+import hashlib
+
+# Frame-range captures. A sequence is a batch job with a "frames" key
+# ([start, end] or [start, end, step]); every probe becomes one job entry
+# per frame named {base_name}_{frame:04d}, so the faces come out as
+# {base_name}_{frame}_{idx}_{suffix} and frames spread over background
+# workers like the probes of a probe set.
+#
+# Workers append each face file that reaches the disk, and each finished
+# frame, to a checkpoint log next to the outputs. When the sequence is run
+# again, finished frames are dropped from the job and half-done frames only
+# render their missing faces. A change to the settings that shape the
+# outputs (SIGNATURE_KEYS, the scene camera and colour management) starts
+# over; worker counts, caching and encoding speed settings don't.
+
+CHECKPOINT_VERSION = 1
+
+# Job keys that change the faces or the files written after each frame
+SIGNATURE_KEYS = (
+    'engine_preset', 'resolution', 'capture_mode', 'file_format', 'exr_depth', 'jpeg_quality', 'jpeg_subsampling',
+    'hdri_source', 'hdri_path', 'sample_filter', 'location', 'layout', 'strip_container', 'write_faces',
+    'convert', 'convert_size', 'prefilter', 'prefilter_samples', 'prefilter_levels', 'prefilter_fixup', 'write_sh',
+    'sh_format', 'write_container', 'container_format', 'texture_format', 'container_mips', 'write_tiers',
+    'tier_levels', 'tier_filter',
+)
+
+FRAME_PADDING = 4
+
+
+def frame_base_name(base_name, frame):
+    return f"{base_name}_{frame:0{FRAME_PADDING}d}"
+
+
+def frame_range(frames):
+    start, end, step = (list(frames) + [1])[:3]
+    if step < 1 or end < start:
+        raise ValueError(f"Invalid frame range {frames}")
+    return range(start, end + 1, step)
+
+
+def checkpoint_path(output_dir, base_name):
+    return os.path.join(output_dir, f"{base_name}_sequence.jsonl")
+
+
+def load_checkpoint(path):
+    # {frame base name: {'faces': set of face indices, 'done': bool}}. A torn
+    # last line from a killed worker is ignored.
+    entries = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return entries
+    if not lines:
+        return entries
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return entries
+    if header.get('version') != CHECKPOINT_VERSION:
+        return entries
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        entry = entries.setdefault(record['base_name'], {'faces': set(), 'done': False})
+        if 'face' in record:
+            entry['faces'].add(record['face'])
+        if record.get('done'):
+            entry['done'] = True
+    return entries
+
+
+def append_checkpoint(path, record):
+    # One short line per write: appends that small don't interleave, so
+    # every worker shares the same log
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def start_checkpoint(path, signature, resume=True):
+    # Keep the log when it belongs to the same settings, else start a new one.
+    # Returns the entries to resume from.
+    if resume:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+            if header.get('version') == CHECKPOINT_VERSION and header.get('signature') == signature:
+                return load_checkpoint(path)
+        except (OSError, ValueError):
+            pass
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({'version': CHECKPOINT_VERSION, 'signature': signature}) + "\n")
+    return {}
+
+
+def sequence_signature(job, probe, defaults, frames):
+    # Digest of the output settings of one probe, each taken from the probe,
+    # else the job, else the scene props
+    settings = {}
+    for key in SIGNATURE_KEYS:
+        value = probe.get(key, job.get(key, getattr(defaults, key, None)))
+        settings[key] = list(value) if isinstance(value, (list, tuple)) else value
+    scene = bpy.context.scene
+    view = scene.view_settings
+    settings['camera'] = scene.camera.name_full if scene.camera else None
+    settings['color'] = [scene.display_settings.display_device, view.view_transform, view.look, view.exposure,
+                         view.gamma]
+    return hashlib.sha1(json.dumps([settings, list(frames)], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def expand_sequence(job, defaults, resume=True):
+    # Replace a job's "frames" key with one entry per probe and frame.
+    # `defaults` supplies base_name and output_path where the job doesn't
+    # (the scene props). Frames the checkpoint has as done are left out.
+    frames = job.get('frames')
+    if not frames:
+        return job
+    frames = frame_range(frames)
+    job = dict(job)
+    del job['frames']
+
+    probes = []
+    skipped = 0
+    for probe in job.get('probes', [{}]):
+        base_name = probe.get('base_name', job.get('base_name', defaults.base_name))
+        output_dir = bpy.path.abspath(probe.get('output_path', job.get('output_path', defaults.output_path)))
+        os.makedirs(output_dir, exist_ok=True)
+        checkpoint = checkpoint_path(output_dir, base_name)
+        entries = start_checkpoint(checkpoint, sequence_signature(job, probe, defaults, frames), resume)
+
+        for frame in frames:
+            name = frame_base_name(base_name, frame)
+            entry = entries.get(name, {'faces': set(), 'done': False})
+            if entry['done']:
+                skipped += 1
+                continue
+            probes.append(dict(probe, base_name=name, name=frame_base_name(probe.get('name', base_name), frame),
+                               output_path=output_dir, frame=frame, checkpoint=checkpoint,
+                               done_faces=sorted(entry['faces'])))
+    job['probes'] = probes
+    job['skipped_frames'] = skipped
+    return job
@@ -0,0 +1,119 @@
+import os
+import json
+import math
+from functools import lru_cache
+import numpy as np
+from .const import CUBEMAP_PRESETS
+from .assembly import face_sources
+from .pyramid import reduce_faces
+from .projection import face_directions
+from .utils import cache_dir, cached_array
+
+# Order-2 (9 coefficient) real spherical harmonics of the six faces in
+# Blender world axes (+Z up). A cached per-resolution table holds basis times
+# texel solid angle, so projecting a probe is one (9 x texels) @ (texels x 3)
+# product. Integer faces are taken as sRGB-encoded and linearized first,
+# float faces as scene-linear radiance.
+
+SH_BANDS = ('L00', 'L1-1', 'L10', 'L11', 'L2-2', 'L2-1', 'L20', 'L21', 'L22')
+
+# Cosine lobe convolution per band: irradiance E_lm = A_l * L_lm
+SH_COSINE = (math.pi,) + (2.0 * math.pi / 3.0,) * 3 + (math.pi / 4.0,) * 5
+
+# SH9 only holds very low frequencies, so faces are box-averaged to at most
+# this size first
+SH_MAX_SIZE = 128
+
+
+def sh_basis(dirs):
+    x, y, z = dirs[..., 0], dirs[..., 1], dirs[..., 2]
+    return np.stack((
+        np.full_like(x, 0.282095),
+        0.488603 * y,
+        0.488603 * z,
+        0.488603 * x,
+        1.092548 * x * y,
+        1.092548 * y * z,
+        0.315392 * (3.0 * z * z - 1.0),
+        1.092548 * x * z,
+        0.546274 * (x * x - y * y),
+    ), axis=-1)
+
+
+def texel_solid_angles(size):
+    # Exact solid angle of each texel of a 90° face, from the corner areas
+    edges = np.linspace(-1.0, 1.0, size + 1)
+    x, y = np.meshgrid(edges, edges)
+    corner = np.arctan2(x * y, np.sqrt(x * x + y * y + 1.0))
+    return corner[1:, 1:] - corner[:-1, 1:] - corner[1:, :-1] + corner[:-1, :-1]
+
+
+def build_weights(preset_key, size):
+    faces = CUBEMAP_PRESETS[preset_key]['faces']
+    angles = np.abs(texel_solid_angles(size))[..., None]
+    weights = []
+    for _, rot in faces:
+        dirs = face_directions(rot, size)
+        dirs /= np.linalg.norm(dirs, axis=-1, keepdims=True)
+        weights.append((sh_basis(dirs) * angles).reshape(-1, 9))
+    return np.concatenate(weights).astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def sh_weights(preset_key, size):
+    # (6 * size * size, 9) basis times solid angle, in preset face order
+    path = os.path.join(cache_dir("tables"), f"sh9_{preset_key}_{size}.npy")
+    return cached_array(path, lambda: build_weights(preset_key, size))
+
+
+def project_sh(faces, infos, preset_key):
+    # faces: six arrays, memory maps or face file paths in preset order,
+    # reduced one band at a time so full-size faces are never stacked.
+    # Returns (9, 3) radiance coefficients.
+    size = infos[0][0]
+    if any(info[:2] != (size, size) for info in infos):
+        raise ValueError("SH projection needs six square faces of the same size")
+    while size > SH_MAX_SIZE and size % 2 == 0:
+        size //= 2
+    # Odd sizes are averaged over uneven blocks instead, so the weight table
+    # stays small
+    size = min(size, SH_MAX_SIZE)
+    rgb = np.empty((6, size, size, 3), dtype=np.float32)
+    for index, face in enumerate(reduce_faces(faces, size)):
+        # Grayscale faces are broadcast to RGB
+        rgb[index] = face[..., :3] if face.shape[-1] >= 3 else face[..., :1]
+    weights = sh_weights(preset_key, size)
+    return weights.T.astype(np.float64) @ rgb.reshape(-1, 3).astype(np.float64)
+
+
+def sh_paths(output_dir, base_name):
+    return (os.path.join(output_dir, f"{base_name}_sh9.json"),
+            os.path.join(output_dir, f"{base_name}_sh9.bin"))
+
+
+def write_sh(output_dir, settings, faces=None):
+    # Project in-memory faces, or the face files written by capture_cubemap,
+    # and write the coefficients next to them. The .bin file is the (9, 3)
+    # radiance coefficients as little-endian float32, band-major.
+    faces, infos = face_sources(output_dir, settings, faces)
+    radiance = project_sh(faces, infos, settings.engine_preset)
+    irradiance = radiance * np.array(SH_COSINE)[:, None]
+
+    json_path, bin_path = sh_paths(output_dir, settings.base_name)
+    paths = []
+    if settings.sh_format in {'JSON', 'BOTH'}:
+        data = {
+            'preset': settings.engine_preset,
+            'axes': "Blender world (+Z up)",
+            'bands': list(SH_BANDS),
+            'radiance': radiance.tolist(),
+            'irradiance': irradiance.tolist(),
+        }
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        paths.append(json_path)
+    if settings.sh_format in {'BINARY', 'BOTH'}:
+        with open(bin_path, "wb") as f:
+            f.write(radiance.astype('<f4').tobytes())
+        paths.append(bin_path)
+    return paths
@@ -1,22 +1,71 @@
 import sys
 import subprocess
 import importlib
+import importlib.util
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def is_pillow_installed():
+def cache_dir(name):
+    # Per-user scratch cache shared by Blender sessions and farm workers
+    root = os.environ.get("CUBEMAP_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "cubemap_renderer")
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def cached_array(path, build):
+    # Load a derived table memory-mapped from disk, or build and save it.
+    # Written under a unique name and renamed so concurrent workers never
+    # load a half-written file.
+    import numpy as np
+    if os.path.exists(path):
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+    array = build()
     try:
-        importlib.import_module('PIL')
-        return True
-    except ImportError:
-        return False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+    except OSError:
+        array.flags.writeable = False
+        return array
+
+def can_fork():
+    # Forked workers inherit the loaded add-on; spawned ones couldn't import
+    # it. Forking Blender is only safe on Linux: macOS system frameworks
+    # don't survive a fork and Windows can't fork at all.
+    return sys.platform.startswith('linux') and 'fork' in multiprocessing.get_all_start_methods()
+
+def make_pool(workers):
+    # Process pool for pure NumPy work, threads where Blender can't fork
+    if can_fork():
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    return ThreadPoolExecutor(workers)
+
+# Pillow status, probed once per session; panels ask on every redraw
+_pillow_installed = None
+
+def is_pillow_installed():
+    global _pillow_installed
+    if _pillow_installed is None:
+        _pillow_installed = importlib.util.find_spec('PIL') is not None
+    return _pillow_installed
+
+def invalidate_pillow_status():
+    # After an install, so the next check sees the new site-packages
+    global _pillow_installed
+    _pillow_installed = None
+    importlib.invalidate_caches()
 
 def install_pillow(force_reinstall=False):
     python_exe = sys.executable
-    try:
-        if not force_reinstall:
-            import PIL
-            return True
-    except ImportError:
-        pass
+    if not force_reinstall and is_pillow_installed():
+        return True
 
     try:
         # Ensure pip is available
@@ -41,3 +90,5 @@ def install_pillow(force_reinstall=False):
     except Exception as e:
         print(f"Failed to install Pillow: {e}")
         return False
+    finally:
+        invalidate_pillow_status()